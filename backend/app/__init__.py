@@ -2,13 +2,16 @@
 
 import os
 import logging
-from flask import Flask, jsonify
+from functools import wraps
+from flask import Flask, jsonify, request, has_request_context
 from flask_cors import CORS
 from celery import Celery, Task
 from werkzeug.exceptions import HTTPException
 from flasgger import Swagger
 
 from .config import Config
+from .utils.background_loop import run_coroutine_in_context
+from .utils.uploads import UploadRequest
 # from .utils.logger import setup_logging # Example: Uncomment if using custom logging setup
 
 # --- Celery Initialization ---
@@ -20,12 +23,41 @@ celery_app.conf.update(
     result_serializer='json',
     timezone='UTC',
     enable_utc=True,
+    task_default_queue=Config.GENERATION_QUEUE_INTERACTIVE,
+    # Honour message priorities and drain the queues in the order a worker lists them (-Q),
+    # so a worker consuming both serves interactive jobs before bulk ones
+    broker_transport_options={'priority_steps': [0, 3, 6, 9], 'queue_order_strategy': 'priority'},
+    worker_prefetch_multiplier=1, # Don't reserve bulk jobs ahead of interactive ones arriving later
 )
 
+class SharedLoopFlask(Flask):
+    """
+    Runs async views on the process-wide event loop instead of a new loop per request,
+    so requests handled by concurrent server threads (gunicorn gthread, or the ASGI
+    entry point in asgi.py) overlap their awaits and share async clients.
+    Multipart uploads are spooled to disk and hashed as they are parsed (UploadRequest).
+
+    Every request of the process shares that one loop thread, so nothing may block on it:
+    the token is verified (auth_service) and the body read here in the server thread before
+    the view is handed over, and views run blocking calls (sync Redis, file reads) through
+    asyncio.to_thread. Views that never await are plain functions and stay in the server thread.
+    """
+
+    request_class = UploadRequest
+
+    def async_to_sync(self, func):
+        @wraps(func)
+        def run(*args, **kwargs):
+            if has_request_context():
+                request.load_body()
+            return run_coroutine_in_context(func(*args, **kwargs))
+        return run
+
+
 # --- App Factory Function ---
 def create_app():
     """Flask application factory."""
-    app = Flask(__name__)
+    app = SharedLoopFlask(__name__)
     app.config.from_object(Config)
 
     # --- Logging Setup (Example) ---
@@ -61,23 +93,60 @@ def create_app():
     Swagger(app, config=swagger_config)
     app.logger.info(f"Flasgger configured, UI available at {swagger_config['specs_route']}")
 
-    # Initialize Supabase client connection context
+    # Initialize the process-wide Supabase client and connection pool
     from .db.supabase_client import init_supabase
-    init_supabase(app) # Sets up teardown context if needed
+    init_supabase(app) # Registers pool shutdown at process exit
+
+    # Capture JWT key material and create the verified-token cache
+    from .services.auth_service import init_auth
+    init_auth(app)
+
+    # Register shutdown of the shared Grok HTTP client
+    from .services.grok_service import init_grok
+    init_grok(app)
+
+    # Register the `flask reap-stuck` command
+    from .services.reaper_service import init_reaper
+    init_reaper(app)
+
+    # Load the DNA catalog (reloaded later when the table changes)
+    from .services.dna_service import init_dna
+    init_dna(app)
+
+    # Register the `flask dna-index` command (the similarity index is built offline)
+    from .services.dna_similarity_service import init_dna_similarity
+    init_dna_similarity(app)
+
+    # Register the `flask dna-assets` command (the asset bundle is built offline)
+    from .services.dna_asset_service import init_dna_assets
+    init_dna_assets(app)
+
+    # Flush buffered feedback at shutdown (the flusher thread starts with the first submission)
+    from .services.feedback_service import init_feedback
+    init_feedback(app)
 
     # --- Register Blueprints ---
     # Import the blueprints correctly from the routes package
     try:
-        from .routes import generate_bp, auth_bp
+        from .routes import generate_bp, auth_bp, health_bp, uploads_bp, images_bp, dna_bp, feedback_bp
         app.register_blueprint(generate_bp, url_prefix='/api')
         app.register_blueprint(auth_bp, url_prefix='/api')
-        app.logger.info("Registered blueprints: generate, auth")
+        app.register_blueprint(health_bp, url_prefix='/api')
+        app.register_blueprint(uploads_bp, url_prefix='/api')
+        app.register_blueprint(images_bp, url_prefix='/api/images')
+        app.register_blueprint(dna_bp, url_prefix='/api/dna')
+        app.register_blueprint(feedback_bp, url_prefix='/api/feedback')
+        app.logger.info("Registered blueprints: generate, auth, health, uploads, images, dna, feedback")
     except ImportError as e:
         app.logger.error(f"Failed to import or register blueprints: {e}. Ensure routes/generate.py and routes/auth.py exist and define blueprints.", exc_info=True)
         raise e # Re-raise error to stop app creation if blueprints are critical
 
-    # Apply Flask config updates to Celery
-    celery_app.conf.update(app.config)
+    # Apply Flask config updates to Celery (new-style keys only; Celery rejects a mix of
+    # lowercase settings and uppercase CELERY_* names, so the whole Flask config can't be passed)
+    celery_app.conf.update(
+        broker_url=app.config['CELERY_BROKER_URL'],
+        result_backend=app.config['CELERY_RESULT_BACKEND'],
+    )
     app.logger.info("Celery configuration updated from Flask config.")
 
     # --- Register Error Handlers ---
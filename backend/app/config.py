@@ -5,21 +5,162 @@ class Config:
     FLASK_ENV = os.environ.get('FLASK_ENV', 'production')
     SECRET_KEY = os.environ.get('SECRET_KEY', 'default_secret_key_please_change')
 
+    # Uploads (multipart parts are spooled to disk and hashed while parsed; see also POST /api/uploads)
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 25 * 1024 * 1024)) # Bytes per request; larger bodies get 413 before being read
+    UPLOAD_RECORD_TTL = int(os.environ.get('UPLOAD_RECORD_TTL', 86400)) # Seconds a direct upload id can be referenced
+
+    # Reference image normalization (before storage upload and Grok Vision)
+    IMAGE_NORMALIZE_ENABLED = os.environ.get('IMAGE_NORMALIZE_ENABLED', 'true').lower() == 'true'
+    IMAGE_NORMALIZE_MAX_EDGE = int(os.environ.get('IMAGE_NORMALIZE_MAX_EDGE', 2048)) # Pixels, longest side
+    IMAGE_NORMALIZE_FORMAT = os.environ.get('IMAGE_NORMALIZE_FORMAT', 'WEBP').upper() # WEBP or JPEG
+    IMAGE_NORMALIZE_QUALITY = int(os.environ.get('IMAGE_NORMALIZE_QUALITY', 85))
+    IMAGE_NORMALIZE_WORKERS = int(os.environ.get('IMAGE_NORMALIZE_WORKERS', 4)) # Threads per process
+
+    # Result derivatives (thumbnails + BlurHash, produced when a job succeeds)
+    DERIVATIVES_ENABLED = os.environ.get('DERIVATIVES_ENABLED', 'true').lower() == 'true'
+    DERIVATIVE_WIDTHS = [int(w) for w in os.environ.get('DERIVATIVE_WIDTHS', '256,512,1024').split(',') if w.strip()]
+    DERIVATIVE_QUALITY = int(os.environ.get('DERIVATIVE_QUALITY', 80)) # WebP quality
+
+    # ASGI serving (asgi.py)
+    ASGI_WORKER_THREADS = int(os.environ.get('ASGI_WORKER_THREADS', 32)) # Threads running the WSGI layer per process
+
     # Supabase
     SUPABASE_URL = os.environ.get('SUPABASE_URL')
     SUPABASE_SERVICE_ROLE_KEY = os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
     SUPABASE_JWT_SECRET = os.environ.get('SUPABASE_JWT_SECRET')
     ADMIN_ROLE_NAME = os.environ.get('ADMIN_ROLE_NAME', 'admin')
 
+    # Verified-JWT cache (polling clients present the same token on every request)
+    JWT_CACHE_ENABLED = os.environ.get('JWT_CACHE_ENABLED', 'true').lower() == 'true'
+    JWT_CACHE_MAXSIZE = int(os.environ.get('JWT_CACHE_MAXSIZE', 10000))
+    JWT_CACHE_TTL = float(os.environ.get('JWT_CACHE_TTL', 300)) # Seconds, never beyond the token's own exp
+    JWT_NEGATIVE_CACHE_TTL = float(os.environ.get('JWT_NEGATIVE_CACHE_TTL', 30)) # Seconds an invalid token is remembered, 0 disables
+
+    # Supabase HTTP connection pool (shared by every request in the process)
+    SUPABASE_POOL_MAX_CONNECTIONS = int(os.environ.get('SUPABASE_POOL_MAX_CONNECTIONS', 20))
+    SUPABASE_POOL_MAX_KEEPALIVE = int(os.environ.get('SUPABASE_POOL_MAX_KEEPALIVE', 10))
+    SUPABASE_POOL_KEEPALIVE_EXPIRY = float(os.environ.get('SUPABASE_POOL_KEEPALIVE_EXPIRY', 30.0)) # Seconds an idle connection is kept
+    SUPABASE_HTTP2 = os.environ.get('SUPABASE_HTTP2', 'true').lower() == 'true'
+    SUPABASE_HEALTHCHECK_ON_START = os.environ.get('SUPABASE_HEALTHCHECK_ON_START', 'false').lower() == 'true'
+
     # Grok
     GROK_API_KEY = os.environ.get('GROK_API_KEY')
     GROK_VISION_ENDPOINT = os.environ.get('GROK_VISION_ENDPOINT')
     GROK_LLM_ENDPOINT = os.environ.get('GROK_LLM_ENDPOINT')
+    GROK_CONNECT_TIMEOUT = float(os.environ.get('GROK_CONNECT_TIMEOUT', 5.0))
+    GROK_VISION_TIMEOUT = float(os.environ.get('GROK_VISION_TIMEOUT', 60.0)) # Vision calls are slower than text
+    GROK_LLM_TIMEOUT = float(os.environ.get('GROK_LLM_TIMEOUT', 30.0))
+    GROK_POOL_MAX_CONNECTIONS = int(os.environ.get('GROK_POOL_MAX_CONNECTIONS', 20))
+    GROK_MAX_CONCURRENCY = int(os.environ.get('GROK_MAX_CONCURRENCY', 10)) # Concurrent Grok calls per process
+    GROK_MAX_RETRIES = int(os.environ.get('GROK_MAX_RETRIES', 3)) # Retries on 429/5xx and connection errors
+    GROK_BACKOFF_BASE = float(os.environ.get('GROK_BACKOFF_BASE', 0.5))
+    GROK_BACKOFF_MAX = float(os.environ.get('GROK_BACKOFF_MAX', 10.0))
+    GROK_CACHE_ENABLED = os.environ.get('GROK_CACHE_ENABLED', 'true').lower() == 'true'
+    GROK_CACHE_VERSION = os.environ.get('GROK_CACHE_VERSION', '1') # Bump when the Grok model/prompting changes
+    GROK_CACHE_MAXSIZE = int(os.environ.get('GROK_CACHE_MAXSIZE', 1024)) # Entries per in-process cache
+    GROK_CACHE_TTL = int(os.environ.get('GROK_CACHE_TTL', 3600)) # Seconds, in-process tier
+    GROK_CACHE_REDIS_TTL = int(os.environ.get('GROK_CACHE_REDIS_TTL', 7 * 24 * 3600)) # Seconds, shared Redis tier
 
     # Celery
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
     CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', None) # Optional
 
+    # Generation scheduling (see scheduler_service)
+    GENERATION_QUEUE_INTERACTIVE = os.environ.get('GENERATION_QUEUE_INTERACTIVE', 'generation.interactive') # Single requests
+    GENERATION_QUEUE_BULK = os.environ.get('GENERATION_QUEUE_BULK', 'generation.bulk') # Batch variants and overflow
+    SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'true').lower() == 'true' # Per-user caps and backlog; queues are used either way
+    SCHEDULER_USER_INFLIGHT_CAP = int(os.environ.get('SCHEDULER_USER_INFLIGHT_CAP', 4)) # Bulk jobs per user in the queue/running at once
+    SCHEDULER_INTERACTIVE_CAP = int(os.environ.get('SCHEDULER_INTERACTIVE_CAP', 3)) # Interactive jobs per user at once; more go to the bulk queue
+    SCHEDULER_INFLIGHT_TTL = int(os.environ.get('SCHEDULER_INFLIGHT_TTL', 1800)) # Seconds before the slot of a job that never finished is reclaimed
+    SCHEDULER_PENDING_TTL = int(os.environ.get('SCHEDULER_PENDING_TTL', 24 * 3600)) # Seconds an idle backlog is kept
+    SCHEDULER_WAIT_SAMPLES = int(os.environ.get('SCHEDULER_WAIT_SAMPLES', 1000)) # Recent submit-to-start waits kept per queue
+
+    # Stuck-job reaper (Celery beat in the worker, or `flask reap-stuck`)
+    REAPER_ENABLED = os.environ.get('REAPER_ENABLED', 'true').lower() == 'true' # Schedules the periodic worker task
+    REAPER_INTERVAL = float(os.environ.get('REAPER_INTERVAL', 60)) # Seconds between runs
+    REAPER_STUCK_AFTER = int(os.environ.get('REAPER_STUCK_AFTER', 900)) # Seconds without change before a 'processing' row is checked
+    REAPER_MAX_REQUEUES = int(os.environ.get('REAPER_MAX_REQUEUES', 2)) # Re-enqueues per request before it is failed
+    REAPER_BATCH_SIZE = int(os.environ.get('REAPER_BATCH_SIZE', 200)) # Rows per keyset page
+    REAPER_MAX_PAGES = int(os.environ.get('REAPER_MAX_PAGES', 5)) # Pages per run; the next run continues from the cursor
+    REAPER_INSPECT_TIMEOUT = float(os.environ.get('REAPER_INSPECT_TIMEOUT', 1.0)) # Seconds to wait for workers to list their tasks
+    REAPER_LOCK_TIMEOUT = int(os.environ.get('REAPER_LOCK_TIMEOUT', 300)) # Seconds a run may hold the lock
+
+    # Reference worker (worker/; renders with WORKER_IMAGE_BACKEND)
+    WORKER_IMAGE_BACKEND = os.environ.get('WORKER_IMAGE_BACKEND', 'fake') # 'fake' or a dotted path to an ImageBackend subclass
+    WORKER_FAKE_LATENCY_DIST = os.environ.get('WORKER_FAKE_LATENCY_DIST', 'lognormal').lower() # fixed, uniform, normal or lognormal
+    WORKER_FAKE_LATENCY_MEAN = float(os.environ.get('WORKER_FAKE_LATENCY_MEAN', 8.0)) # Seconds per image
+    WORKER_FAKE_LATENCY_STDDEV = float(os.environ.get('WORKER_FAKE_LATENCY_STDDEV', 3.0)) # Seconds (half-width for uniform)
+    WORKER_FAKE_LATENCY_MIN = float(os.environ.get('WORKER_FAKE_LATENCY_MIN', 0.5))
+    WORKER_FAKE_LATENCY_MAX = float(os.environ.get('WORKER_FAKE_LATENCY_MAX', 60.0))
+    WORKER_FAKE_FAILURE_RATE = float(os.environ.get('WORKER_FAKE_FAILURE_RATE', 0.0)) # Fraction of jobs that fail
+    WORKER_FAKE_IMAGE_SIZE = int(os.environ.get('WORKER_FAKE_IMAGE_SIZE', 1024)) # Pixels, square
+
+    # DNA catalog (product design table + images, loaded into memory; see /api/dna)
+    DNA_DATA_DIR = os.environ.get('DNA_DATA_DIR') or os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'data'))
+    DNA_TABLE_FILE = os.environ.get('DNA_TABLE_FILE', 'Product_table.csv') # Relative to DNA_DATA_DIR
+    DNA_RELOAD_ENABLED = os.environ.get('DNA_RELOAD_ENABLED', 'true').lower() == 'true' # Re-parse the table when its mtime changes
+    DNA_RELOAD_INTERVAL = float(os.environ.get('DNA_RELOAD_INTERVAL', 5)) # Seconds between mtime checks
+    DNA_PAGE_MAX = int(os.environ.get('DNA_PAGE_MAX', 100)) # Upper bound for 'limit' on GET /api/dna
+
+    # DNA image similarity (index built offline with `flask dna-index`; see POST /api/dna/similar)
+    DNA_INDEX_DIR = os.environ.get('DNA_INDEX_DIR') or os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'instance', 'dna_index'))
+    DNA_SIMILAR_TOP_K = int(os.environ.get('DNA_SIMILAR_TOP_K', 5)) # Matches returned by default
+    DNA_SIMILAR_MAX_K = int(os.environ.get('DNA_SIMILAR_MAX_K', 50)) # Upper bound for 'k'
+    DNA_SIMILAR_IN_PROMPT = os.environ.get('DNA_SIMILAR_IN_PROMPT', 'true').lower() == 'true' # Add DNA keywords of matching cases to generation prompts
+    DNA_SIMILAR_MIN_SCORE = float(os.environ.get('DNA_SIMILAR_MIN_SCORE', 0.85)) # Cosine similarity a match needs to contribute keywords
+    DNA_SIMILAR_PROMPT_KEYWORDS = int(os.environ.get('DNA_SIMILAR_PROMPT_KEYWORDS', 8)) # Keywords added at most
+
+    # DNA asset bundle (WebP images + thumbnails built with `flask dna-assets`; served from /api/dna/assets)
+    DNA_ASSET_DIR = os.environ.get('DNA_ASSET_DIR') or os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'instance', 'dna_assets'))
+    DNA_ASSET_WIDTHS = [int(w) for w in os.environ.get('DNA_ASSET_WIDTHS', '160,320,640').split(',') if w.strip()] # Thumbnail widths; new ones are derived on first request
+    DNA_ASSET_QUALITY = int(os.environ.get('DNA_ASSET_QUALITY', 80)) # WebP quality of assets and thumbnails
+    DNA_ASSET_MAX_AGE = int(os.environ.get('DNA_ASSET_MAX_AGE', 31536000)) # Seconds; asset URLs are content-hashed, so they never change
+
+    # Local prompt engine ('optimize_prompt' builds the prompt from the DNA vocabulary; Grok only runs for 'llm_rewrite')
+    PROMPT_ENGINE_ENABLED = os.environ.get('PROMPT_ENGINE_ENABLED', 'true').lower() == 'true' # false: 'optimize_prompt' calls Grok as before
+    PROMPT_ENGINE_MAX_TERMS = int(os.environ.get('PROMPT_ENGINE_MAX_TERMS', 10)) # DNA phrases added at most
+    PROMPT_ENGINE_TERMS_PER_STYLE = int(os.environ.get('PROMPT_ENGINE_TERMS_PER_STYLE', 3)) # Typical phrases added per requested style
+    PROMPT_ENGINE_EMPHASIS = os.environ.get('PROMPT_ENGINE_EMPHASIS', 'true').lower() == 'true' # Render weights as (term:1.2)
+
+    # Feedback ingestion (POST /api/feedback buffers entries; a per-process thread stores them in batches)
+    FEEDBACK_BUFFER = os.environ.get('FEEDBACK_BUFFER', 'redis').lower() # 'redis' (shared, survives restarts) or 'memory' (per process)
+    FEEDBACK_BATCH_SIZE = int(os.environ.get('FEEDBACK_BATCH_SIZE', 200)) # Entries per insert; a full batch is flushed immediately
+    FEEDBACK_FLUSH_INTERVAL = float(os.environ.get('FEEDBACK_FLUSH_INTERVAL', 2)) # Seconds a partial batch waits at most
+    FEEDBACK_MAX_BATCHES = int(os.environ.get('FEEDBACK_MAX_BATCHES', 10)) # Inserts per flush
+    FEEDBACK_BUFFER_MAX = int(os.environ.get('FEEDBACK_BUFFER_MAX', 20000)) # Entries waiting before POSTs get 503
+    FEEDBACK_MAX_ITEMS = int(os.environ.get('FEEDBACK_MAX_ITEMS', 500)) # Entries per POST
+    FEEDBACK_TOP_PROMPTS_MAX = int(os.environ.get('FEEDBACK_TOP_PROMPTS_MAX', 100)) # Upper bound for 'limit' on /api/feedback/stats/prompts
+
+    # Redis (shared caches; defaults to the Celery broker instance)
+    REDIS_URL = os.environ.get('REDIS_URL', CELERY_BROKER_URL)
+    REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT', 0.5)) # Keep cache lookups from stalling requests
+
+    # Generation
+    GENERATION_DEDUP_ENABLED = os.environ.get('GENERATION_DEDUP_ENABLED', 'true').lower() == 'true' # Reuse identical submissions (clients can send force_new)
+    GENERATION_DEDUP_TTL = int(os.environ.get('GENERATION_DEDUP_TTL', 24 * 3600)) # Seconds a fingerprint stays reusable
+    GENERATION_DEDUP_CLAIM_TTL = int(os.environ.get('GENERATION_DEDUP_CLAIM_TTL', 180)) # Seconds a claim lives until its row is stored (longer than a submission takes)
+    BATCH_MAX_VARIANTS = int(os.environ.get('BATCH_MAX_VARIANTS', 16)) # Upper bound for POST /api/generate/batch
+    STATUS_BATCH_MAX_IDS = int(os.environ.get('STATUS_BATCH_MAX_IDS', 100)) # Upper bound for /api/generate/status
+
+    # Status cache (in front of generation_requests reads)
+    STATUS_CACHE_ENABLED = os.environ.get('STATUS_CACHE_ENABLED', 'true').lower() == 'true'
+    STATUS_CACHE_TTL = float(os.environ.get('STATUS_CACHE_TTL', 2)) # Seconds, pending/processing rows
+    STATUS_CACHE_TERMINAL_TTL = float(os.environ.get('STATUS_CACHE_TERMINAL_TTL', 86400)) # Seconds, succeeded/failed rows
+    STATUS_CACHE_MAXSIZE = int(os.environ.get('STATUS_CACHE_MAXSIZE', 10000)) # Entries in the per-process tier
+
+    # Signed image URLs (/api/images)
+    SIGNED_URL_EXPIRES_IN = int(os.environ.get('SIGNED_URL_EXPIRES_IN', 3600)) # Seconds a minted URL is valid
+    SIGNED_URL_CACHE_MARGIN = int(os.environ.get('SIGNED_URL_CACHE_MARGIN', 300)) # Cached URLs are handed out until this long before expiry
+    SIGNED_URL_CACHE_MAXSIZE = int(os.environ.get('SIGNED_URL_CACHE_MAXSIZE', 10000))
+    IMAGE_URL_BATCH_MAX_IDS = int(os.environ.get('IMAGE_URL_BATCH_MAX_IDS', 100)) # Upper bound for /api/images/urls
+
+    # Server-Sent Events (status push)
+    SSE_MAX_IDS = int(os.environ.get('SSE_MAX_IDS', 50)) # Requests per event stream
+    SSE_KEEPALIVE_SECONDS = float(os.environ.get('SSE_KEEPALIVE_SECONDS', 15))
+    SSE_MAX_STREAM_SECONDS = float(os.environ.get('SSE_MAX_STREAM_SECONDS', 300)) # Clients reconnect after a 'timeout' event
+    SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', 8)) # Open streams per process; each holds one of ASGI_WORKER_THREADS
+    SSE_RETRY_AFTER_SECONDS = int(os.environ.get('SSE_RETRY_AFTER_SECONDS', 5)) # Retry-After of the 503 when all stream slots are taken
+
     # CORS Allowed Origins (Important for security)
     # Example: "http://localhost:5173,https://your-frontend-domain.com"
     ALLOWED_ORIGINS_STR = os.environ.get('ALLOWED_ORIGINS', 'http://localhost:5173') # Default to common Vite dev port
@@ -0,0 +1,32 @@
+import os
+import logging
+import threading
+import redis
+from flask import current_app
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# --- Process-wide Redis Client ---
+# redis-py keeps its own thread-safe connection pool; one client per process is enough.
+_redis: Optional[redis.Redis] = None
+_redis_pid: Optional[int] = None
+_redis_lock = threading.Lock()
+
+
+def get_redis() -> redis.Redis:
+    """Gets the process-wide Redis client (cache / pub-sub), creating it on first use."""
+    global _redis, _redis_pid
+    if _redis is None or _redis_pid != os.getpid():
+        with _redis_lock:
+            if _redis is None or _redis_pid != os.getpid():
+                config = current_app.config
+                _redis = redis.Redis.from_url(
+                    config['REDIS_URL'],
+                    socket_timeout=config['REDIS_SOCKET_TIMEOUT'],
+                    socket_connect_timeout=config['REDIS_SOCKET_TIMEOUT'],
+                    health_check_interval=30,
+                )
+                _redis_pid = os.getpid()
+                logger.info(f"Redis client created for process {_redis_pid}.")
+    return _redis
@@ -1,32 +1,173 @@
+import os
+import io
+import atexit
+import asyncio
 import logging
-from supabase import create_client, Client
-from flask import current_app, g
-from typing import Optional, Dict 
+import threading
+import httpx
+from supabase import Client, ClientOptions
+from postgrest import SyncPostgrestClient
+from postgrest.types import ReturnMethod
+from storage3 import SyncStorageClient
+from storage3.utils import SyncClient as StorageSession
+from flask import current_app
+from typing import Optional, Dict, List, Tuple
 
 logger = logging.getLogger(__name__)
 
+# --- Process-wide Client Registry ---
+# One Supabase client (and one HTTP connection pool) per process, shared by every request.
+_client: Optional[Client] = None
+_transport: Optional["_PooledTransport"] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+
+class _PooledTransport(httpx.HTTPTransport):
+    """HTTP transport that keeps a persistent keep-alive pool and counts created connections."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.connections_created = 0
+        create_connection = self._pool.create_connection
+
+        def counting_create_connection(origin):
+            self.connections_created += 1
+            return create_connection(origin)
+
+        self._pool.create_connection = counting_create_connection
+
+    def stats(self) -> Dict[str, int]:
+        connections = self._pool.connections
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {
+            "connections_in_use": len(connections) - idle,
+            "connections_idle": idle,
+            "connections_created": self.connections_created,
+        }
+
+
+class _PooledPostgrestClient(SyncPostgrestClient):
+    """PostgREST client whose session reuses the shared transport."""
+
+    def __init__(self, *args, transport: httpx.BaseTransport, **kwargs):
+        self._transport = transport
+        super().__init__(*args, **kwargs)
+
+    def create_session(self, base_url, headers, timeout, verify=True, proxy=None):
+        return httpx.Client(base_url=base_url, headers=headers, timeout=timeout,
+                            transport=self._transport, follow_redirects=True)
+
+
+class _PooledStorageClient(SyncStorageClient):
+    """Storage client whose session reuses the shared transport."""
+
+    def __init__(self, *args, transport: httpx.BaseTransport, **kwargs):
+        self._transport = transport
+        super().__init__(*args, **kwargs)
+
+    def _create_session(self, base_url, headers, timeout, verify=True, proxy=None):
+        return StorageSession(base_url=base_url, headers=headers, timeout=timeout,
+                              transport=self._transport, follow_redirects=True)
+
+
+class PooledClient(Client):
+    """Supabase client whose PostgREST and Storage sessions share one connection pool."""
+
+    def __init__(self, supabase_url: str, supabase_key: str, transport: httpx.BaseTransport,
+                 options: Optional[ClientOptions] = None):
+        self._transport = transport
+        super().__init__(supabase_url, supabase_key, options)
+
+    def _init_postgrest_client(self, rest_url, headers, schema, timeout=None, verify=True, proxy=None):
+        return _PooledPostgrestClient(rest_url, headers=headers, schema=schema, timeout=timeout,
+                                      transport=self._transport)
+
+    def _init_storage_client(self, storage_url, headers, storage_client_timeout=None, verify=True, proxy=None):
+        return _PooledStorageClient(storage_url, headers, storage_client_timeout, transport=self._transport)
+
+
+def _build_client(config) -> Client:
+    """Creates the shared transport and the Supabase client on top of it."""
+    global _transport
+    _transport = _PooledTransport(
+        http2=config['SUPABASE_HTTP2'],
+        limits=httpx.Limits(
+            max_connections=config['SUPABASE_POOL_MAX_CONNECTIONS'],
+            max_keepalive_connections=config['SUPABASE_POOL_MAX_KEEPALIVE'],
+            keepalive_expiry=config['SUPABASE_POOL_KEEPALIVE_EXPIRY'],
+        ),
+        retries=1, # Retry connect errors once (e.g. a keep-alive connection dropped by the server)
+    )
+    client = PooledClient(
+        config['SUPABASE_URL'],
+        config['SUPABASE_SERVICE_ROLE_KEY'], # Use service role key for backend operations
+        transport=_transport,
+        options=ClientOptions(auto_refresh_token=False, persist_session=False),
+    )
+    logger.info(f"Supabase client created for process {os.getpid()} "
+                f"(max_connections={config['SUPABASE_POOL_MAX_CONNECTIONS']}, "
+                f"max_keepalive={config['SUPABASE_POOL_MAX_KEEPALIVE']}, http2={config['SUPABASE_HTTP2']}).")
+    return client
+
+
 def get_supabase_client() -> Client:
-    """Gets the Supabase client for the current request context."""
-    if 'supabase_client' not in g:
-        g.supabase_client = create_client(
-            current_app.config['SUPABASE_URL'],
-            current_app.config['SUPABASE_SERVICE_ROLE_KEY'] # Use service role key for backend operations
-        )
-        logger.info("Supabase client initialized for request context.")
-    return g.supabase_client
+    """Gets the process-wide Supabase client, creating it on first use."""
+    global _client, _client_pid
+    # A forked worker (e.g. gunicorn --preload) must not share the parent's sockets
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = _build_client(current_app.config)
+                _client_pid = os.getpid()
+    return _client
+
+
+def get_pool_stats() -> Dict[str, int]:
+    """Returns connection pool metrics for the current process."""
+    if _transport is None or _client_pid != os.getpid():
+        return {"connections_in_use": 0, "connections_idle": 0, "connections_created": 0}
+    return _transport.stats()
+
+
+def check_supabase_health() -> bool:
+    """Runs a minimal PostgREST query to verify connectivity."""
+    try:
+        get_supabase_client().table('generation_requests').select('id').limit(1).execute()
+        return True
+    except Exception as e:
+        logger.error(f"Supabase health check failed: {e}", exc_info=True)
+        return False
+
+
+def close_supabase():
+    """Closes the shared connection pool (called on process shutdown)."""
+    global _client, _transport, _client_pid
+    with _client_lock:
+        if _transport is not None and _client_pid == os.getpid():
+            _transport.close()
+            logger.info("Supabase connection pool closed.")
+        _client = None
+        _transport = None
+        _client_pid = None
+
 
 def init_supabase(app):
-    """Initializes Supabase client setup (can be called in app factory)."""
-    # This function could potentially do more setup if needed
+    """Creates the process-wide Supabase client and registers its shutdown (called in app factory)."""
+    with app.app_context():
+        get_supabase_client()
+        if app.config.get('SUPABASE_HEALTHCHECK_ON_START'):
+            if check_supabase_health():
+                logger.info("Supabase health check passed.")
+            else:
+                logger.warning("Supabase health check failed at startup; requests will retry lazily.")
+    atexit.register(close_supabase)
     logger.info("Supabase client setup registered.")
-    # Teardown context could be added if complex cleanup is needed,
-    # but typically Supabase client doesn't require explicit closing per request.
-    # @app.teardown_appcontext
-    # def teardown_db(exception):
-    #     client = g.pop('supabase_client', None)
-    #     if client is not None:
-    #          # Cleanup if necessary
-    #          pass
+
+
+async def _execute(query):
+    """Runs a blocking PostgREST query off the event loop."""
+    return await asyncio.to_thread(query.execute)
 
 # --- Database Interaction Functions ---
 
@@ -44,7 +185,7 @@ async def store_generation_request(request_id: str, user_id: str, prompt: str, s
             'created_at': 'now()', # Use Supabase 'now()' function
             'updated_at': 'now()'
         }
-        response = await client.table('generation_requests').insert(data).execute()
+        response = await _execute(client.table('generation_requests').insert(data))
         logger.info(f"Stored generation request {request_id}: {response}")
         # Simple check: Check if response indicates success (e.g., data is present)
         return bool(response.data)
@@ -52,26 +193,48 @@ async def store_generation_request(request_id: str, user_id: str, prompt: str, s
         logger.error(f"Error storing generation request {request_id}: {e}", exc_info=True)
         return False
 
+async def store_generation_requests(rows: List[Dict]) -> bool:
+    """Stores many initial generation requests with a single bulk insert."""
+    client = get_supabase_client()
+    try:
+        now_rows = [{**row, 'created_at': 'now()', 'updated_at': 'now()'} for row in rows]
+        response = await _execute(client.table('generation_requests').insert(now_rows))
+        logger.info(f"Stored {len(rows)} generation requests in one insert.")
+        return len(response.data or []) == len(rows)
+    except Exception as e:
+        logger.error(f"Error bulk storing {len(rows)} generation requests: {e}", exc_info=True)
+        return False
+
+# Columns needed to build a StatusResponse; keep status queries projected to these
+STATUS_COLUMNS = ('id', 'status', 'result_url', 'error_message', 'thumbnails', 'blurhash', 'progress', 'version')
+
+def _status_from_row(row: Dict) -> Dict:
+    """Maps a generation_requests row to StatusResponse field names."""
+    return {
+        "request_id": row.get("id"),
+        "status": row.get("status"),
+        "result_url": row.get("result_url"),
+        "error_message": row.get("error_message"),
+        "thumbnails": row.get("thumbnails"),
+        "blurhash": row.get("blurhash"),
+        "progress": row.get("progress"),
+        "version": row.get("version")
+    }
+
 async def get_generation_status(request_id: str) -> Optional[dict]:
     """Retrieves the status and result URL for a generation request."""
     client = get_supabase_client()
     try:
         # Select only necessary columns
-        response = await client.table('generation_requests') \
-                         .select('id', 'status', 'result_url', 'error_message') \
+        response = await _execute(client.table('generation_requests') \
+                         .select(*STATUS_COLUMNS) \
                          .eq('id', request_id) \
-                         .maybe_single() \
-                         .execute()
+                         .maybe_single())
 
         logger.debug(f"Status query response for {request_id}: {response}")
-        if response.data:
+        if response and response.data:
             # Map db field names to StatusResponse field names if they differ
-            return {
-                "request_id": response.data.get("id"),
-                "status": response.data.get("status"),
-                "result_url": response.data.get("result_url"),
-                "error_message": response.data.get("error_message")
-            }
+            return _status_from_row(response.data)
         else:
             logger.warning(f"Generation request {request_id} not found.")
             return None
@@ -79,25 +242,142 @@ async def get_generation_status(request_id: str) -> Optional[dict]:
         logger.error(f"Error retrieving status for {request_id}: {e}", exc_info=True)
         return None
 
+async def update_generation_request(request_id: str, fields: Dict) -> bool:
+    """Updates columns of an existing generation request."""
+    client = get_supabase_client()
+    try:
+        response = await _execute(client.table('generation_requests')
+                                  .update({**fields, 'updated_at': 'now()'})
+                                  .eq('id', request_id))
+        logger.info(f"Updated generation request {request_id}: {list(fields)}")
+        return bool(response.data)
+    except Exception as e:
+        logger.error(f"Error updating generation request {request_id}: {e}", exc_info=True)
+        return False
+
+async def compare_and_set_generation_request(request_id: str, expected_version: int, fields: Dict) -> Optional[Dict]:
+    """
+    Updates a generation request only if its version is still expected_version (optimistic lock;
+    fields should set the next version). Returns the new status, or None if the row changed
+    in the meantime, does not exist, or the update failed.
+    """
+    client = get_supabase_client()
+    try:
+        response = await _execute(client.table('generation_requests')
+                                  .update({**fields, 'updated_at': 'now()'})
+                                  .eq('id', request_id)
+                                  .eq('version', expected_version))
+        if not response.data:
+            return None
+        logger.info(f"Updated generation request {request_id} to version {fields.get('version')}: {list(fields)}")
+        return _status_from_row(response.data[0])
+    except Exception as e:
+        logger.error(f"Error updating generation request {request_id} at version {expected_version}: {e}", exc_info=True)
+        return None
+
+async def update_generation_requests(request_ids: List[str], fields: Dict) -> bool:
+    """Updates the same columns on many generation requests in one call."""
+    client = get_supabase_client()
+    try:
+        response = await _execute(client.table('generation_requests')
+                                  .update({**fields, 'updated_at': 'now()'})
+                                  .in_('id', request_ids))
+        logger.info(f"Updated {len(request_ids)} generation requests: {list(fields)}")
+        return bool(response.data)
+    except Exception as e:
+        logger.error(f"Error updating generation requests {request_ids}: {e}", exc_info=True)
+        return False
+
+async def get_generation_statuses(request_ids: List[str]) -> Optional[Dict[str, Dict]]:
+    """Retrieves the statuses of many generation requests with a single `in` query, keyed by request id (None on error)."""
+    if not request_ids:
+        return {}
+    client = get_supabase_client()
+    try:
+        response = await _execute(client.table('generation_requests')
+                                  .select(*STATUS_COLUMNS)
+                                  .in_('id', request_ids))
+        return {row['id']: _status_from_row(row) for row in response.data or []}
+    except Exception as e:
+        logger.error(f"Error retrieving statuses for {len(request_ids)} requests: {e}", exc_info=True)
+        return None
+
+async def get_stale_generation_requests(updated_before: str, after: Optional[Tuple[str, str]], limit: int) -> Optional[List[Dict]]:
+    """
+    One keyset page of 'processing' requests last updated before `updated_before` (ISO timestamp),
+    ordered by (updated_at, id) and starting after the `after` cursor (updated_at, id).
+    Served by the partial index generation_requests_processing_idx (see supabase/migrations/).
+    Returns the rows (id, user_id, prompt, reference_image_path, version, updated_at), or None on error.
+    """
+    client = get_supabase_client()
+    try:
+        query = (client.table('generation_requests')
+                 .select('id', 'user_id', 'prompt', 'reference_image_path', 'version', 'updated_at')
+                 .eq('status', 'processing')
+                 .lt('updated_at', updated_before))
+        if after:
+            updated_at, request_id = after
+            query = query.or_(f'updated_at.gt."{updated_at}",and(updated_at.eq."{updated_at}",id.gt."{request_id}")')
+        response = await _execute(query.order('updated_at').order('id').limit(limit))
+        return response.data or []
+    except Exception as e:
+        logger.error(f"Error scanning stale generation requests: {e}", exc_info=True)
+        return None
+
+async def get_generation_prompts(request_ids: List[str]) -> Optional[Dict[str, str]]:
+    """Prompts of many generation requests with a single `in` query, keyed by request id (None on error)."""
+    if not request_ids:
+        return {}
+    client = get_supabase_client()
+    try:
+        response = await _execute(client.table('generation_requests').select('id', 'prompt').in_('id', request_ids))
+        return {row['id']: row['prompt'] for row in response.data or []}
+    except Exception as e:
+        logger.error(f"Error retrieving prompts for {len(request_ids)} requests: {e}", exc_info=True)
+        return None
+
+async def store_feedback(rows: List[Dict]) -> bool:
+    """Stores many feedback entries with a single bulk insert."""
+    client = get_supabase_client()
+    try:
+        await _execute(client.table('feedback').insert(rows, returning=ReturnMethod.minimal)) # No rows sent back
+        logger.info(f"Stored {len(rows)} feedback entries in one insert.")
+        return True
+    except Exception as e:
+        logger.error(f"Error bulk storing {len(rows)} feedback entries: {e}", exc_info=True)
+        return False
+
 # --- Storage Interaction Functions ---
 
-async def upload_reference_image(file_storage, user_id: str, request_id: str) -> Optional[str]:
-    """Uploads a reference image to Supabase Storage."""
+REFERENCE_IMAGE_BUCKET = "reference-images" # Or your configured bucket name
+
+def reference_image_path(filename: str, user_id: str, request_id: str) -> str:
+    """Builds the storage path for a reference image, e.g. user_id/request_id/reference.ext."""
+    file_ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else 'png' # Default extension
+    return f"{user_id}/{request_id}/reference.{file_ext}"
+
+async def upload_reference_image(file_storage, user_id: str, request_id: str, file_content: Optional[bytes] = None) -> Optional[str]:
+    """
+    Uploads a reference image to Supabase Storage. Pass file_content if the stream was already read;
+    otherwise a file-backed upload stream (HashingUploadFile) is sent in chunks without loading it.
+    """
     client = get_supabase_client()
     if not file_storage or not file_storage.filename:
         return None
 
-    file_ext = file_storage.filename.rsplit('.', 1)[1].lower() if '.' in file_storage.filename else 'png' # Default extension
-    # Construct a unique path, e.g., user_id/request_id/reference.ext
-    file_path = f"{user_id}/{request_id}/reference.{file_ext}"
-    bucket_name = "reference-images" # Or your configured bucket name
+    file_path = reference_image_path(file_storage.filename, user_id, request_id)
+    bucket_name = REFERENCE_IMAGE_BUCKET
 
     try:
         # Ensure bucket exists or handle creation elsewhere if needed
-        # Upload file content. Ensure file_storage is read correctly.
-        # The Supabase client might need bytes.
-        file_content = file_storage.read()
-        response = await client.storage.from_(bucket_name).upload(
+        if file_content is None:
+            if isinstance(file_storage.stream, io.FileIO):
+                file_storage.stream.seek(0)
+                file_content = file_storage.stream # storage3 streams FileIO objects as multipart
+            else:
+                file_content = file_storage.read()
+        response = await asyncio.to_thread(
+            client.storage.from_(bucket_name).upload,
             path=file_path,
             file=file_content,
             file_options={"content-type": file_storage.content_type, "upsert": "true"} # Upsert allows overwriting
@@ -113,4 +393,87 @@ async def upload_reference_image(file_storage, user_id: str, request_id: str) ->
 
     except Exception as e:
         logger.error(f"Error uploading reference image {file_path}: {e}", exc_info=True)
-        return None
\ No newline at end of file
+        return None
+
+async def create_reference_upload_url(file_path: str) -> Optional[Dict]:
+    """Creates a signed URL the client can upload a reference image to directly. Returns {'signed_url', 'token'}."""
+    client = get_supabase_client()
+    try:
+        response = await asyncio.to_thread(client.storage.from_(REFERENCE_IMAGE_BUCKET).create_signed_upload_url, file_path)
+        return {"signed_url": response["signed_url"], "token": response["token"]}
+    except Exception as e:
+        logger.error(f"Error creating signed upload URL for {file_path}: {e}", exc_info=True)
+        return None
+
+async def get_reference_image_info(file_path: str) -> Optional[Dict]:
+    """Returns {'size', 'content_type', 'etag'} of a stored reference image, or None if it does not exist."""
+    client = get_supabase_client()
+    try:
+        info = await asyncio.to_thread(client.storage.from_(REFERENCE_IMAGE_BUCKET).info, file_path)
+    except Exception as e:
+        logger.warning(f"Reference image {file_path} not found or not readable: {e}")
+        return None
+    if isinstance(info, list): # Older storage API versions wrap the object in a list
+        info = info[0] if info else {}
+    metadata = info.get("metadata") or {}
+    etag = info.get("etag") or info.get("eTag") or metadata.get("eTag")
+    return {
+        "size": info.get("size") or metadata.get("size"),
+        "content_type": info.get("content_type") or metadata.get("mimetype"),
+        "etag": etag.strip('"') if etag else None,
+    }
+
+async def create_signed_reference_url(file_path: str, expires_in: int) -> Optional[str]:
+    """Creates a short-lived read URL for a stored reference image (e.g. for Grok Vision)."""
+    client = get_supabase_client()
+    try:
+        response = await asyncio.to_thread(client.storage.from_(REFERENCE_IMAGE_BUCKET).create_signed_url, file_path, expires_in)
+        return response.get("signedURL") or response.get("signedUrl")
+    except Exception as e:
+        logger.error(f"Error creating signed URL for {file_path}: {e}", exc_info=True)
+        return None
+
+GENERATED_IMAGE_BUCKET = "generated-images"
+
+def generated_image_path(request_id: str) -> str:
+    """Storage path of a generation result, e.g. request_id/result.png."""
+    return f"{request_id}/result.png"
+
+async def create_signed_image_urls(paths: List[str], expires_in: int) -> Optional[Dict[str, str]]:
+    """Signs many generated-image paths with one storage call. Returns {path: signed_url} for the paths that exist."""
+    client = get_supabase_client()
+    try:
+        response = await asyncio.to_thread(client.storage.from_(GENERATED_IMAGE_BUCKET).create_signed_urls, paths, expires_in)
+        return {item['path']: item['signedURL'] for item in response if not item.get('error') and item.get('signedURL')}
+    except Exception as e:
+        logger.error(f"Error creating signed URLs for {len(paths)} images: {e}", exc_info=True)
+        return None
+
+def derivative_image_path(request_id: str, width: int) -> str:
+    """Storage path of a resized WebP derivative of a result, e.g. request_id/w256.webp."""
+    return f"{request_id}/w{width}.webp"
+
+async def upload_generated_image(file_path: str, data: bytes, content_type: str) -> Optional[str]:
+    """Uploads an image to the generated-images bucket; returns its public URL or None."""
+    client = get_supabase_client()
+    bucket = client.storage.from_(GENERATED_IMAGE_BUCKET)
+    try:
+        await asyncio.to_thread(
+            bucket.upload,
+            path=file_path,
+            file=data,
+            file_options={"content-type": content_type, "cache-control": "31536000", "upsert": "true"} # Paths are immutable per result
+        )
+        return bucket.get_public_url(file_path)
+    except Exception as e:
+        logger.error(f"Error uploading generated image {file_path}: {e}", exc_info=True)
+        return None
+
+async def download_reference_image(file_path: str) -> Optional[bytes]:
+    """Downloads a stored reference image (used by the worker); returns None if it cannot be read."""
+    client = get_supabase_client()
+    try:
+        return await asyncio.to_thread(client.storage.from_(REFERENCE_IMAGE_BUCKET).download, file_path)
+    except Exception as e:
+        logger.error(f"Error downloading reference image {file_path}: {e}", exc_info=True)
+        return None
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, HttpUrl
-from typing import Optional, List
+from typing import Optional, List, Dict, Literal
 
 class Request(BaseModel):
     prompt: str = Field(..., min_length=1, description="Text prompt for image generation")
@@ -11,14 +11,148 @@ class Request(BaseModel):
 
 class Response(BaseModel):
     request_id: str = Field(..., description="Unique ID for the generation request")
+    status: str = Field('processing', description="Status of the request ('processing', 'succeeded')")
+    result_url: Optional[str] = Field(None, description="URL of the existing result (deduplicated, succeeded requests only)")
+    deduplicated: bool = Field(False, description="True if an identical earlier request was reused instead of queueing a new job")
+
+class BatchVariant(BaseModel):
+    prompt: Optional[str] = Field(None, min_length=1, description="Replaces the base prompt for this variant")
+    seed: Optional[int] = Field(None, description="Generation seed for this variant")
+
+class BatchResponse(BaseModel):
+    batch_id: str = Field(..., description="ID shared by the batch's tasks")
+    request_ids: List[str] = Field(..., description="Request IDs of the variants, in submission order")
+
+class UploadCreateRequest(BaseModel):
+    content_type: str = Field(..., description="MIME type of the image that will be uploaded (image/png, image/jpeg, image/webp)")
+
+class UploadCreateResponse(BaseModel):
+    upload_id: str = Field(..., description="Pass as 'upload_id' to /api/generate once the upload finished")
+    upload_url: str = Field(..., description="Signed URL to PUT the image to directly")
+    token: str = Field(..., description="Upload token contained in upload_url")
+    path: str = Field(..., description="Storage path the image will be stored under")
+    expires_in: int = Field(..., description="Seconds the signed upload URL stays valid")
 
 class StatusResponse(BaseModel):
     request_id: str = Field(..., description="The ID being polled")
     status: str = Field(..., description="Current status ('processing', 'succeeded', 'failed')")
     result_url: Optional[HttpUrl] = Field(None, description="URL of the d image (if status is 'succeeded')")
     error_message: Optional[str] = Field(None, description="Error details (if status is 'failed')")
+    thumbnails: Optional[Dict[str, HttpUrl]] = Field(None, description="WebP derivatives of the result keyed by width in px (once generated)")
+    blurhash: Optional[str] = Field(None, description="BlurHash placeholder of the result (once generated)")
+    progress: Optional[int] = Field(None, ge=0, le=100, description="Percent complete reported by the worker")
+    version: Optional[int] = Field(None, description="Incremented on every status transition; a higher version is always newer")
+
+class StatusTransitionRequest(BaseModel):
+    status: Literal['processing', 'succeeded', 'failed'] = Field(..., description="Target status")
+    progress: Optional[int] = Field(None, ge=0, le=100, description="Percent complete (processing only; must increase)")
+    result_url: Optional[HttpUrl] = Field(None, description="URL of the generated image (required for 'succeeded')")
+    error_message: Optional[str] = Field(None, max_length=2000, description="Error details (for 'failed')")
+    thumbnails: Optional[Dict[str, str]] = Field(None, description="Thumbnail URLs by width (for 'succeeded')")
+    blurhash: Optional[str] = Field(None, max_length=100, description="BlurHash placeholder of the result (for 'succeeded')")
+    version: Optional[int] = Field(None, description="Only apply if the request is still at this version")
+
+class StatusTransitionResponse(BaseModel):
+    outcome: str = Field(..., description="'applied', 'ignored' (duplicate/stale report, nothing changed) or 'conflict'")
+    status: StatusResponse = Field(..., description="Status of the request after the call")
+
+class BulkStatusResponse(BaseModel):
+    statuses: List[StatusResponse] = Field(..., description="Statuses of the requested IDs that exist, in request order")
+    missing: List[str] = Field([], description="Requested IDs that were not found")
+
+class SignedImageUrl(BaseModel):
+    imageId: str = Field(..., description="The ID of the image (generation request ID)")
+    signedUrl: str = Field(..., description="The temporary pre-signed URL for the image")
+    expiresAt: int = Field(..., description="Unix time at which signedUrl expires")
+
+class SignedImageUrlsResponse(BaseModel):
+    urls: List[SignedImageUrl] = Field(..., description="Signed URLs of the requested images that exist, in request order")
+    missing: List[str] = Field([], description="Requested IDs without a stored image")
 
 class UserProfile(BaseModel):
     user_id: str
     roles: List[str] = []
-    # Add other user details if needed
\ No newline at end of file
+    # Add other user details if needed
+
+class DnaAssetThumbnail(BaseModel):
+    width: int = Field(..., description="Width in pixels")
+    height: int = Field(..., description="Height in pixels")
+    bytes: Optional[int] = Field(None, description="File size (None until the thumbnail has been derived)")
+    url: str = Field(..., description="Path of the thumbnail under /api/dna/assets")
+
+class DnaAsset(BaseModel):
+    url: str = Field(..., description="Path of the full-size WebP under /api/dna/assets (content-hashed, cacheable forever)")
+    width: int = Field(..., description="Width in pixels")
+    height: int = Field(..., description="Height in pixels")
+    bytes: int = Field(..., description="File size")
+    thumbnails: List[DnaAssetThumbnail] = Field([], description="Downscaled copies, narrowest first")
+
+class DnaImage(BaseModel):
+    case_id: str = Field(..., description="Product case ID (e.g. 'cm01'); a case has one row per view")
+    name: str = Field(..., description="Product name")
+    view: str = Field(..., description="Camera view of the image (e.g. 'Left45', 'Front')")
+    image_url: str = Field(..., description="URL of the product image")
+    styles: List[str] = Field([], description="Design styles (e.g. 'Minimalist', 'High Airflow')")
+    colors: List[str] = Field([], description="Colors of the case")
+    lighting: bool = Field(..., description="True if the case has RGB/ARGB lighting")
+    keywords: List[str] = Field([], description="Design keyword phrases")
+    asset: Optional[DnaAsset] = Field(None, description="Locally served copy of the image (None until `flask dna-assets` has bundled it)")
+
+class DnaQueryResponse(BaseModel):
+    items: List[DnaImage] = Field(..., description="One page of matching images, in table order")
+    total: int = Field(..., description="Number of images matching the filters")
+    offset: int = Field(..., description="Offset of the first item")
+    limit: int = Field(..., description="Page size used")
+
+class DnaCaseResponse(BaseModel):
+    case_id: str = Field(..., description="Product case ID")
+    name: str = Field(..., description="Product name")
+    images: List[DnaImage] = Field(..., description="Every view of the case")
+
+class DnaFacetsResponse(BaseModel):
+    total: int = Field(..., description="Number of images matching the filters")
+    facets: Dict[str, Dict[str, int]] = Field(..., description="Per facet, the number of matching images for each value")
+
+class DnaSimilarMatch(BaseModel):
+    path: str = Field(..., description="Image path relative to the DNA data directory (<model>/<file>.webp)")
+    model: str = Field(..., description="Product folder the image belongs to")
+    case_id: Optional[str] = Field(None, description="DNA case of the image, if known")
+    view: str = Field(..., description="Camera view of the image")
+    score: float = Field(..., description="Cosine similarity to the query image (higher is closer)")
+    name: Optional[str] = Field(None, description="Product name (if the case is known)")
+    styles: List[str] = Field([], description="Design styles of the case")
+    colors: List[str] = Field([], description="Colors of the case")
+    lighting: Optional[bool] = Field(None, description="True if the case has RGB/ARGB lighting")
+    keywords: List[str] = Field([], description="DNA keyword phrases of the case")
+
+class DnaSimilarResponse(BaseModel):
+    matches: List[DnaSimilarMatch] = Field(..., description="Closest DNA images, best first")
+
+class FeedbackSubmission(BaseModel):
+    request_id: str = Field(..., min_length=1, max_length=64, description="Generation request the feedback is about")
+    rating: int = Field(..., ge=1, le=5, description="Rating from 1 (worst) to 5 (best)")
+    comment: Optional[str] = Field(None, max_length=2000, description="Free-text comment")
+    tags: List[str] = Field([], max_length=20, description="Short labels (e.g. 'wrong color', 'great lighting')")
+
+class FeedbackAcceptedResponse(BaseModel):
+    accepted: int = Field(..., description="Number of feedback entries queued for storage")
+
+class RatingStats(BaseModel):
+    count: int = Field(..., description="Number of ratings")
+    mean: Optional[float] = Field(None, description="Mean rating (None without ratings)")
+    histogram: Dict[str, int] = Field(..., description="Number of ratings per value, '1' to '5'")
+    last_rated_at: Optional[str] = Field(None, description="ISO timestamp of the latest rating")
+
+class RequestRatingStats(RatingStats):
+    request_id: str
+
+class PromptRatingStats(RatingStats):
+    prompt_key: str = Field(..., description="Hash of the normalized prompt")
+    prompt: str = Field(..., description="The prompt (first one seen for this key)")
+
+class RequestRatingStatsResponse(BaseModel):
+    stats: List[RequestRatingStats] = Field(..., description="Aggregates of the requested IDs that have ratings, in request order")
+    missing: List[str] = Field([], description="Requested IDs without ratings")
+
+class PromptRatingStatsResponse(BaseModel):
+    prompts: List[PromptRatingStats] = Field(..., description="Most rated prompts, most ratings first")
@@ -5,4 +5,9 @@ from flask import Blueprint
 # Import the actual blueprints defined in other files within this 'routes' directory.
 # Make sure you have 'generate.py' defining 'generate_bp' and 'auth.py' defining 'auth_bp'.
 from .generate import generate_bp
-from .auth import auth_bp
\ No newline at end of file
+from .auth import auth_bp
+from .health import health_bp
+from .uploads import uploads_bp
+from .images import images_bp
+from .dna import dna_bp
+from .feedback import feedback_bp
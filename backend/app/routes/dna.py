@@ -0,0 +1,132 @@
+# backend/app/routes/dna.py
+
+import asyncio
+import logging
+from typing import Dict, List
+from flask import Blueprint, request, jsonify, current_app, send_file
+from werkzeug.exceptions import BadRequest, NotFound, ServiceUnavailable
+from flasgger import swag_from
+
+from app.services.auth_service import admin_required
+from app.services import dna_service, dna_similarity_service, dna_asset_service
+from app.models.schemas import DnaImage, DnaQueryResponse, DnaCaseResponse, DnaFacetsResponse
+from app.models.schemas import DnaSimilarMatch, DnaSimilarResponse
+
+logger = logging.getLogger(__name__)
+dna_bp = Blueprint('dna_api', __name__)
+
+_LIGHTING_VALUES = {'yes': 'yes', 'true': 'yes', '1': 'yes', 'no': 'no', 'false': 'no', '0': 'no'}
+
+
+def _filters() -> Dict[str, List[str]]:
+    """Facet filters from the query string; a facet may be repeated or comma-separated."""
+    filters = {}
+    for facet in dna_service.FACETS:
+        values = [v.strip() for raw in request.args.getlist(facet) for v in raw.split(',') if v.strip()]
+        if not values:
+            continue
+        if facet == 'lighting':
+            if any(v.lower() not in _LIGHTING_VALUES for v in values):
+                raise BadRequest("'lighting' must be true or false.")
+            values = [_LIGHTING_VALUES[v.lower()] for v in values]
+        filters[facet] = values
+    return filters
+
+
+def _int_arg(name: str, default: int, minimum: int, maximum: int) -> int:
+    try:
+        value = int(request.values.get(name, default))
+    except ValueError:
+        raise BadRequest(f"'{name}' must be an integer.")
+    if not minimum <= value <= maximum:
+        raise BadRequest(f"'{name}' must be between {minimum} and {maximum}.")
+    return value
+
+
+def _to_model(image: dna_service.DnaImage) -> DnaImage:
+    return DnaImage(case_id=image.case_id, name=image.name, view=image.view, image_url=image.image_url,
+                    styles=list(image.styles), colors=list(image.colors), lighting=image.lighting,
+                    keywords=list(image.keywords), asset=dna_asset_service.describe_asset(image))
+
+
+# --- Route Definitions ---
+
+# GET /api/dna
+@dna_bp.route('', methods=['GET'])
+@admin_required
+@swag_from('../swagger_docs/dna_query.yml')
+def query_dna():
+    """Lists DNA images matching facet filters, one page at a time (Admin Only)."""
+    filters = _filters()
+    limit = _int_arg('limit', 20, 1, current_app.config['DNA_PAGE_MAX'])
+    offset = _int_arg('offset', 0, 0, 1_000_000)
+
+    total, images = dna_service.get_catalog().query(filters, offset, limit)
+    response_model = DnaQueryResponse(items=[_to_model(i) for i in images], total=total, offset=offset, limit=limit)
+    return jsonify(response_model.model_dump())
+
+
+# GET /api/dna/facets
+@dna_bp.route('/facets', methods=['GET'])
+@admin_required
+@swag_from('../swagger_docs/dna_facets.yml')
+def get_dna_facets():
+    """Counts DNA images per facet value, optionally within facet filters (Admin Only)."""
+    catalog = dna_service.get_catalog()
+    mask = catalog.match(_filters())
+    response_model = DnaFacetsResponse(total=catalog.count(mask), facets=catalog.facet_counts(mask))
+    return jsonify(response_model.model_dump())
+
+
+# GET /api/dna/cases/<case_id>
+@dna_bp.route('/cases/<string:case_id>', methods=['GET'])
+@admin_required
+@swag_from('../swagger_docs/dna_case.yml')
+def get_dna_case(case_id: str):
+    """Gets every view of one product case (Admin Only)."""
+    images = dna_service.get_catalog().case(case_id)
+    if not images:
+        raise NotFound(f"Case '{case_id}' not found.")
+    response_model = DnaCaseResponse(case_id=case_id, name=images[0].name, images=[_to_model(i) for i in images])
+    return jsonify(response_model.model_dump())
+
+
+# POST /api/dna/similar
+@dna_bp.route('/similar', methods=['POST'])
+@admin_required
+@swag_from('../swagger_docs/dna_similar.yml')
+async def find_similar_dna():
+    """Finds the DNA product images closest to an uploaded image (Admin Only)."""
+    image_file = request.files.get('image')
+    if not image_file or not image_file.filename:
+        raise BadRequest("Missing required file: 'image'")
+    k = _int_arg('k', current_app.config['DNA_SIMILAR_TOP_K'], 1, current_app.config['DNA_SIMILAR_MAX_K'])
+    per_case = request.values.get('per_case', 'true').lower() != 'false'
+
+    try:
+        matches = await dna_similarity_service.find_similar(await asyncio.to_thread(image_file.read), k, per_case)
+    except dna_similarity_service.DnaIndexError as e:
+        raise BadRequest(str(e))
+    if matches is None:
+        raise ServiceUnavailable("The DNA similarity index has not been built yet.")
+    response_model = DnaSimilarResponse(matches=[DnaSimilarMatch(**match) for match in matches])
+    return jsonify(response_model.model_dump())
+
+
+# GET /api/dna/assets/<filename>
+@dna_bp.route('/assets/<string:filename>', methods=['GET'])
+@swag_from('../swagger_docs/dna_asset.yml')
+def get_dna_asset(filename: str):
+    """
+    Serves a DNA image or thumbnail from the asset bundle. Public, like the table's original
+    image URLs, so <img> tags can load it; names are content-hashed, hence immutable caching.
+    """
+    path = dna_asset_service.resolve_asset(filename) # May encode a thumbnail on its first request
+    if path is None:
+        raise NotFound(f"Asset '{filename}' not found.")
+    # conditional=True answers If-None-Match with 304 and Range with 206
+    response = send_file(path, mimetype='image/webp', etag=filename.rsplit('.', 1)[0], conditional=True,
+                         max_age=current_app.config['DNA_ASSET_MAX_AGE'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
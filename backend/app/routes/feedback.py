@@ -1,48 +1,90 @@
 # backend/app/routes/feedback.py
-from flask import Blueprint, request, jsonify
-from flasgger import swag_from
+
 import logging
+from flask import Blueprint, request, jsonify, current_app
+from werkzeug.exceptions import BadRequest, InternalServerError, ServiceUnavailable
+from pydantic import ValidationError
+from flasgger import swag_from
 
-# 導入 Supabase client function
-try:
-    from ..db.supabase_client import save_feedback
-except ImportError:
-    logging.error("Failed to import save_feedback from supabase_client")
-    def save_feedback(data): print("STUB: save_feedback")
+from app.services.auth_service import admin_required, get_current_user
+from app.services import feedback_service
+from app.models.schemas import FeedbackSubmission, FeedbackAcceptedResponse
+from app.models.schemas import RequestRatingStats, RequestRatingStatsResponse, PromptRatingStats, PromptRatingStatsResponse
 
 logger = logging.getLogger(__name__)
-bp = Blueprint("feedback", __name__)
-
-@bp.route("/feedback", methods=["POST"])
-@swag_from({ # Use the user's latest spec
-    "tags": ["Feedback"],
-    "summary": "Submit feedback for a d image",
-    # ... parameters (request_id, rating, comment, tags)...
-    # ... responses ...
-})
+feedback_bp = Blueprint('feedback_api', __name__)
+
+
+# --- Route Definitions ---
+
+# POST /api/feedback
+@feedback_bp.route('', methods=['POST'])
+@admin_required
+@swag_from('../swagger_docs/feedback_post.yml')
 def submit_feedback():
-    data = request.get_json()
-    logger.info(f"Received POST /api/feedback request: {data}")
+    """Submits one rating, or a whole grid of them, for batched storage (Admin Only)."""
+    user = get_current_user()
+    if not user:
+        raise InternalServerError("User context not found after auth check.")
 
-    if not data or 'request_id' not in data or 'rating' not in data:
-        logger.warning("Missing required fields in feedback request.")
-        return jsonify({"error": "Missing required fields: request_id, rating"}), 400
+    body = request.get_json(silent=True)
+    items = body.get('items') if isinstance(body, dict) and 'items' in body else body
+    if isinstance(items, dict):
+        items = [items]
+    if not isinstance(items, list) or not items:
+        raise BadRequest("Body must be a feedback object, an array of them, or {\"items\": [...]}.")
+    max_items = current_app.config['FEEDBACK_MAX_ITEMS']
+    if len(items) > max_items:
+        raise BadRequest(f"At most {max_items} feedback entries can be submitted at once.")
+    try:
+        submissions = [FeedbackSubmission(**item) for item in items]
+    except (TypeError, ValidationError) as e:
+        raise BadRequest(f"Invalid feedback: {e}")
+
+    try:
+        accepted = feedback_service.enqueue_feedback(user.user_id, submissions)
+    except feedback_service.FeedbackBufferFull as e:
+        logger.warning(f"Rejecting feedback from {user.user_id}: {e}")
+        raise ServiceUnavailable("Feedback is arriving faster than it can be stored; retry shortly.")
+    response_model = FeedbackAcceptedResponse(accepted=accepted)
+    return jsonify(response_model.model_dump()), 202
 
-    # Prepare data for Supabase (match DB schema)
-    feedback_to_save = {
-        "request_id": data["request_id"],
-        "rating": data["rating"], # Ensure this matches DB type (e.g., int or text)
-        "comment": data.get("comment"),
-        "tags": data.get("tags") # Ensure DB column type is array (e.g., text[])
-    }
-    # Remove None values if DB doesn't handle them well
-    feedback_to_save = {k: v for k, v in feedback_to_save.items() if v is not None}
 
+# GET /api/feedback/stats
+@feedback_bp.route('/stats', methods=['GET'])
+@admin_required
+@swag_from('../swagger_docs/feedback_stats.yml')
+def get_request_rating_stats():
+    """Gets the rating aggregates of generation requests (Admin Only)."""
+    request_ids = list(dict.fromkeys(i.strip() for i in request.args.get('request_ids', '').split(',') if i.strip()))
+    if not request_ids:
+        raise BadRequest("Missing required parameter: 'request_ids'")
+    max_ids = current_app.config['FEEDBACK_MAX_ITEMS']
+    if len(request_ids) > max_ids:
+        raise BadRequest(f"At most {max_ids} request ids can be looked up at once.")
 
+    stats = feedback_service.get_request_stats(request_ids)
+    response_model = RequestRatingStatsResponse(
+        stats=[RequestRatingStats(request_id=i, **stats[i]) for i in request_ids if i in stats],
+        missing=[i for i in request_ids if i not in stats]
+    )
+    return jsonify(response_model.model_dump())
+
+
+# GET /api/feedback/stats/prompts
+@feedback_bp.route('/stats/prompts', methods=['GET'])
+@admin_required
+@swag_from('../swagger_docs/feedback_stats_prompts.yml')
+def get_prompt_rating_stats():
+    """Gets the rating aggregates of the most rated prompts (Admin Only)."""
+    max_limit = current_app.config['FEEDBACK_TOP_PROMPTS_MAX']
     try:
-        save_feedback(feedback_to_save) # Call Supabase client function
-        logger.info(f"Feedback for request_id {data['request_id']} processed.")
-        return jsonify({"status": "ok"})
-    except Exception as e:
-        logger.error(f"Error saving feedback via Supabase client: {e}", exc_info=True)
-        return jsonify({"error": "Failed to save feedback"}), 500
\ No newline at end of file
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        raise BadRequest("'limit' must be an integer.")
+    if not 1 <= limit <= max_limit:
+        raise BadRequest(f"'limit' must be between 1 and {max_limit}.")
+
+    response_model = PromptRatingStatsResponse(
+        prompts=[PromptRatingStats(**stats) for stats in feedback_service.get_top_prompts(limit)])
+    return jsonify(response_model.model_dump())
@@ -1,16 +1,21 @@
+import json
+import random
+import asyncio
+import hashlib
 import logging
-import uuid
-from flask import request, jsonify, current_app
-from werkzeug.exceptions import BadRequest, NotFound, InternalServerError
+import redis
+from typing import Optional, Dict
+from flask import request, jsonify, g, current_app, Response
+from werkzeug.exceptions import BadRequest, NotFound, InternalServerError, ServiceUnavailable
 from pydantic import ValidationError
 from flasgger import swag_from
 
-from app.services import grok_service, task_queue_service
-
-from app.services.auth_service import admin_required, get_current_user
-from app.services import generation_service
 from app.db import supabase_client
-from app.models.schemas import Response, StatusResponse
+from app.services.auth_service import admin_required, get_current_user
+from app.services import generation_service, notification_service, image_service, upload_service
+from app.services import status_cache_service, status_service
+from app.models.schemas import StatusResponse, BulkStatusResponse, BatchVariant
+from app.models.schemas import StatusTransitionRequest, StatusTransitionResponse
 
 from flask import Blueprint
 
@@ -18,6 +23,25 @@ generate_bp = Blueprint('generate', __name__)
 
 logger = logging.getLogger(__name__)
 
+def _is_form_request() -> bool:
+    """Multipart (file upload) or, when referencing a direct upload, a plain urlencoded form."""
+    content_type = (request.content_type or '').lower()
+    return 'multipart/form-data' in content_type or 'application/x-www-form-urlencoded' in content_type
+
+
+async def _resolve_reference_upload(user_id: str, reference_image_file) -> Optional[Dict]:
+    """Resolves the optional 'upload_id' form field (see POST /api/uploads)."""
+    upload_id = request.form.get('upload_id')
+    if not upload_id:
+        return None
+    if reference_image_file and reference_image_file.filename:
+        raise BadRequest("Provide either 'reference_image' or 'upload_id', not both.")
+    try:
+        return await upload_service.resolve_upload(upload_id, user_id)
+    except upload_service.UploadError as e:
+        raise BadRequest(str(e))
+
+
 @generate_bp.route('/generate', methods=['POST'])
 @admin_required # Only admins can 
 @swag_from('../swagger_docs/generate_post.yml')
@@ -28,8 +52,8 @@ async def submit_generation():
     if not user:
          raise InternalServerError("User context not found after auth check.") # Should not happen
 
-    # Check content type - expect multipart/form-data
-    if not request.content_type or 'multipart/form-data' not in request.content_type.lower():
+    # Check content type - expect multipart/form-data (or a urlencoded form with upload_id)
+    if not _is_form_request():
          raise BadRequest("Content-Type must be multipart/form-data")
 
     # --- 1. Extract Data ---
@@ -38,88 +62,239 @@ async def submit_generation():
     # Convert string flags from form data to boolean
     analyze_image_flag = request.form.get('analyze_image', 'false').lower() == 'true'
     optimize_prompt_flag = request.form.get('optimize_prompt', 'false').lower() == 'true'
+    llm_rewrite_flag = request.form.get('llm_rewrite', 'false').lower() == 'true'
+    force_new_flag = request.form.get('force_new', 'false').lower() == 'true'
 
     if not prompt:
         raise BadRequest("Missing required field: 'prompt'")
 
+    reference_upload = await _resolve_reference_upload(user.user_id, reference_image_file)
+
     logger.info(f"Received generation request from admin {user.user_id} with prompt: '{prompt}'")
 
-    # --- 2. Handle Reference Image (Optional) ---
-    reference_image_path = None
-    reference_image_url = None # Needed if analyze_image is true
-    if reference_image_file:
-        logger.info(f"Processing reference image: {reference_image_file.filename}")
-        reference_image_path = await supabase_client.upload_reference_image(
-            reference_image_file, user.user_id, str(uuid.uuid4()) #  temporary ID for path if needed before request_id
+    # --- 2. Upload, Analyze, Optimize, Store & Trigger Worker ---
+    try:
+        response_data = await generation_service.process_generation_submission(
+            user_id=user.user_id,
+            prompt=prompt,
+            reference_image_file=reference_image_file,
+            reference_upload=reference_upload,
+            analyze_image_flag=analyze_image_flag,
+            optimize_prompt_flag=optimize_prompt_flag,
+            llm_rewrite_flag=llm_rewrite_flag,
+            force_new=force_new_flag
         )
-        if not reference_image_path:
-            logger.error("Failed to upload reference image.")
-            # Decide if this is a fatal error or just proceed without ref image
-            # raise InternalServerError("Failed to upload reference image.")
-        else:
-             # Get public URL if needed for analysis
-             try:
-                 # Construct the URL based on bucket and path - adjust as per your Supabase setup
-                 bucket_name = "reference-images" # Example bucket
-                 reference_image_url = f"{current_app.config['SUPABASE_URL']}/storage/v1/object/public/{bucket_name}/{reference_image_path}"
-                 logger.info(f"Reference image uploaded to path: {reference_image_path}, URL: {reference_image_url}")
-             except Exception as url_err:
-                 logger.error(f"Could not construct public URL for {reference_image_path}: {url_err}")
-                 # Proceed without analysis if URL fails?
-                 analyze_image_flag = False
-
-
-    # --- 3. Image Analysis / Prompt Optimization (Optional) ---
-    final_prompt = prompt
-    if reference_image_url and analyze_image_flag:
-        logger.info("Analyzing reference image...")
-        image_description = await grok_service.analyze_image_with_grok(reference_image_url)
-        if image_description:
-            # Combine description with original prompt (strategy depends on desired behavior)
-            final_prompt = f"{prompt} (based on reference image: {image_description})" # Example combination
-            logger.info(f"Prompt updated with image analysis: '{final_prompt}'")
-        else:
-            logger.warning("Image analysis failed or returned no description.")
-
-    if optimize_prompt_flag:
-        logger.info("Optimizing prompt...")
-        optimized_prompt = await grok_service.optimize_prompt_with_grok(final_prompt) # Optimize potentially combined prompt
-        if optimized_prompt:
-            final_prompt = optimized_prompt
-            logger.info(f"Prompt optimized: '{final_prompt}'")
+    except generation_service.GenerationSubmissionError as e:
+        logger.error(f"Generation submission failed: {e}")
+        raise InternalServerError(str(e))
+    except image_service.InvalidImageError as e:
+        raise BadRequest(str(e))
+
+    # --- 3. Return Request ID ---
+    response = jsonify(response_data.dict())
+    if response_data.deduplicated:
+        logger.info(f"Submission deduplicated onto request {response_data.request_id} ({response_data.status})")
+        # A finished result is returned immediately; an in-flight one is still 'accepted'
+        return response, 200 if response_data.status == 'succeeded' else 202
+
+    logger.info(f"Successfully submitted generation request {response_data.request_id}")
+    timings = g.get('submission_timings', {})
+    response.headers['Server-Timing'] = ', '.join(f"{stage};dur={ms}" for stage, ms in timings.items())
+    return response, 202 # 202 Accepted
+
+
+@generate_bp.route('/generate/batch', methods=['POST'])
+@admin_required
+@swag_from('../swagger_docs/generate_batch_post.yml')
+async def submit_generation_batch():
+    """Submits N variants of one base prompt in a single request (Admin Only)."""
+    user = get_current_user()
+    if not user:
+         raise InternalServerError("User context not found after auth check.")
+
+    if not _is_form_request():
+         raise BadRequest("Content-Type must be multipart/form-data")
+
+    # --- 1. Extract Data ---
+    prompt = request.form.get('prompt')
+    reference_image_file = request.files.get('reference_image')
+    analyze_image_flag = request.form.get('analyze_image', 'false').lower() == 'true'
+    optimize_prompt_flag = request.form.get('optimize_prompt', 'false').lower() == 'true'
+    llm_rewrite_flag = request.form.get('llm_rewrite', 'false').lower() == 'true'
+    variants_json = request.form.get('variants')
+    count = request.form.get('count')
+
+    if not prompt:
+        raise BadRequest("Missing required field: 'prompt'")
+
+    # --- 2. Build Variant List (explicit overrides, or N random seeds) ---
+    try:
+        if variants_json:
+            variants = [BatchVariant(**variant) for variant in json.loads(variants_json)]
+        elif count:
+            variants = [BatchVariant(seed=random.randrange(2 ** 31)) for _ in range(int(count))]
         else:
-            logger.warning("Prompt optimization failed or returned no result.")
-
-
-    # --- 4. Store Initial Request State & Trigger Worker ---
-    request_id = str(uuid.uuid4())
-    stored = await supabase_client.store_generation_request(
-        request_id=request_id,
-        user_id=user.user_id,
-        prompt=final_prompt, # Store the final prompt used
-        status='processing',
-        ref_image_path=reference_image_path
-        # Store original_prompt, analyzed_description etc. if needed
-    )
+            raise BadRequest("Provide either 'variants' (JSON array) or 'count'.")
+    except (ValueError, TypeError, ValidationError) as e:
+        raise BadRequest(f"Invalid variants: {e}")
+
+    max_variants = current_app.config['BATCH_MAX_VARIANTS']
+    if not 1 <= len(variants) <= max_variants:
+        raise BadRequest(f"A batch must contain between 1 and {max_variants} variants.")
+
+    reference_upload = await _resolve_reference_upload(user.user_id, reference_image_file)
+
+    logger.info(f"Received batch of {len(variants)} variants from admin {user.user_id} with prompt: '{prompt}'")
+
+    # --- 3. Upload/Analyze Once, Bulk Store & Dispatch as a Group ---
+    try:
+        response_data = await generation_service.process_batch_submission(
+            user_id=user.user_id,
+            prompt=prompt,
+            variants=variants,
+            reference_image_file=reference_image_file,
+            reference_upload=reference_upload,
+            analyze_image_flag=analyze_image_flag,
+            optimize_prompt_flag=optimize_prompt_flag,
+            llm_rewrite_flag=llm_rewrite_flag
+        )
+    except generation_service.GenerationSubmissionError as e:
+        logger.error(f"Batch submission failed: {e}")
+        raise InternalServerError(str(e))
+    except image_service.InvalidImageError as e:
+        raise BadRequest(str(e))
+
+    response = jsonify(response_data.dict())
+    timings = g.get('submission_timings', {})
+    response.headers['Server-Timing'] = ', '.join(f"{stage};dur={ms}" for stage, ms in timings.items())
+    return response, 202 # 202 Accepted
+
+
+@generate_bp.route('/generate/status', methods=['GET', 'POST'])
+@admin_required
+@swag_from('../swagger_docs/generate_bulk_status.yml')
+async def get_bulk_status():
+    """Gets the statuses of many generation requests in one call (Admin Only)."""
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        request_ids = body.get('ids')
+        if not isinstance(request_ids, list) or not all(isinstance(i, str) for i in request_ids):
+            raise BadRequest("Body must be a JSON object with an 'ids' array of strings.")
+    else:
+        request_ids = [i for i in request.args.get('ids', '').split(',') if i]
+
+    request_ids = list(dict.fromkeys(i.strip() for i in request_ids if i.strip())) # De-duplicate, keep order
+    if not request_ids:
+        raise BadRequest("Missing required parameter: 'ids'")
+    max_ids = current_app.config['STATUS_BATCH_MAX_IDS']
+    if len(request_ids) > max_ids:
+        raise BadRequest(f"At most {max_ids} ids can be queried at once.")
+
+    status_by_id = await status_cache_service.get_statuses(request_ids)
+    if status_by_id is None:
+        raise InternalServerError("Failed to retrieve statuses.")
+
+    try:
+        response_model = BulkStatusResponse(
+            statuses=[StatusResponse(**status_by_id[i]) for i in request_ids if i in status_by_id],
+            missing=[i for i in request_ids if i not in status_by_id]
+        )
+    except ValidationError as e:
+        logger.error(f"Data validation error for bulk status response: {e}")
+        raise InternalServerError("Invalid status data format retrieved.")
+
+    # Unchanged batches are answered with 304 and no body
+    response = jsonify(response_model.model_dump(mode='json'))
+    response.set_etag(hashlib.sha256(response.get_data()).hexdigest()[:32])
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+@generate_bp.route('/generate/<string:request_id>/events', methods=['GET'])
+@generate_bp.route('/generate/events', methods=['GET'])
+@admin_required
+@swag_from('../swagger_docs/generate_events.yml')
+async def stream_status_events(request_id=None):
+    """Streams status transitions of one or many requests as Server-Sent Events (Admin Only)."""
+    if request_id:
+        request_ids = [request_id]
+    else:
+        request_ids = list(dict.fromkeys(i.strip() for i in request.args.get('ids', '').split(',') if i.strip()))
+    if not request_ids:
+        raise BadRequest("Missing required parameter: 'ids'")
+    max_ids = current_app.config['SSE_MAX_IDS']
+    if len(request_ids) > max_ids:
+        raise BadRequest(f"At most {max_ids} ids can be streamed at once.")
+
+    # A stream holds a server thread for its whole life; keep threads free for other requests
+    if not notification_service.try_open_stream(current_app.config['SSE_MAX_STREAMS']):
+        logger.warning(f"Event stream limit ({current_app.config['SSE_MAX_STREAMS']}) reached, rejecting stream.")
+        raise ServiceUnavailable("Too many open event streams; retry later or poll /api/generate/status.",
+                                 retry_after=current_app.config['SSE_RETRY_AFTER_SECONDS'])
+    try:
+        # Subscribe first, then read the current state, so no transition falls in between
+        try:
+            pubsub = await asyncio.to_thread(notification_service.subscribe, request_ids)
+        except redis.RedisError as e:
+            logger.error(f"Cannot subscribe to status updates: {e}")
+            raise ServiceUnavailable("Status push is unavailable; poll /api/generate/status instead.")
 
-    if not stored:
-        raise InternalServerError("Failed to store initial request state.")
+        # Read the snapshot from the database, not the status cache: a local entry can still say
+        # 'processing' after the terminal event was published, and that event is already missed
+        status_by_id = await supabase_client.get_generation_statuses(request_ids)
+        if status_by_id is None or (request_id and request_id not in status_by_id):
+            pubsub.close()
+            if status_by_id is None:
+                raise InternalServerError("Failed to retrieve statuses.")
+            raise NotFound(f"Request ID '{request_id}' not found.")
+    except BaseException:
+        notification_service.close_stream()
+        raise
 
-    task_sent = task_queue_service.send_generation_task(
-        request_id=request_id,
-        user_id=user.user_id,
-        final_prompt=final_prompt,
-        reference_image_path=reference_image_path
+    stream = notification_service.status_event_stream(
+        pubsub,
+        current={i: status_by_id[i] for i in request_ids if i in status_by_id},
+        missing=[i for i in request_ids if i not in status_by_id],
+        keepalive_seconds=current_app.config['SSE_KEEPALIVE_SECONDS'],
+        max_seconds=current_app.config['SSE_MAX_STREAM_SECONDS']
     )
+    response = Response(stream, mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}) # Disable proxy buffering
+    response.call_on_close(notification_service.close_stream) # Also runs if the client disconnects early
+    return response
 
-    if not task_sent:
-        # Consider trying to update status to 'failed' here
-        raise InternalServerError("Failed to send generation task to worker queue.")
 
-    # --- 5. Return Request ID ---
-    logger.info(f"Successfully submitted generation request {request_id}")
-    response_data = Response(request_id=request_id)
-    return jsonify(response_data.dict()), 202 # 202 Accepted
+@generate_bp.route('/generate/<string:request_id>/status', methods=['POST'])
+@admin_required
+@swag_from('../swagger_docs/generate_status_transition.yml')
+async def report_status(request_id):
+    """Status write-back for workers: progress, result or error of a request, idempotently (Admin Only)."""
+    try:
+        transition = StatusTransitionRequest(**(request.get_json(silent=True) or {}))
+    except ValidationError as e:
+        raise BadRequest(f"Invalid status report: {e}")
+
+    try:
+        outcome, current = await status_service.transition_status(
+            request_id,
+            transition.status,
+            progress=transition.progress,
+            result_url=str(transition.result_url) if transition.result_url else None,
+            error_message=transition.error_message,
+            expected_version=transition.version,
+            thumbnails=transition.thumbnails,
+            blurhash=transition.blurhash
+        )
+    except status_service.StatusTransitionError as e:
+        raise BadRequest(str(e))
+
+    if outcome == status_service.NOT_FOUND:
+        raise NotFound(f"Request ID '{request_id}' not found.")
+    response_model = StatusTransitionResponse(outcome=outcome, status=StatusResponse(**current))
+    if outcome == status_service.CONFLICT:
+        return jsonify({"error": f"Request is '{current['status']}' at version {current.get('version')}; the report contradicts it.",
+                        **response_model.model_dump(mode='json')}), 409
+    return jsonify(response_model.model_dump(mode='json')), 200
 
 
 @generate_bp.route('/<string:request_id>', methods=['GET'])
@@ -127,13 +302,13 @@ async def submit_generation():
 @swag_from('../swagger_docs/generate_get_status.yml') #
 async def get_status(request_id):
     """Gets the status of a specific generation request (Admin Only)."""
-    user = get_status() # For logging/auditing if needed
+    user = get_current_user() # For logging/auditing if needed
     if not user:
          raise InternalServerError("User context not found after auth check.")
 
     logger.info(f"Admin {user.user_id} checking status for request_id: {request_id}")
 
-    status_data = await supabase_client.get_generation_status(request_id)
+    status_data = await status_cache_service.get_status(request_id)
 
     if status_data is None:
         raise NotFound(f"Request ID '{request_id}' not found.")
@@ -141,7 +316,7 @@ async def get_status(request_id):
     try:
         # Validate the data structure before returning
         response_model = StatusResponse(**status_data)
-        return jsonify(response_model.dict()), 200
+        return jsonify(response_model.model_dump(mode='json')), 200 # mode='json' serializes HttpUrl
     except ValidationError as e:
         logger.error(f"Data validation error for status response {request_id}: {e}")
         raise InternalServerError("Invalid status data format retrieved.")
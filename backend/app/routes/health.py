@@ -0,0 +1,46 @@
+# backend/app/routes/health.py
+
+import logging
+from flask import jsonify, Blueprint
+from flasgger import swag_from
+
+from app.db import supabase_client
+from app.services.auth_service import admin_required
+from app.services import grok_service, auth_service, image_service, scheduler_service, dna_service
+from app.services import feedback_service
+from app.utils.cache import cache_stats
+
+health_bp = Blueprint('health', __name__)
+
+logger = logging.getLogger(__name__)
+
+# --- Route Definitions ---
+
+@health_bp.route('/health', methods=['GET'])
+@swag_from('../swagger_docs/health_get.yml')
+def get_health():
+    """Liveness probe: answers without touching the database, the broker or Redis."""
+    return jsonify({"status": "ok"}), 200
+
+
+@health_bp.route('/health/details', methods=['GET'])
+@admin_required # Pings the database and broker and exposes internal metrics
+@swag_from('../swagger_docs/health_details_get.yml')
+def get_health_details():
+    """Reports dependency health and connection pool metrics (used for worker sizing) (Admin Only)."""
+    supabase_ok = supabase_client.check_supabase_health()
+    body = {
+        "status": "ok" if supabase_ok else "degraded",
+        "supabase": {
+            "reachable": supabase_ok,
+            "pool": supabase_client.get_pool_stats(),
+        },
+        "grok": grok_service.get_grok_stats(),
+        "caches": cache_stats(),
+        "auth": auth_service.get_auth_stats(),
+        "images": image_service.get_image_stats(),
+        "queues": scheduler_service.get_queue_metrics(),
+        "dna": dna_service.get_catalog_stats(),
+        "feedback": feedback_service.get_feedback_stats(),
+    }
+    return jsonify(body), 200 if supabase_ok else 503
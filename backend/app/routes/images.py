@@ -1,99 +1,73 @@
-# backend/app/routes/images.py (最終修正版)
+# backend/app/routes/images.py
+
 import logging
-from flask import Blueprint, jsonify
-# 導入對應的 Controller 函數
-from app.controllers import images # 確保導入 controller
-# 導入認證裝飾器
-from app.middleware.auth import token_required
-# 導入 asyncio
-import asyncio
+from flask import Blueprint, request, jsonify, current_app
+from werkzeug.exceptions import BadRequest, NotFound, InternalServerError
+from flasgger import swag_from
+
+from app.services.auth_service import admin_required
+from app.services import signed_url_service
+from app.models.schemas import SignedImageUrl, SignedImageUrlsResponse
 
 logger = logging.getLogger(__name__)
-images_bp = Blueprint('images_api', __name__) # 確保 Blueprint 名稱正確
+images_bp = Blueprint('images_api', __name__)
+
+
+def _cacheable(response, signed):
+    """Lets the browser reuse the response until the first URL in it is due for renewal."""
+    response.cache_control.private = True # Signed URLs are per-user capabilities; never share via proxies
+    response.cache_control.max_age = signed_url_service.cache_max_age(signed)
+    return response
+
 
-# --- 路由定義 ---
+# --- Route Definitions ---
 
 # GET /api/images/<imageId>/url
-@images_bp.get("/<string:imageId>/url")
-@token_required
-def get_image_signed_url(imageId: str):
-    """Get Pre-signed URL for a specific image
-    Retrieves a temporary, pre-signed URL allowing access to a private image object in S3.
-    ---
-    tags:
-      - Images
-    security:
-      - BearerAuth: [] # 假設在 __init__.py 中定義了 BearerAuth security scheme
-    parameters:
-      - name: imageId
-        in: path
-        type: string
-        required: true
-        description: The unique ID of the image.
-      - name: Authorization # 明確定義 Header
-        in: header
-        type: string
-        required: true
-        description: Bearer token for authentication (e.g., 'Bearer your_token').
-    responses:
-      '200': # 狀態碼加引號
-        description: Signed URL d successfully.
-        content: # 使用 content 和 application/json
-          application/json:
-            schema: # <--- 這裡直接定義 Schema，而不是用 $ref --->
-              type: object
-              properties:
-                signedUrl:
-                  type: string
-                  description: The temporary pre-signed URL for the image.
-                  example: "https://your-bucket.s3.amazonaws.com/image.jpg?AWSAccessKeyId=..."
-                imageId:
-                  type: string
-                  description: The ID of the image corresponding to the URL.
-                  example: "some-image-id-123"
-              required:
-                 - signedUrl
-                 - imageId
-      '401':
-        description: Authentication required or invalid token.
-        content:
-          application/json:
-            schema:
-              type: object
-              properties:
-                message: # 修改這裡的縮排和結構
-                  type: string
-                  example: "Authentication Token is missing!" # example 值用引號括起來
-      '403':
-        description: Forbidden, user cannot access this image.
-        content:
-          application/json:
-            schema:
-              type: object
-              properties:
-                message: # 修改這裡的縮排和結構
-                  type: string
-                  example: "Forbidden: Cannot access this image." # example 值用引號括起來
-      '404':
-        description: Image ID not found.
-        content:
-          application/json:
-            schema:
-              type: object
-              properties:
-                message: { type: string, example: Image not found. }
-      '500':
-        description: Internal server error.
-        content:
-          application/json:
-            schema:
-              type: object
-              properties:
-                message: { type: string, example: Failed to get signed URL. }
-    """
+@images_bp.route('/<string:imageId>/url', methods=['GET'])
+@admin_required
+@swag_from('../swagger_docs/images_url_get.yml')
+async def get_image_signed_url(imageId: str):
+    """Gets a pre-signed URL for a generated image (Admin Only)."""
     logger.info(f"Route: GET /api/images/{imageId}/url")
-    # 調用異步 Controller 函數
-    # 確認 images_controller 有 get_image_signed_url_controller
-    return asyncio.run(images.get_image_signed_url_controller(imageId))
+    signed = await signed_url_service.sign_images([imageId])
+    if signed is None:
+        raise InternalServerError("Failed to get signed URL.")
+    if imageId not in signed:
+        raise NotFound(f"Image '{imageId}' not found.")
+
+    entry = signed[imageId]
+    response_model = SignedImageUrl(imageId=imageId, signedUrl=entry['url'], expiresAt=entry['expires_at'])
+    return _cacheable(jsonify(response_model.model_dump()), signed)
+
+
+# GET|POST /api/images/urls
+@images_bp.route('/urls', methods=['GET', 'POST'])
+@admin_required
+@swag_from('../swagger_docs/images_urls.yml')
+async def get_image_signed_urls():
+    """Gets pre-signed URLs for many generated images in one call (Admin Only)."""
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        image_ids = body.get('ids')
+        if not isinstance(image_ids, list) or not all(isinstance(i, str) for i in image_ids):
+            raise BadRequest("Body must be a JSON object with an 'ids' array of strings.")
+    else:
+        image_ids = [i for i in request.args.get('ids', '').split(',') if i]
+
+    image_ids = list(dict.fromkeys(i.strip() for i in image_ids if i.strip())) # De-duplicate, keep order
+    if not image_ids:
+        raise BadRequest("Missing required parameter: 'ids'")
+    max_ids = current_app.config['IMAGE_URL_BATCH_MAX_IDS']
+    if len(image_ids) > max_ids:
+        raise BadRequest(f"At most {max_ids} ids can be signed at once.")
+
+    signed = await signed_url_service.sign_images(image_ids)
+    if signed is None:
+        raise InternalServerError("Failed to get signed URLs.")
 
-# 你可以在這裡添加其他與 Image 相關的路由
\ No newline at end of file
+    response_model = SignedImageUrlsResponse(
+        urls=[SignedImageUrl(imageId=i, signedUrl=signed[i]['url'], expiresAt=signed[i]['expires_at'])
+              for i in image_ids if i in signed],
+        missing=[i for i in image_ids if i not in signed]
+    )
+    return _cacheable(jsonify(response_model.model_dump()), signed)
@@ -0,0 +1,38 @@
+# backend/app/routes/uploads.py
+
+import logging
+from flask import request, jsonify, Blueprint
+from werkzeug.exceptions import BadRequest, InternalServerError
+from pydantic import ValidationError
+from flasgger import swag_from
+
+from app.services.auth_service import admin_required, get_current_user
+from app.services import upload_service
+from app.models.schemas import UploadCreateRequest
+
+uploads_bp = Blueprint('uploads', __name__)
+
+logger = logging.getLogger(__name__)
+
+# --- Route Definitions ---
+
+@uploads_bp.route('/uploads', methods=['POST'])
+@admin_required
+@swag_from('../swagger_docs/uploads_post.yml')
+async def create_upload():
+    """Returns a signed URL for uploading a reference image directly to storage (Admin Only)."""
+    user = get_current_user()
+    if not user:
+         raise InternalServerError("User context not found after auth check.")
+
+    try:
+        upload_request = UploadCreateRequest(**(request.get_json(silent=True) or {}))
+    except ValidationError as e:
+        raise BadRequest(f"Invalid upload request: {e}")
+
+    try:
+        response_data = await upload_service.create_upload(user.user_id, upload_request.content_type)
+    except upload_service.UploadError as e:
+        raise BadRequest(str(e))
+
+    return jsonify(response_data.model_dump()), 201
@@ -1,21 +1,111 @@
+import time
+import inspect
+import hashlib
 import logging
 import jwt
 from functools import wraps
 from flask import request, current_app, g, jsonify
-from werkzeug.exceptions import Unauthorized, Forbidden
-from typing import Optional, Dict, List
+from werkzeug.exceptions import Unauthorized, Forbidden, InternalServerError
+from typing import Optional, Dict, List, Tuple
 
 from app.models.schemas import UserProfile
+from app.utils.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+JWT_ALGORITHMS = ["HS256"]
+JWT_AUDIENCE = "authenticated" # Default Supabase audience
+
 class AuthServiceError(Exception):
     """Custom exception for Auth Service errors."""
     pass
 
-def _decode_jwt(token: str) -> Optional[Dict]:
+
+class _JWTVerifier:
+    """
+    Verifies JWTs with key material and settings captured once at startup.
+    Verified claims are cached by token digest until min(JWT_CACHE_TTL, exp);
+    rejected tokens are optionally remembered for JWT_NEGATIVE_CACHE_TTL.
+    """
+
+    def __init__(self, config):
+        self.secret = config['SUPABASE_JWT_SECRET']
+        self.admin_role = config['ADMIN_ROLE_NAME']
+        self.cache_ttl = config['JWT_CACHE_TTL']
+        self.negative_ttl = config['JWT_NEGATIVE_CACHE_TTL']
+        enabled = config['JWT_CACHE_ENABLED']
+        self.cache = TTLCache(config['JWT_CACHE_MAXSIZE'], self.cache_ttl) if enabled else None
+        self.rejected = TTLCache(config['JWT_CACHE_MAXSIZE'], self.negative_ttl) if enabled and self.negative_ttl > 0 else None
+
+    @staticmethod
+    def _digest(token: str) -> str:
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def verify(self, token: str) -> Tuple[str, Tuple[str, ...]]:
+        """Returns (user_id, roles) for a valid token, raising Unauthorized otherwise."""
+        key = self._digest(token) if self.cache is not None else None
+        if key is not None:
+            claims = self.cache.get(key)
+            if claims is not None:
+                return claims
+            if self.rejected is not None:
+                reason = self.rejected.get(key)
+                if reason is not None:
+                    raise Unauthorized(reason)
+
+        try:
+            payload = _decode_jwt(token, self.secret)
+        except Unauthorized as e:
+            if key is not None and self.rejected is not None:
+                self.rejected.set(key, e.description)
+            raise
+
+        user_id = payload.get('sub') # Standard JWT subject claim for user ID
+        if not user_id:
+            logger.error("User ID (sub) not found in JWT payload.")
+            raise Unauthorized("Invalid token payload.")
+        claims = (user_id, tuple(payload.get('roles', []))) # Assuming 'roles' is the custom claim name
+
+        if key is not None:
+            ttl = self.cache_ttl
+            exp = payload.get('exp')
+            if exp is not None:
+                ttl = min(ttl, exp - time.time())
+            if ttl > 0:
+                self.cache.set(key, claims, ttl)
+        logger.info(f"Authenticated user {user_id} with roles: {list(claims[1])}")
+        return claims
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            "verified": self.cache.stats() if self.cache is not None else {},
+            "rejected": self.rejected.stats() if self.rejected is not None else {},
+        }
+
+
+def init_auth(app):
+    """Captures JWT settings and creates the verified-token cache (called in app factory)."""
+    if not app.config['SUPABASE_JWT_SECRET']:
+        logger.error("SUPABASE_JWT_SECRET is not configured.")
+    app.extensions['jwt_verifier'] = _JWTVerifier(app.config)
+    logger.info("JWT verifier initialized.")
+
+
+def _get_verifier() -> _JWTVerifier:
+    verifier = current_app.extensions.get('jwt_verifier')
+    if verifier is None:
+        init_auth(current_app)
+        verifier = current_app.extensions['jwt_verifier']
+    return verifier
+
+
+def get_auth_stats() -> Dict[str, Dict[str, int]]:
+    """Hit/miss counters of the verified and rejected token caches (see GET /api/health/details)."""
+    return _get_verifier().stats()
+
+
+def _decode_jwt(token: str, jwt_secret: Optional[str]) -> Dict:
     """Decodes and verifies the JWT."""
-    jwt_secret = current_app.config['SUPABASE_JWT_SECRET']
     if not jwt_secret:
         logger.error("SUPABASE_JWT_SECRET is not configured.")
         raise AuthServiceError("JWT secret not configured on server.")
@@ -25,10 +115,10 @@ def _decode_jwt(token: str) -> Optional[Dict]:
         payload = jwt.decode(
             token,
             jwt_secret,
-            algorithms=["HS256"],
-            audience="authenticated" # Default Supabase audience
+            algorithms=JWT_ALGORITHMS,
+            audience=JWT_AUDIENCE
         )
-        logger.debug(f"JWT decoded successfully: {payload}")
+        logger.debug(f"JWT decoded successfully for subject {payload.get('sub')}")
         return payload
     except jwt.ExpiredSignatureError:
         logger.warning("JWT verification failed: Token has expired.")
@@ -46,10 +136,25 @@ def get_current_user() -> Optional[UserProfile]:
     return g.get('user', None)
 
 
+def _call_view(f, *args, **kwargs):
+    """
+    Calls the decorated view. An async view (also behind sync decorators such as swag_from)
+    returns a coroutine, which the app's async_to_sync runs on the shared event loop.
+    """
+    result = f(*args, **kwargs)
+    if inspect.iscoroutine(result):
+        return current_app.async_to_sync(lambda: result)()
+    return result
+
+
 def jwt_required(f):
-    """Decorator to protect routes requiring a valid JWT."""
+    """
+    Decorator to protect routes requiring a valid JWT.
+    The token is verified in the calling server thread, before an async view is handed to the
+    shared event loop, so the decode never blocks other requests on that loop.
+    """
     @wraps(f)
-    async def decorated_function(*args, **kwargs): # Make decorator async
+    def decorated_function(*args, **kwargs):
         auth_header = request.headers.get("Authorization")
         if not auth_header or not auth_header.startswith("Bearer "):
             logger.warning("Missing or invalid Authorization header.")
@@ -57,18 +162,10 @@ def jwt_required(f):
 
         token = auth_header.split(" ")[1]
         try:
-            payload = _decode_jwt(token)
-            # Extract user information from payload
-            user_id = payload.get('sub') # Standard JWT subject claim for user ID
-            roles = payload.get('roles', []) # Assuming 'roles' is the custom claim name
-
-            if not user_id:
-                 logger.error("User ID (sub) not found in JWT payload.")
-                 raise Unauthorized("Invalid token payload.")
+            user_id, roles = _get_verifier().verify(token)
 
             # Store user info in Flask's request context (g)
-            g.user = UserProfile(user_id=user_id, roles=roles)
-            logger.info(f"Authenticated user {user_id} with roles: {roles}")
+            g.user = UserProfile(user_id=user_id, roles=list(roles))
 
         except (Unauthorized, Forbidden, AuthServiceError) as e:
              # Re-raise auth specific exceptions to be handled by Flask error handlers
@@ -77,23 +174,23 @@ def jwt_required(f):
              logger.error(f"Unexpected error during token processing: {e}", exc_info=True)
              raise InternalServerError("Could not process authentication token.")
 
-        # Call the original async route function
-        return await f(*args, **kwargs)
+        # Call the original route function (async views run on the shared loop)
+        return _call_view(f, *args, **kwargs)
     return decorated_function
 
 def admin_required(f):
-    """Decorator ensuring the user has the admin role."""
+    """Decorator ensuring the user has the admin role (checked in the server thread, like jwt_required)."""
     @wraps(f)
     @jwt_required # Depends on @jwt_required to set g.user
-    async def decorated_function(*args, **kwargs): # Make decorator async
+    def decorated_function(*args, **kwargs):
         user = get_current_user()
-        admin_role = current_app.config['ADMIN_ROLE_NAME']
+        admin_role = _get_verifier().admin_role
 
         if not user or admin_role not in user.roles:
             logger.warning(f"Admin access denied for user {user.user_id if user else 'None'}. Required role: '{admin_role}', User roles: {user.roles if user else 'N/A'}")
             raise Forbidden("Administrator access required.")
 
         logger.info(f"Admin access granted for user {user.user_id}")
-        # Call the original async route function
-        return await f(*args, **kwargs)
-    return decorated_function
\ No newline at end of file
+        # Call the original route function (async views run on the shared loop)
+        return _call_view(f, *args, **kwargs)
+    return decorated_function
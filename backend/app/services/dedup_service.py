@@ -0,0 +1,143 @@
+# backend/app/services/dedup_service.py
+
+import asyncio
+import logging
+from typing import Optional, Dict, Any, Tuple
+from flask import current_app
+import redis
+
+from app.services import status_cache_service
+from app.db.redis_client import get_redis
+from app.services.grok_service import normalize_prompt
+from app.utils.cache import make_key
+
+logger = logging.getLogger(__name__)
+
+# Compare-and-delete: only release a claim we still own
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Compare-and-expire: extend a claim to the full TTL only while we still own it
+_CONFIRM_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Compare-and-set: take over a claim only if it is still held by ARGV[1] ('' = not held at all).
+# Returns the owner afterwards, so a caller that lost the race learns who won.
+_TAKEOVER_SCRIPT = """
+local current = redis.call('get', KEYS[1])
+if (current or '') == ARGV[1] then
+    redis.call('set', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return ARGV[2]
+end
+return current
+"""
+
+
+def _key(fingerprint: str) -> str:
+    return f"dedup:generation:{fingerprint}"
+
+
+def fingerprint_submission(user_id: str, prompt: str, image_digest: Optional[str],
+                           params: Dict[str, Any]) -> str:
+    """Fingerprints a normalized submission: user, prompt, reference image hash and parameters."""
+    normalized_params = sorted((k, str(v)) for k, v in params.items())
+    return make_key(user_id, normalize_prompt(prompt), image_digest or '', normalized_params,
+                    current_app.config['GROK_CACHE_VERSION'])
+
+
+def _decode(value) -> Optional[str]:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _claim(key: str, request_id: str, ttl: int) -> Optional[Tuple[str, int]]:
+    """
+    Claims the key for request_id (blocking). Returns None if claimed, else the current
+    owner ('' if the key just expired) and the claim's remaining TTL in seconds.
+    """
+    client = get_redis()
+    if client.set(key, request_id, nx=True, ex=ttl):
+        return None
+    pipe = client.pipeline(transaction=False)
+    pipe.get(key)
+    pipe.ttl(key)
+    owner, remaining = pipe.execute()
+    return _decode(owner) or '', remaining
+
+
+def _in_flight(request_id: str) -> Dict[str, Any]:
+    return {'request_id': request_id, 'status': 'processing', 'result_url': None}
+
+
+async def find_or_claim(fingerprint: str, request_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Single-flight claim for a fingerprint.
+    Returns None if this request now owns the fingerprint (caller should run the job),
+    or the status dict of an existing succeeded/in-flight request to reuse instead.
+    A claim first lives GENERATION_DEDUP_CLAIM_TTL seconds: the claimant only stores its row
+    after the pre-processing stages, so a claim that young without a row is in flight. Once
+    the row is stored, confirm() extends it to GENERATION_DEDUP_TTL. A claimant that dies
+    before storing its row lets the claim expire; a confirmed claim whose row is gone or
+    failed is taken over (compare-and-set). If the row cannot be read, the submission runs
+    without deduplication rather than reusing a request id that may never exist.
+    """
+    key = _key(fingerprint)
+    config = current_app.config
+    claim_ttl = config['GENERATION_DEDUP_CLAIM_TTL']
+    try:
+        claimed = await asyncio.to_thread(_claim, key, request_id, claim_ttl)
+    except redis.RedisError as e:
+        logger.warning(f"Dedup lookup unavailable, submitting without deduplication: {e}")
+        return None
+    if claimed is None:
+        return None
+
+    existing_id, remaining = claimed
+    if existing_id:
+        statuses = await status_cache_service.get_statuses([existing_id])
+        if statuses is None:
+            logger.warning(f"Could not read request {existing_id} for deduplication, submitting without it.")
+            return None
+        status = statuses.get(existing_id)
+        if status is None and remaining <= claim_ttl:
+            logger.info(f"Submission matches request {existing_id} (claimed, not stored yet), reusing it.")
+            return _in_flight(existing_id)
+        if status is not None and status['status'] != 'failed':
+            logger.info(f"Submission matches request {existing_id} ({status['status']}), reusing it.")
+            return status
+
+    # Previous job failed, its row is gone, or its claim just expired: take over the
+    # fingerprint unless someone beat us to it
+    try:
+        owner = _decode(await asyncio.to_thread(get_redis().eval, _TAKEOVER_SCRIPT, 1, key, existing_id, request_id, claim_ttl))
+    except redis.RedisError as e:
+        logger.warning(f"Could not claim dedup fingerprint: {e}")
+        return None
+    if owner != request_id:
+        logger.info(f"Submission matches request {owner} (claimed concurrently), reusing it.")
+        return _in_flight(owner)
+    return None
+
+
+def confirm(fingerprint: str, request_id: str):
+    """Keeps the claim for GENERATION_DEDUP_TTL once the owning request's row is stored."""
+    try:
+        if not get_redis().eval(_CONFIRM_SCRIPT, 1, _key(fingerprint), request_id, current_app.config['GENERATION_DEDUP_TTL']):
+            logger.info(f"Dedup claim of request {request_id} was taken over before its row was stored.")
+    except redis.RedisError as e:
+        logger.warning(f"Could not confirm dedup fingerprint for request {request_id}: {e}")
+
+
+def release(fingerprint: str, request_id: str):
+    """Drops the claim if the submission owning it failed before a job was queued."""
+    try:
+        get_redis().eval(_RELEASE_SCRIPT, 1, _key(fingerprint), request_id)
+    except redis.RedisError as e:
+        logger.warning(f"Could not release dedup fingerprint for request {request_id}: {e}")
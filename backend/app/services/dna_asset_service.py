@@ -0,0 +1,267 @@
+# backend/app/services/dna_asset_service.py
+
+import io
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, UnidentifiedImageError
+from flask import current_app, url_for
+
+from app.services import dna_service
+
+logger = logging.getLogger(__name__)
+
+ASSET_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+# <key>.<hash>.webp (full size) or <key>.<hash>.w<width>.webp (thumbnail)
+_ASSET_NAME_RE = re.compile(r"^(?P<key>[a-z0-9-]+)\.(?P<hash>[0-9a-f]{16})(?:\.w(?P<width>[0-9]{2,4}))?\.webp$")
+
+
+class DnaAssetError(Exception):
+    """Raised when the asset bundle cannot be built or read."""
+    pass
+
+
+def asset_key(image: dna_service.DnaImage) -> str:
+    """Stable ASCII key of a view, e.g. ('cm02', 'Left 45') -> 'cm02-left-45'."""
+    text = unicodedata.normalize('NFKD', f"{image.case_id}-{image.view}").encode('ascii', 'ignore').decode()
+    return re.sub(r"[^a-z0-9]+", '-', text.lower()).strip('-') or 'view'
+
+
+def _content_hash(data: bytes, quality: int) -> str:
+    """Hash of the source bytes and encoder settings, so a URL's content never changes."""
+    digest = hashlib.sha256(data)
+    digest.update(f"v{ASSET_VERSION}:q{quality}".encode())
+    return digest.hexdigest()[:16]
+
+
+def _file_name(key: str, content_hash: str, width: Optional[int] = None) -> str:
+    return f"{key}.{content_hash}.webp" if width is None else f"{key}.{content_hash}.w{width}.webp"
+
+
+def _scaled_size(size: Tuple[int, int], width: int) -> Tuple[int, int]:
+    return width, max(1, round(size[1] * width / size[0]))
+
+
+def _encode(data: bytes, width: Optional[int], quality: int) -> bytes:
+    """Encodes an image as WebP, downscaled to `width`; a full-size WebP source is kept as is."""
+    with Image.open(io.BytesIO(data)) as image:
+        if width is None and image.format == 'WEBP':
+            return data # Re-encoding an already compressed WebP costs seconds and saves next to nothing
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        if width is not None and width < image.width:
+            image = image.resize(_scaled_size(image.size, width), Image.LANCZOS, reducing_gap=2.0)
+        out = io.BytesIO()
+        image.save(out, format='WEBP', quality=quality, method=4)
+    return out.getvalue()
+
+
+def _write_atomic(path: str, data: bytes):
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+
+def _write_derivative(asset_dir: str, file_name: str, data: bytes, width: Optional[int], quality: int) -> int:
+    """Writes one derivative unless an identical (same content hash) file already exists. Returns its size."""
+    path = os.path.join(asset_dir, file_name)
+    if not os.path.isfile(path):
+        _write_atomic(path, _encode(data, width, quality))
+    return os.path.getsize(path)
+
+
+def build_assets(catalog: dna_service.DnaCatalog, data_dir: str, asset_dir: str,
+                 widths: List[int], quality: int) -> Dict:
+    """
+    Builds the DNA asset bundle: for every catalog view with a local image, a full-size WebP and
+    one thumbnail per width (narrower than the source), named by ASCII key and content hash.
+    Unchanged images are not re-encoded; files no longer referenced are removed. The manifest is
+    written last, atomically. Returns the manifest.
+    """
+    started = time.perf_counter()
+    os.makedirs(asset_dir, exist_ok=True)
+    assets, keys = {}, set()
+    for image in catalog.images:
+        if image.local_path is None or image.local_path in assets:
+            continue
+        try:
+            with open(os.path.join(data_dir, image.local_path), 'rb') as f:
+                data = f.read()
+            with Image.open(io.BytesIO(data)) as decoded:
+                size = decoded.size
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+            logger.warning(f"Skipping DNA image {image.local_path}: {e}")
+            continue
+
+        key = base_key = asset_key(image)
+        suffix = 2
+        while key in keys:
+            key, suffix = f"{base_key}-{suffix}", suffix + 1
+        keys.add(key)
+        content_hash = _content_hash(data, quality)
+        file_name = _file_name(key, content_hash)
+        variants = []
+        for width in sorted(set(widths)):
+            if width < size[0]:
+                variant_name = _file_name(key, content_hash, width)
+                variant_height = _scaled_size(size, width)[1]
+                variants.append({'width': width, 'height': variant_height, 'file': variant_name,
+                                 'bytes': _write_derivative(asset_dir, variant_name, data, width, quality)})
+        assets[image.local_path] = {
+            'key': key, 'hash': content_hash, 'case_id': image.case_id, 'view': image.view,
+            'width': size[0], 'height': size[1], 'file': file_name,
+            'bytes': _write_derivative(asset_dir, file_name, data, None, quality),
+            'source_bytes': len(data), 'variants': variants,
+        }
+    if not assets:
+        raise DnaAssetError(f"No local DNA images found under {data_dir}.")
+
+    manifest = {'version': ASSET_VERSION, 'quality': quality, 'widths': sorted(set(widths)),
+                'created_at': int(time.time()), 'assets': assets}
+    manifest_path = os.path.join(asset_dir, MANIFEST_FILE)
+    _write_atomic(manifest_path, json.dumps(manifest, ensure_ascii=False).encode('utf-8'))
+
+    referenced = {a['file'] for a in assets.values()} | {v['file'] for a in assets.values() for v in a['variants']}
+    for name in os.listdir(asset_dir):
+        if _ASSET_NAME_RE.match(name) and name not in referenced:
+            os.remove(os.path.join(asset_dir, name))
+    total = sum(a['bytes'] + sum(v['bytes'] for v in a['variants']) for a in assets.values())
+    logger.info(f"Built DNA asset bundle of {len(assets)} images ({total / 1e6:.1f} MB) in {asset_dir} "
+                f"({time.perf_counter() - started:.1f} s).")
+    return manifest
+
+
+# --- Serving ---
+
+class AssetManifest:
+    """Read-only view of a built bundle, indexed by source path and by asset key."""
+
+    def __init__(self, asset_dir: str):
+        manifest_path = os.path.join(asset_dir, MANIFEST_FILE)
+        try:
+            self.mtime = os.stat(manifest_path).st_mtime
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            raise DnaAssetError(f"Could not read DNA asset manifest in {asset_dir}: {e}") from e
+        if manifest.get('version') != ASSET_VERSION:
+            raise DnaAssetError(f"DNA asset bundle in {asset_dir} is outdated; rebuild it.")
+        self.quality: int = manifest['quality']
+        self.assets: Dict[str, Dict] = manifest['assets']
+        self.by_key: Dict[str, Tuple[str, Dict]] = {a['key']: (path, a) for path, a in self.assets.items()}
+
+
+_manifest: Optional[AssetManifest] = None
+_manifest_lock = threading.Lock()
+_checked_at = 0.0
+_derive_lock = threading.Lock()
+
+
+def get_manifest() -> Optional[AssetManifest]:
+    """
+    Returns the served manifest, or None if the bundle has not been built yet (`flask dna-assets`).
+    Like the catalog, a rebuilt bundle is picked up by its manifest mtime.
+    """
+    global _manifest, _checked_at
+    config = current_app.config
+    now = time.monotonic()
+    if _checked_at and now - _checked_at < config['DNA_RELOAD_INTERVAL']:
+        return _manifest
+
+    with _manifest_lock:
+        if _checked_at and now - _checked_at < config['DNA_RELOAD_INTERVAL']:
+            return _manifest # Checked by another thread meanwhile
+        _checked_at = now
+        manifest_path = os.path.join(config['DNA_ASSET_DIR'], MANIFEST_FILE)
+        try:
+            mtime = os.stat(manifest_path).st_mtime
+        except OSError:
+            if _manifest is None:
+                logger.warning(f"No DNA asset bundle in {config['DNA_ASSET_DIR']}; run `flask dna-assets`.")
+            return _manifest
+        if _manifest is None or mtime != _manifest.mtime:
+            try:
+                _manifest = AssetManifest(config['DNA_ASSET_DIR'])
+                logger.info(f"Loaded DNA asset manifest: {len(_manifest.assets)} images.")
+            except DnaAssetError as e:
+                logger.error(str(e))
+        return _manifest
+
+
+def _asset_url(file_name: str) -> str:
+    return url_for('dna_api.get_dna_asset', filename=file_name)
+
+
+def describe_asset(image: dna_service.DnaImage) -> Optional[Dict]:
+    """
+    Bundle URLs of a view (full size plus one thumbnail per configured width), or None if the
+    view is not in the bundle. Widths added to DNA_ASSET_WIDTHS after the build are listed too;
+    they are derived on first request.
+    """
+    manifest = get_manifest()
+    asset = manifest.assets.get(image.local_path) if manifest is not None and image.local_path else None
+    if asset is None:
+        return None
+    built = {v['width']: v for v in asset['variants']}
+    thumbnails = []
+    for width in sorted(set(current_app.config['DNA_ASSET_WIDTHS']) | set(built)):
+        if width >= asset['width']:
+            continue
+        variant = built.get(width) or {'width': width, 'height': _scaled_size((asset['width'], asset['height']), width)[1],
+                                       'file': _file_name(asset['key'], asset['hash'], width), 'bytes': None}
+        thumbnails.append({'width': variant['width'], 'height': variant['height'], 'bytes': variant['bytes'],
+                           'url': _asset_url(variant['file'])})
+    return {'url': _asset_url(asset['file']), 'width': asset['width'], 'height': asset['height'],
+            'bytes': asset['bytes'], 'thumbnails': thumbnails}
+
+
+def resolve_asset(file_name: str) -> Optional[str]:
+    """
+    Path of a bundle file under DNA_ASSET_DIR, or None if the name is unknown. A thumbnail at a
+    configured width that was not prebuilt is derived from the source image and stored first.
+    Names are validated against the manifest, so arbitrary input never reaches the filesystem.
+    """
+    manifest = get_manifest()
+    match = _ASSET_NAME_RE.match(file_name)
+    if manifest is None or match is None or match['key'] not in manifest.by_key:
+        return None
+    source_path, asset = manifest.by_key[match['key']]
+    if match['hash'] != asset['hash']:
+        return None
+    config = current_app.config
+    path = os.path.join(config['DNA_ASSET_DIR'], file_name)
+    if os.path.isfile(path):
+        return path
+
+    width = int(match['width']) if match['width'] else None
+    if width is None or width not in config['DNA_ASSET_WIDTHS'] or width >= asset['width']:
+        return None
+    with _derive_lock: # One encoder at a time; concurrent requests for the same file wait for it
+        if not os.path.isfile(path):
+            try:
+                with open(os.path.join(config['DNA_DATA_DIR'], source_path), 'rb') as f:
+                    _write_derivative(config['DNA_ASSET_DIR'], file_name, f.read(), width, manifest.quality)
+            except (OSError, UnidentifiedImageError) as e:
+                logger.error(f"Could not derive DNA asset {file_name}: {e}")
+                return None
+            logger.info(f"Derived DNA asset {file_name} on demand.")
+    return path
+
+
+def init_dna_assets(app):
+    """Registers the `flask dna-assets` command that (re)builds the asset bundle offline."""
+    @app.cli.command('dna-assets')
+    def build_assets_command():
+        """Encodes every DNA image under DNA_DATA_DIR into WebP assets and thumbnails in DNA_ASSET_DIR."""
+        manifest = build_assets(dna_service.get_catalog(), app.config['DNA_DATA_DIR'], app.config['DNA_ASSET_DIR'],
+                                app.config['DNA_ASSET_WIDTHS'], app.config['DNA_ASSET_QUALITY'])
+        print(f"Bundled {len(manifest['assets'])} images into {app.config['DNA_ASSET_DIR']}.")
@@ -0,0 +1,240 @@
+# backend/app/services/dna_service.py
+
+import os
+import re
+import csv
+import time
+import logging
+import threading
+from urllib.parse import unquote, urlsplit
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# Facets that can be filtered on; values within a facet are OR-ed, facets are AND-ed
+FACETS = ('case_id', 'view', 'style', 'color', 'lighting', 'keyword')
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+class DnaImage(NamedTuple):
+    """One row of the DNA table: a view of a product case with its design attributes."""
+    case_id: str
+    name: str
+    view: str
+    image_url: str
+    local_path: Optional[str]   # Relative to DNA_DATA_DIR, None if the image only exists remotely
+    styles: Tuple[str, ...]
+    colors: Tuple[str, ...]
+    lighting: bool
+    keywords: Tuple[str, ...]   # Keyword phrases as written in the table
+
+
+class DnaCatalogError(Exception):
+    """Raised when the DNA table cannot be read."""
+    pass
+
+
+def _split(value: str) -> Tuple[str, ...]:
+    return tuple(part.strip() for part in (value or '').split(',') if part.strip())
+
+
+def normalize(value: str) -> str:
+    """Index key of a facet value: case-insensitive, single-spaced."""
+    return ' '.join(value.casefold().split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Keyword tokens of a phrase, e.g. 'Tempered glass side panel' -> ['tempered', 'glass', 'side', 'panel']."""
+    return _TOKEN_RE.findall(text.casefold())
+
+
+def _local_path(image_url: str, data_dir: str) -> Optional[str]:
+    """Maps a repository raw URL (.../data/<model>/<file>) to the file under data_dir, if present."""
+    path = unquote(urlsplit(image_url).path)
+    marker = path.find('/data/')
+    if marker < 0:
+        return None
+    relative = path[marker + len('/data/'):]
+    full_path = os.path.normpath(os.path.join(data_dir, relative))
+    if not full_path.startswith(os.path.normpath(data_dir) + os.sep) or not os.path.isfile(full_path):
+        return None
+    return relative
+
+
+class DnaCatalog:
+    """
+    Immutable, fully indexed snapshot of the DNA table. Every facet value maps to a posting
+    list stored as an int bitmask over row positions, so a filtered query is a handful of
+    dict lookups and integer AND/ORs, and paging walks the set bits of the result.
+    """
+
+    def __init__(self, images: List[DnaImage], mtime: float):
+        self.images: Tuple[DnaImage, ...] = tuple(images)
+        self.mtime = mtime
+        self.loaded_at = time.time()
+        self.all_mask = (1 << len(self.images)) - 1
+        self.index: Dict[str, Dict[str, int]] = {facet: {} for facet in FACETS}
+        self.labels: Dict[str, Dict[str, str]] = {facet: {} for facet in FACETS} # Normalized -> display value
+        self.cases: Dict[str, Tuple[int, ...]] = {}
+
+        for position, image in enumerate(self.images):
+            bit = 1 << position
+            self._add('case_id', image.case_id, bit)
+            self._add('view', image.view, bit)
+            for style in image.styles:
+                self._add('style', style, bit)
+            for color in image.colors:
+                self._add('color', color, bit)
+            self._add('lighting', 'yes' if image.lighting else 'no', bit)
+            for phrase in image.keywords:
+                for token in tokenize(phrase):
+                    self._add('keyword', token, bit)
+            self.cases[image.case_id] = self.cases.get(image.case_id, ()) + (position,)
+
+    def _add(self, facet: str, value: str, bit: int):
+        key = normalize(value)
+        self.index[facet][key] = self.index[facet].get(key, 0) | bit
+        self.labels[facet].setdefault(key, value)
+
+    def match(self, filters: Dict[str, Iterable[str]]) -> int:
+        """Bitmask of the rows matching every facet filter (any of the values within a facet)."""
+        mask = self.all_mask
+        for facet, values in filters.items():
+            postings = self.index[facet]
+            facet_mask = 0
+            for value in values:
+                if facet == 'keyword':
+                    # A multi-word keyword matches rows having all of its tokens
+                    tokens = tokenize(value)
+                    token_mask = self.all_mask if tokens else 0
+                    for token in tokens:
+                        token_mask &= postings.get(token, 0)
+                    facet_mask |= token_mask
+                else:
+                    facet_mask |= postings.get(normalize(value), 0)
+            mask &= facet_mask
+            if not mask:
+                break
+        return mask
+
+    @staticmethod
+    def count(mask: int) -> int:
+        return bin(mask).count('1')
+
+    def rows(self, mask: int, offset: int = 0, limit: Optional[int] = None) -> Iterator[DnaImage]:
+        """Rows of a bitmask in table order, skipping `offset` matches and yielding at most `limit`."""
+        skipped = yielded = 0
+        while mask and (limit is None or yielded < limit):
+            low_bit = mask & -mask
+            mask ^= low_bit
+            if skipped < offset:
+                skipped += 1
+                continue
+            yielded += 1
+            yield self.images[low_bit.bit_length() - 1]
+
+    def query(self, filters: Dict[str, Iterable[str]], offset: int = 0, limit: int = 20) -> Tuple[int, List[DnaImage]]:
+        """Returns (total matches, one page of matching rows)."""
+        mask = self.match(filters)
+        return self.count(mask), list(self.rows(mask, offset, limit))
+
+    def case(self, case_id: str) -> List[DnaImage]:
+        """All views of a case, in table order (empty if unknown)."""
+        return [self.images[position] for position in self.cases.get(case_id, ())]
+
+    def facet_counts(self, mask: Optional[int] = None) -> Dict[str, Dict[str, int]]:
+        """Number of (matching) rows per facet value, keyed by display value."""
+        mask = self.all_mask if mask is None else mask
+        counts = {}
+        for facet, postings in self.index.items():
+            counts[facet] = {self.labels[facet][key]: self.count(bits & mask)
+                             for key, bits in sorted(postings.items()) if bits & mask}
+        return counts
+
+
+def load_catalog(csv_path: str, data_dir: str) -> DnaCatalog:
+    """Parses the DNA table (UTF-8, optional BOM) into an indexed catalog. Raises DnaCatalogError."""
+    try:
+        mtime = os.stat(csv_path).st_mtime
+        with open(csv_path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            missing = {'Case_id', 'image_url'} - set(reader.fieldnames or ())
+            if missing:
+                raise DnaCatalogError(f"DNA table {csv_path} lacks columns {sorted(missing)}.")
+            images = []
+            for row in reader:
+                if not (row.get('Case_id') or '').strip():
+                    continue
+                images.append(DnaImage(
+                    case_id=row['Case_id'].strip(),
+                    name=(row.get('name') or '').strip(),
+                    view=(row.get('image_view') or '').strip(),
+                    image_url=(row.get('image_url') or '').strip(),
+                    local_path=_local_path((row.get('image_url') or '').strip(), data_dir),
+                    styles=_split(row.get('style')),
+                    colors=_split(row.get('color')),
+                    lighting=(row.get('lightning') or '').strip().lower() in ('yes', 'true', '1'),
+                    keywords=_split(row.get('cm_keywords')),
+                ))
+    except (OSError, csv.Error, KeyError) as e:
+        raise DnaCatalogError(f"Could not load DNA table {csv_path}: {e}") from e
+    return DnaCatalog(images, mtime)
+
+
+# --- Process-wide catalog (loaded once, reloaded when the table's mtime changes) ---
+_catalog: Optional[DnaCatalog] = None
+_catalog_lock = threading.Lock()
+_checked_at = 0.0
+
+
+def _csv_path(config) -> str:
+    return os.path.join(config['DNA_DATA_DIR'], config['DNA_TABLE_FILE'])
+
+
+def get_catalog() -> DnaCatalog:
+    """
+    Returns the current catalog. The table's mtime is checked at most every
+    DNA_RELOAD_INTERVAL seconds; a changed table is re-parsed and swapped in atomically,
+    while a table that fails to parse keeps the previous snapshot serving.
+    """
+    global _catalog, _checked_at
+    config = current_app.config
+    now = time.monotonic()
+    if _catalog is not None and (not config['DNA_RELOAD_ENABLED'] or now - _checked_at < config['DNA_RELOAD_INTERVAL']):
+        return _catalog
+
+    with _catalog_lock:
+        if _catalog is not None and now - _checked_at < config['DNA_RELOAD_INTERVAL']:
+            return _catalog # Checked by another thread meanwhile
+        _checked_at = now
+        csv_path = _csv_path(config)
+        try:
+            mtime = os.stat(csv_path).st_mtime
+            if _catalog is None or mtime != _catalog.mtime:
+                started = time.perf_counter()
+                _catalog = load_catalog(csv_path, config['DNA_DATA_DIR'])
+                logger.info(f"Loaded DNA catalog from {csv_path}: {len(_catalog.images)} images, "
+                            f"{len(_catalog.cases)} cases in {(time.perf_counter() - started) * 1000:.1f} ms.")
+        except (OSError, DnaCatalogError) as e:
+            logger.error(f"DNA catalog unavailable: {e}")
+            if _catalog is None:
+                _catalog = DnaCatalog([], 0.0) # Serve an empty catalog until the table appears
+        return _catalog
+
+
+def get_catalog_stats() -> Dict:
+    """Size and age of the loaded catalog (for GET /api/health/details)."""
+    catalog = _catalog
+    if catalog is None:
+        return {'loaded': False}
+    return {'loaded': bool(catalog.images), 'images': len(catalog.images), 'cases': len(catalog.cases),
+            'loaded_at': int(catalog.loaded_at)}
+
+
+def init_dna(app):
+    """Loads the DNA catalog at startup, so the first query doesn't pay for parsing."""
+    with app.app_context():
+        get_catalog()
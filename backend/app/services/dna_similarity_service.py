@@ -0,0 +1,273 @@
+# backend/app/services/dna_similarity_service.py
+
+import io
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+from flask import current_app
+
+from app.services import dna_service
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+MATRIX_FILE = "embeddings.npy"
+
+# Feature blocks and their share of the cosine score (each block is unit-normalized, then scaled by sqrt(weight)).
+# Chosen on the DNA images themselves: nearest neighbours of a view should be other views of the same product,
+# which colour and surface texture predict far better than shape hashes (views differ in camera angle).
+BLOCK_WEIGHTS = {'color': 0.5, 'texture': 0.5}
+HUE_BINS, SAT_BINS, VAL_BINS = 8, 3, 3
+TEXTURE_SIZE = 128         # Local binary patterns of the product crop resized to 128x128
+TEXTURE_THRESHOLD = 4      # Grey levels a neighbour must exceed the centre by; ignores compression noise
+EMBEDDING_DIMS = HUE_BINS * SAT_BINS * VAL_BINS + 256
+
+_LBP_NEIGHBOURS = ((-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1))
+
+
+class DnaIndexError(Exception):
+    """Raised when the similarity index cannot be built or read."""
+    pass
+
+
+# --- Embedding ---
+
+def _foreground(data: bytes) -> Image.Image:
+    """Decodes an image, flattens transparency onto white and crops to the product (non-white) area."""
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft('RGB', (256, 256)) # JPEG decodes at reduced scale
+        factor = max(image.size) // 256
+        image = image.reduce(factor) if factor > 1 else image.copy() # Box reduction, far cheaper than thumbnail()
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGBA', image.size, (255, 255, 255, 255))
+            image = Image.alpha_composite(background, image)
+        image = image.convert('RGB')
+    pixels = np.asarray(image, dtype=np.uint8)
+    mask = pixels.min(axis=2) < 245
+    if mask.any():
+        rows, cols = np.flatnonzero(mask.any(axis=1)), np.flatnonzero(mask.any(axis=0))
+        image = image.crop((cols[0], rows[0], cols[-1] + 1, rows[-1] + 1))
+    return image
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else vector
+
+
+def embed_image(data: bytes) -> np.ndarray:
+    """
+    CPU-only embedding of a product image, dominated by decoding it: an HSV colour histogram
+    of the product pixels and a local-binary-pattern histogram of its surface texture.
+    Returns a unit float32 vector of EMBEDDING_DIMS, so cosine similarity is a dot product.
+    Raises DnaIndexError for undecodable images.
+    """
+    try:
+        image = _foreground(data)
+    except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError) as e:
+        raise DnaIndexError(f"Unreadable image: {e}") from e
+
+    hsv = np.asarray(image.convert('HSV'), dtype=np.uint16).reshape(-1, 3)
+    product = np.asarray(image, dtype=np.uint8).reshape(-1, 3).min(axis=1) < 245
+    if product.any():
+        hsv = hsv[product] # Ignore the white backdrop
+    bins = (hsv[:, 0] * HUE_BINS // 256) * SAT_BINS * VAL_BINS + (hsv[:, 1] * SAT_BINS // 256) * VAL_BINS + hsv[:, 2] * VAL_BINS // 256
+    color = np.sqrt(np.bincount(bins, minlength=HUE_BINS * SAT_BINS * VAL_BINS).astype(np.float32)) # Hellinger
+
+    gray = np.asarray(image.convert('L').resize((TEXTURE_SIZE, TEXTURE_SIZE), Image.BILINEAR), dtype=np.int16)
+    centre = gray[1:-1, 1:-1] + TEXTURE_THRESHOLD
+    codes = np.zeros(centre.shape, dtype=np.uint8)
+    for bit, (dy, dx) in enumerate(_LBP_NEIGHBOURS):
+        codes |= (gray[1 + dy:TEXTURE_SIZE - 1 + dy, 1 + dx:TEXTURE_SIZE - 1 + dx] >= centre).astype(np.uint8) << bit
+    texture = np.sqrt(np.bincount(codes.ravel(), minlength=256).astype(np.float32))
+
+    blocks = {'color': color, 'texture': texture}
+    vector = np.concatenate([_unit(blocks[name]) * np.sqrt(weight) for name, weight in BLOCK_WEIGHTS.items()])
+    return _unit(vector).astype(np.float32)
+
+
+# --- Offline index build ---
+
+def _index_entries(catalog: dna_service.DnaCatalog, data_dir: str) -> List[Dict]:
+    """
+    Every WebP view under data_dir/<model>/. Files listed in the DNA table carry its case;
+    unlisted views inherit the case of their folder when the folder belongs to a single case.
+    """
+    by_path = {image.local_path: image for image in catalog.images if image.local_path}
+    folder_cases: Dict[str, set] = {}
+    for image in by_path.values():
+        folder_cases.setdefault(image.local_path.split('/')[0], set()).add(image.case_id)
+
+    entries = []
+    for model in sorted(os.listdir(data_dir)):
+        folder = os.path.join(data_dir, model)
+        if not os.path.isdir(folder):
+            continue
+        for filename in sorted(os.listdir(folder)):
+            if not filename.lower().endswith('.webp'):
+                continue
+            path = f"{model}/{filename}"
+            listed = by_path.get(path)
+            cases = folder_cases.get(model, set())
+            entries.append({
+                'path': path,
+                'model': model,
+                'case_id': listed.case_id if listed else (next(iter(cases)) if len(cases) == 1 else None),
+                'view': listed.view if listed else os.path.splitext(filename)[0].rsplit('_', 1)[-1],
+            })
+    return entries
+
+
+def build_index(catalog: dna_service.DnaCatalog, data_dir: str, index_dir: str) -> Dict:
+    """
+    Embeds every DNA view and writes the matrix (MATRIX_FILE, float32 N x EMBEDDING_DIMS) and
+    its row metadata (MANIFEST_FILE). Both are written to temporary files and renamed into
+    place, the manifest last, so a serving process never maps a half-written index.
+    Returns the manifest.
+    """
+    started = time.perf_counter()
+    entries, vectors = [], []
+    for entry in _index_entries(catalog, data_dir):
+        try:
+            with open(os.path.join(data_dir, entry['path']), 'rb') as f:
+                vectors.append(embed_image(f.read()))
+            entries.append(entry)
+        except (OSError, DnaIndexError) as e:
+            logger.warning(f"Skipping DNA image {entry['path']}: {e}")
+    if not entries:
+        raise DnaIndexError(f"No WebP views found under {data_dir}.")
+
+    os.makedirs(index_dir, exist_ok=True)
+    matrix_path = os.path.join(index_dir, MATRIX_FILE)
+    with open(matrix_path + '.tmp', 'wb') as f:
+        np.save(f, np.stack(vectors))
+    os.replace(matrix_path + '.tmp', matrix_path)
+
+    manifest = {'version': EMBEDDING_VERSION, 'dims': EMBEDDING_DIMS, 'weights': BLOCK_WEIGHTS,
+                'created_at': int(time.time()), 'entries': entries}
+    manifest_path = os.path.join(index_dir, MANIFEST_FILE)
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    logger.info(f"Built DNA similarity index of {len(entries)} images in {index_dir} "
+                f"({time.perf_counter() - started:.1f} s).")
+    return manifest
+
+
+# --- Serving ---
+
+class SimilarityIndex:
+    """Read-only view of a built index; the matrix is memory-mapped, so processes share its pages."""
+
+    def __init__(self, index_dir: str):
+        manifest_path = os.path.join(index_dir, MANIFEST_FILE)
+        try:
+            self.mtime = os.stat(manifest_path).st_mtime
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            self.matrix = np.load(os.path.join(index_dir, MATRIX_FILE), mmap_mode='r')
+        except (OSError, ValueError) as e:
+            raise DnaIndexError(f"Could not read DNA similarity index in {index_dir}: {e}") from e
+        self.entries: List[Dict] = manifest['entries']
+        if manifest.get('version') != EMBEDDING_VERSION or self.matrix.shape != (len(self.entries), EMBEDDING_DIMS):
+            raise DnaIndexError(f"DNA similarity index in {index_dir} is outdated or incomplete; rebuild it.")
+        # Group per case (or per model folder for views without a case), to return one hit per product
+        groups = [entry['case_id'] or entry['model'] for entry in self.entries]
+        codes = {group: code for code, group in enumerate(dict.fromkeys(groups))}
+        self.groups = np.array([codes[group] for group in groups], dtype=np.int32)
+
+    def search(self, vector: np.ndarray, k: int, per_case: bool = True) -> List[Dict]:
+        """Top-k entries by cosine similarity, best first; per_case keeps only the best view of each case."""
+        scores = self.matrix @ vector
+        k = min(k, len(scores))
+        if per_case:
+            order = np.argsort(-scores, kind='stable')
+            _, first = np.unique(self.groups[order], return_index=True)
+            top = order[np.sort(first)][:k]
+        else:
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind='stable')]
+        return [{**self.entries[i], 'score': round(float(scores[i]), 4)} for i in top]
+
+
+_index: Optional[SimilarityIndex] = None
+_index_lock = threading.Lock()
+_checked_at = 0.0
+
+
+def get_index() -> Optional[SimilarityIndex]:
+    """
+    Returns the served index, or None if it has not been built yet (`flask dna-index`).
+    Like the catalog, a rebuilt index is picked up by its manifest mtime.
+    """
+    global _index, _checked_at
+    config = current_app.config
+    now = time.monotonic()
+    if _checked_at and now - _checked_at < config['DNA_RELOAD_INTERVAL']:
+        return _index
+
+    with _index_lock:
+        if _checked_at and now - _checked_at < config['DNA_RELOAD_INTERVAL']:
+            return _index # Checked by another thread meanwhile
+        _checked_at = now
+        manifest_path = os.path.join(config['DNA_INDEX_DIR'], MANIFEST_FILE)
+        try:
+            mtime = os.stat(manifest_path).st_mtime
+        except OSError:
+            if _index is None:
+                logger.warning(f"No DNA similarity index in {config['DNA_INDEX_DIR']}; run `flask dna-index`.")
+            return _index
+        if _index is None or mtime != _index.mtime:
+            try:
+                _index = SimilarityIndex(config['DNA_INDEX_DIR'])
+                logger.info(f"Loaded DNA similarity index: {len(_index.entries)} images.")
+            except DnaIndexError as e:
+                logger.error(str(e))
+        return _index
+
+
+def _with_dna(match: Dict, catalog: dna_service.DnaCatalog) -> Dict:
+    """Adds the DNA attributes of the match's case (if known) for prompts and clients."""
+    images = catalog.case(match['case_id']) if match['case_id'] else []
+    if images:
+        match.update(name=images[0].name, styles=list(images[0].styles), colors=list(images[0].colors),
+                     lighting=images[0].lighting,
+                     keywords=list(dict.fromkeys(k for image in images for k in image.keywords)))
+    return match
+
+
+async def find_similar(image_bytes: bytes, k: Optional[int] = None, per_case: bool = True) -> Optional[List[Dict]]:
+    """
+    Finds the DNA views closest to an image, each with its case's DNA attributes.
+    Returns None if no index is available. Raises DnaIndexError for undecodable images.
+    """
+    index = get_index()
+    if index is None:
+        return None
+    vector = await asyncio.to_thread(embed_image, image_bytes) # Decoding is CPU-bound; keep it off the loop
+    catalog = dna_service.get_catalog()
+    return [_with_dna(match, catalog) for match in index.search(vector, k or current_app.config['DNA_SIMILAR_TOP_K'], per_case)]
+
+
+def dna_keywords(matches: List[Dict], min_score: float, limit: int) -> List[str]:
+    """Distinct DNA keywords of the matches scoring at least min_score, best match first."""
+    keywords = dict.fromkeys(k for match in matches if match['score'] >= min_score for k in match.get('keywords', []))
+    return list(keywords)[:limit]
+
+
+def init_dna_similarity(app):
+    """Registers the `flask dna-index` command that (re)builds the similarity index offline."""
+    @app.cli.command('dna-index')
+    def build_index_command():
+        """Embeds every DNA image under DNA_DATA_DIR into DNA_INDEX_DIR."""
+        manifest = build_index(dna_service.get_catalog(), app.config['DNA_DATA_DIR'], app.config['DNA_INDEX_DIR'])
+        print(f"Indexed {len(manifest['entries'])} images into {app.config['DNA_INDEX_DIR']}.")
@@ -0,0 +1,290 @@
+# backend/app/services/feedback_service.py
+
+import os
+import json
+import atexit
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import redis
+from flask import current_app
+
+from app.db import supabase_client
+from app.db.redis_client import get_redis
+from app.models.schemas import FeedbackSubmission
+from app.utils.background_loop import run_coroutine_in_context
+
+logger = logging.getLogger(__name__)
+
+BUFFER_KEY = "feedback:buffer"
+PROMPT_RANKING_KEY = "feedback:prompts" # Sorted set: prompt key -> number of ratings
+RATINGS = range(1, 6)
+PROMPT_TEXT_MAX = 500 # Characters of the prompt kept with its aggregate
+
+
+def _request_stats_key(request_id: str) -> str:
+    return f"feedback:stats:request:{request_id}"
+
+
+def _prompt_stats_key(prompt_key: str) -> str:
+    return f"feedback:stats:prompt:{prompt_key}"
+
+
+def prompt_key(prompt: str) -> str:
+    """Aggregation key of a prompt: case- and whitespace-insensitive hash."""
+    return hashlib.sha256(' '.join(prompt.casefold().split()).encode('utf-8')).hexdigest()[:16]
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class FeedbackBufferFull(Exception):
+    """Raised when FEEDBACK_BUFFER_MAX entries are waiting (the database is falling behind)."""
+    pass
+
+
+# --- Buffers ---
+
+class _MemoryBuffer:
+    """Per-process FIFO. Entries still buffered when the process dies are lost (flushed at normal exit)."""
+
+    def __init__(self):
+        self._entries = deque()
+        self._lock = threading.Lock()
+
+    def push(self, entries: List[Dict], limit: int) -> int:
+        with self._lock:
+            if len(self._entries) + len(entries) > limit:
+                raise FeedbackBufferFull(f"{len(self._entries)} feedback entries are waiting to be stored.")
+            self._entries.extend(entries)
+            return len(self._entries)
+
+    def pop(self, count: int) -> List[Dict]:
+        with self._lock:
+            return [self._entries.popleft() for _ in range(min(count, len(self._entries)))]
+
+    def requeue(self, entries: List[Dict]):
+        with self._lock:
+            self._entries.extendleft(reversed(entries))
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+# Check-and-push in one step, so concurrent API processes cannot overrun the limit.
+# Returns {1, new length} if the entries were appended, {0, current length} if they would not fit.
+_PUSH_SCRIPT = """
+local size = redis.call('llen', KEYS[1])
+if size + #ARGV - 1 > tonumber(ARGV[1]) then
+    return {0, size}
+end
+return {1, redis.call('rpush', KEYS[1], unpack(ARGV, 2))}
+"""
+
+
+class _RedisBuffer:
+    """Redis list shared by every API process; survives restarts, and any process's flusher drains it."""
+
+    def push(self, entries: List[Dict], limit: int) -> int:
+        pushed, size = get_redis().eval(_PUSH_SCRIPT, 1, BUFFER_KEY, limit, *(json.dumps(entry) for entry in entries))
+        if not pushed:
+            raise FeedbackBufferFull(f"{size} feedback entries are waiting to be stored.")
+        return size
+
+    def pop(self, count: int) -> List[Dict]:
+        return [json.loads(raw) for raw in get_redis().lpop(BUFFER_KEY, count) or []]
+
+    def requeue(self, entries: List[Dict]):
+        if entries:
+            get_redis().lpush(BUFFER_KEY, *(json.dumps(entry) for entry in reversed(entries)))
+
+    def size(self) -> int:
+        return get_redis().llen(BUFFER_KEY)
+
+
+_buffers = {'memory': _MemoryBuffer(), 'redis': _RedisBuffer()}
+
+
+def _get_buffer():
+    return _buffers[current_app.config['FEEDBACK_BUFFER']]
+
+
+# --- Ingestion ---
+
+_flusher: Optional[threading.Thread] = None
+_flusher_pid: Optional[int] = None
+_flusher_lock = threading.Lock()
+_flush_now = threading.Event()
+_counts = Counter() # Per-process totals for GET /api/health/details
+
+
+def _flush_loop(app):
+    """Flusher thread: flushes every FEEDBACK_FLUSH_INTERVAL seconds, or as soon as a batch is full."""
+    while True:
+        _flush_now.wait(app.config['FEEDBACK_FLUSH_INTERVAL'])
+        _flush_now.clear()
+        try:
+            with app.app_context():
+                run_coroutine_in_context(flush_feedback())
+        except Exception as e:
+            logger.error(f"Feedback flush failed: {e}", exc_info=True)
+
+
+def _ensure_flusher(app):
+    global _flusher, _flusher_pid
+    if _flusher is None or _flusher_pid != os.getpid() or not _flusher.is_alive():
+        with _flusher_lock:
+            if _flusher is None or _flusher_pid != os.getpid() or not _flusher.is_alive():
+                _flusher = threading.Thread(target=_flush_loop, args=(app,), name="feedback-flusher", daemon=True)
+                _flusher.start()
+                _flusher_pid = os.getpid()
+                logger.info(f"Feedback flusher started for process {_flusher_pid}.")
+
+
+def enqueue_feedback(user_id: str, submissions: List[FeedbackSubmission]) -> int:
+    """
+    Buffers validated feedback for batched storage and returns the number of entries queued.
+    Entries are timestamped now, not when they are flushed. Raises FeedbackBufferFull.
+    """
+    config = current_app.config
+    created_at = datetime.now(timezone.utc).isoformat()
+    entries = [{**submission.model_dump(), 'user_id': user_id, 'created_at': created_at} for submission in submissions]
+    size = _get_buffer().push(entries, config['FEEDBACK_BUFFER_MAX'])
+    _ensure_flusher(current_app._get_current_object())
+    if size >= config['FEEDBACK_BATCH_SIZE']:
+        _flush_now.set()
+    return len(entries)
+
+
+async def flush_feedback() -> Dict[str, int]:
+    """
+    Moves buffered feedback to the `feedback` table, one bulk insert per FEEDBACK_BATCH_SIZE
+    entries (at most FEEDBACK_MAX_BATCHES per call), and folds each stored batch into the
+    rating aggregates. Entries for unknown requests are dropped (they would fail the whole
+    insert); if the database is unavailable the batch goes back to the front of the buffer.
+    Runs on the shared event loop, so buffer and aggregate writes go through worker threads.
+    Returns per-outcome counts.
+    """
+    config = current_app.config
+    buffer = _get_buffer()
+    counts = {'stored': 0, 'dropped': 0, 'requeued': 0}
+    for _ in range(config['FEEDBACK_MAX_BATCHES']):
+        entries = await asyncio.to_thread(buffer.pop, config['FEEDBACK_BATCH_SIZE'])
+        if not entries:
+            break
+        # One query validates the request ids and fetches the prompts for the per-prompt aggregates
+        prompts = await supabase_client.get_generation_prompts(sorted({e['request_id'] for e in entries}))
+        known = [e for e in entries if prompts is not None and e['request_id'] in prompts]
+        if prompts is None or (known and not await supabase_client.store_feedback(known)):
+            await asyncio.to_thread(buffer.requeue, entries)
+            counts['requeued'] += len(entries)
+            break # Retried on the next tick
+        if len(known) < len(entries):
+            unknown = sorted({e['request_id'] for e in entries} - set(prompts))
+            logger.warning(f"Dropped {len(entries) - len(known)} feedback entries for unknown requests: {unknown}")
+        counts['stored'] += len(known)
+        counts['dropped'] += len(entries) - len(known)
+        await asyncio.to_thread(_update_aggregates, known, prompts)
+        if len(entries) < config['FEEDBACK_BATCH_SIZE']:
+            break
+
+    _counts.update(counts)
+    if counts['requeued']:
+        logger.warning(f"Feedback flush: {counts}")
+    elif any(counts.values()):
+        logger.info(f"Feedback flush: {counts}")
+    return counts
+
+
+# --- Rating aggregates ---
+
+def _update_aggregates(entries: List[Dict], prompts: Dict[str, str]):
+    """
+    Adds stored ratings to the per-request and per-prompt aggregates (Redis hashes of count,
+    sum and a histogram), so analytics reads are a few hash lookups. Each batch is summed
+    here first and applied with HINCRBY in one round trip, so concurrent flushers never lose updates.
+    """
+    increments: Dict[str, Counter] = {}
+    last_rated: Dict[str, str] = {}
+    prompt_texts: Dict[str, str] = {}
+    prompt_counts = Counter()
+    for entry in entries:
+        key = prompt_key(prompts[entry['request_id']])
+        prompt_texts[key] = prompts[entry['request_id']][:PROMPT_TEXT_MAX]
+        prompt_counts[key] += 1
+        for stats_key in (_request_stats_key(entry['request_id']), _prompt_stats_key(key)):
+            increments.setdefault(stats_key, Counter()).update(
+                {'count': 1, 'sum': entry['rating'], f"r{entry['rating']}": 1})
+            last_rated[stats_key] = max(last_rated.get(stats_key, ''), entry['created_at'])
+
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for stats_key, fields in increments.items():
+            for field, amount in fields.items():
+                pipe.hincrby(stats_key, field, amount)
+            pipe.hset(stats_key, 'last_rated_at', last_rated[stats_key])
+        for key, text in prompt_texts.items():
+            pipe.hsetnx(_prompt_stats_key(key), 'prompt', text)
+            pipe.zincrby(PROMPT_RANKING_KEY, prompt_counts[key], key)
+        pipe.execute()
+    except redis.exceptions.RedisError as e:
+        logger.error(f"Failed to update rating aggregates for {len(entries)} stored entries: {e}")
+
+
+def _stats_from_hash(raw: Dict) -> Dict:
+    fields = {_text(k): _text(v) for k, v in raw.items()}
+    count = int(fields.get('count', 0))
+    return {
+        'count': count,
+        'mean': round(int(fields.get('sum', 0)) / count, 3) if count else None,
+        'histogram': {str(r): int(fields.get(f"r{r}", 0)) for r in RATINGS},
+        'last_rated_at': fields.get('last_rated_at'),
+        **({'prompt': fields['prompt']} if 'prompt' in fields else {}),
+    }
+
+
+def get_request_stats(request_ids: List[str]) -> Dict[str, Dict]:
+    """Rating aggregates of the requests that have ratings, keyed by request id."""
+    pipe = get_redis().pipeline(transaction=False)
+    for request_id in request_ids:
+        pipe.hgetall(_request_stats_key(request_id))
+    return {request_id: _stats_from_hash(raw) for request_id, raw in zip(request_ids, pipe.execute()) if raw}
+
+
+def get_top_prompts(limit: int) -> List[Dict]:
+    """Rating aggregates of the most rated prompts, most ratings first."""
+    client = get_redis()
+    keys = [_text(key) for key in client.zrevrange(PROMPT_RANKING_KEY, 0, limit - 1)]
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.hgetall(_prompt_stats_key(key))
+    return [{'prompt_key': key, 'prompt': '', **_stats_from_hash(raw)} for key, raw in zip(keys, pipe.execute()) if raw]
+
+
+def get_feedback_stats() -> Dict:
+    """Buffer depth and this process's flush totals (for GET /api/health/details)."""
+    stats = {'buffer': current_app.config['FEEDBACK_BUFFER'], **{k: _counts[k] for k in ('stored', 'dropped', 'requeued')}}
+    try:
+        stats['buffered'] = _get_buffer().size()
+    except redis.exceptions.RedisError:
+        stats['buffered'] = None
+    return stats
+
+
+def init_feedback(app):
+    """Flushes feedback still buffered in this process at shutdown (memory buffer only)."""
+    def _flush_at_exit():
+        if app.config['FEEDBACK_BUFFER'] == 'memory' and _buffers['memory'].size():
+            try:
+                with app.app_context():
+                    counts = run_coroutine_in_context(flush_feedback(), timeout=10)
+                logger.info(f"Flushed buffered feedback at shutdown: {counts}")
+            except Exception as e:
+                logger.error(f"Could not flush buffered feedback at shutdown: {e}")
+    atexit.register(_flush_at_exit)
@@ -1,161 +1,491 @@
 # backend/app/services/generation_service.py
 
+import time
+import asyncio
 import logging
 import uuid
-from typing import Optional
+from typing import Optional, Dict, List, Tuple, Callable, Awaitable, Any
 from werkzeug.datastructures import FileStorage # For type hinting file uploads
-from flask import current_app
+from flask import current_app, g
 
 # Import necessary components from other modules within the app
 from app.db import supabase_client
-from app.services import grok_service, task_queue_service
+from app.services import grok_service, dedup_service, status_service
+from app.services import image_service, scheduler_service, dna_similarity_service, prompt_service
+from app.models.schemas import Response, BatchVariant, BatchResponse
+from app.utils.uploads import upload_digest
 
 logger = logging.getLogger(__name__)
 
+SIGNED_VISION_URL_TTL = 600 # Seconds Grok Vision may take to fetch a direct upload
+
 class GenerationSubmissionError(Exception):
     """Custom exception for errors during the generation submission process."""
     pass
 
+
+class _StageGraph:
+    """
+    Runs submission stages as asyncio tasks, each starting as soon as its dependencies finish.
+    Records the wall time of every stage (excluding time spent waiting on dependencies).
+    """
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.timings: Dict[str, float] = {}
+
+    def add(self, name: str, func: Callable[..., Awaitable[Any]], *depends_on: str):
+        dependencies = [self.tasks[dep] for dep in depends_on]
+
+        async def run_stage():
+            results = [await dep for dep in dependencies]
+            started = time.perf_counter()
+            try:
+                return await func(*results)
+            finally:
+                self.timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+        self.tasks[name] = asyncio.create_task(run_stage(), name=f"{name}:{self.request_id}")
+
+    async def run(self) -> Dict[str, Any]:
+        """Waits for every stage; re-raises the first failure after all stages have settled."""
+        results = await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return dict(zip(self.tasks.keys(), results))
+
+
+# --- Shared Stage Implementations ---
+
+def _stored_filename(filename: str) -> str:
+    """Filename the reference is stored under (its extension changes when normalization re-encodes it)."""
+    return image_service.normalized_filename(filename) if image_service.normalization_enabled() else filename
+
+
+async def _prepare_reference(reference_image_file: Optional[FileStorage],
+                             analyze_image_flag: bool) -> Tuple[Optional[FileStorage], Optional[bytes]]:
+    """
+    Returns the reference to upload/analyze and its bytes, if they are held in memory.
+    Normalized references are small and in memory; otherwise the bytes are only read
+    when Vision needs them and the upload streams from the spooled file.
+    Raises image_service.InvalidImageError if the upload is not a decodable image.
+    """
+    if not reference_image_file or not reference_image_file.filename:
+        return None, None
+    if image_service.normalization_enabled():
+        normalized = await image_service.normalize_reference(reference_image_file)
+        return normalized, normalized.stream.getvalue()
+    return reference_image_file, await asyncio.to_thread(reference_image_file.read) if analyze_image_flag else None
+
+
+async def _upload_reference(reference_image_file: Optional[FileStorage], image_bytes: Optional[bytes],
+                            user_id: str, path_id: str) -> Optional[str]:
+    """
+    Uploads the reference image; returns its storage path or None (submission continues without it).
+    Streams the spooled upload unless its bytes were already read (image_bytes).
+    """
+    if not reference_image_file or not reference_image_file.filename:
+        return None
+    logger.info(f"Uploading reference image: {reference_image_file.filename} for {path_id}")
+    try:
+        uploaded_path = await supabase_client.upload_reference_image(
+            file_storage=reference_image_file,
+            user_id=user_id,
+            request_id=path_id,
+            file_content=image_bytes
+        )
+    except Exception as upload_err:
+        logger.error(f"Exception during reference image upload for {path_id}: {upload_err}", exc_info=True)
+        uploaded_path = None
+    if not uploaded_path:
+        # Log and continue without reference image features
+        logger.error(f"Reference image upload failed for {path_id}.")
+    return uploaded_path
+
+
+async def _describe_reference(reference_image_file: Optional[FileStorage], image_bytes: Optional[bytes],
+                              image_digest: Optional[str], log_id: str) -> Optional[str]:
+    """Runs Grok Vision on the reference image bytes; returns the description or None."""
+    if not image_bytes:
+        return None
+    logger.info(f"Analyzing reference image for {log_id}...")
+    try:
+        image_description = await grok_service.analyze_image_with_grok(
+            image_bytes=image_bytes,
+            content_type=reference_image_file.content_type or "image/png",
+            image_digest=image_digest
+        )
+        if image_description:
+            logger.info(f"Image analysis result received for {log_id}.")
+            return image_description
+        logger.warning(f"Grok Vision analysis returned no description for {log_id}.")
+    except Exception as analyze_err:
+        logger.error(f"Error during Grok Vision analysis for {log_id}: {analyze_err}", exc_info=True)
+    return None # Continue with the current prompt if analysis fails
+
+
+async def _describe_uploaded_reference(reference_upload: Dict, log_id: str) -> Optional[str]:
+    """Runs Grok Vision on a direct upload through a short-lived signed URL (its bytes never reach the API)."""
+    image_url = await supabase_client.create_signed_reference_url(reference_upload['path'], SIGNED_VISION_URL_TTL)
+    if not image_url:
+        return None
+    logger.info(f"Analyzing uploaded reference {reference_upload['upload_id']} for {log_id}...")
+    try:
+        image_description = await grok_service.analyze_image_with_grok(
+            image_url=image_url,
+            image_digest=reference_upload['etag']
+        )
+        if image_description:
+            return image_description
+        logger.warning(f"Grok Vision analysis returned no description for {log_id}.")
+    except Exception as analyze_err:
+        logger.error(f"Error during Grok Vision analysis for {log_id}: {analyze_err}", exc_info=True)
+    return None
+
+
+async def _match_dna(reference_image_file: Optional[FileStorage], image_bytes: Optional[bytes], log_id: str) -> List[str]:
+    """
+    DNA keywords of the product cases closest to the reference image (see dna_similarity_service).
+    Only runs on bytes already in memory; returns [] when disabled, unavailable or on failure.
+    """
+    config = current_app.config
+    if not config['DNA_SIMILAR_IN_PROMPT'] or not reference_image_file or not image_bytes:
+        return []
+    try:
+        matches = await dna_similarity_service.find_similar(image_bytes)
+    except Exception as match_err:
+        logger.warning(f"DNA matching failed for {log_id}: {match_err}")
+        return []
+    if not matches:
+        return []
+    logger.info(f"Closest DNA cases for {log_id}: {[(m['case_id'] or m['model'], m['score']) for m in matches]}")
+    return dna_similarity_service.dna_keywords(matches, config['DNA_SIMILAR_MIN_SCORE'], config['DNA_SIMILAR_PROMPT_KEYWORDS'])
+
+
+def _with_dna_keywords(prompt: str, keywords: List[str]) -> str:
+    """Combines the prompt with the DNA keywords of matching product cases, if any."""
+    return f"{prompt} (Design DNA: {', '.join(keywords)})" if keywords else prompt
+
+
+def _build_prompt(current_prompt: str, dna_keywords: List[str], log_id: str) -> str:
+    """Expands the prompt locally with the brand DNA vocabulary (see prompt_service); no remote call."""
+    try:
+        plan = prompt_service.build_prompt(current_prompt, dna_keywords)
+    except Exception as build_err:
+        logger.error(f"Error building prompt for {log_id}: {build_err}", exc_info=True)
+        return _with_dna_keywords(current_prompt, dna_keywords)
+    logger.info(f"Prompt built locally for {log_id}: styles={plan.styles}, colors={plan.colors}, "
+                f"lighting={plan.lighting}, cases={plan.cases}, terms={len(plan.terms)}")
+    return plan.prompt
+
+
+async def _refine_prompt(current_prompt: str, dna_keywords: List[str], optimize_prompt_flag: bool,
+                         llm_rewrite_flag: bool, log_id: str) -> str:
+    """
+    'optimize_prompt' builds the prompt locally from the DNA vocabulary; Grok LLM only runs when
+    'llm_rewrite' is requested (or for 'optimize_prompt' if PROMPT_ENGINE_ENABLED is off).
+    """
+    engine_enabled = current_app.config['PROMPT_ENGINE_ENABLED']
+    if optimize_prompt_flag and engine_enabled:
+        current_prompt = _build_prompt(current_prompt, dna_keywords, log_id)
+    else:
+        current_prompt = _with_dna_keywords(current_prompt, dna_keywords)
+    if llm_rewrite_flag or (optimize_prompt_flag and not engine_enabled):
+        return await _optimize_prompt(current_prompt, log_id)
+    return current_prompt
+
+
+def _with_reference_detail(prompt: str, image_description: Optional[str]) -> str:
+    """Combines the prompt with the reference image description, if any."""
+    return f"{prompt} (Reference detail: {image_description})" if image_description else prompt
+
+
+async def _optimize_prompt(current_prompt: str, log_id: str) -> str:
+    """Runs Grok LLM optimization; falls back to the current prompt on failure."""
+    logger.info(f"Optimizing prompt for {log_id}...")
+    try:
+        optimized_prompt = await grok_service.optimize_prompt_with_grok(current_prompt)
+        if optimized_prompt and optimized_prompt != current_prompt:
+            logger.info(f"Prompt optimized by Grok LLM for {log_id}. New prompt length: {len(optimized_prompt)}")
+            return optimized_prompt
+        elif optimized_prompt:
+            logger.info(f"Grok LLM returned same prompt for {log_id}, no change.")
+        else:
+            logger.warning(f"Grok LLM optimization returned empty result for {log_id}.")
+    except Exception as optimize_err:
+        logger.error(f"Error during Grok LLM optimization for {log_id}: {optimize_err}", exc_info=True)
+    return current_prompt # Continue with the current prompt if optimization fails
+
+
+
 async def process_generation_submission(
     user_id: str,
     prompt: str,
     reference_image_file: Optional[FileStorage] = None,
     analyze_image_flag: bool = False,
-    optimize_prompt_flag: bool = False
-) -> str:
+    optimize_prompt_flag: bool = False,
+    force_new: bool = False,
+    reference_upload: Optional[Dict] = None,
+    llm_rewrite_flag: bool = False
+) -> Response:
     """
-    Processes a new generation request submission:
-    1. Uploads reference image (if provided).
-    2. Optionally analyzes image and/or optimizes prompt using Grok.
-    3. Stores the initial request state in the database.
-    4. Sends the generation task to the background worker queue.
-    Returns the unique request_id for the submitted job.
-    Raises GenerationSubmissionError on failure.
+    Processes a new generation request submission as a dependency graph:
+      normalize (downscale/re-encode the reference image), then
+      upload    (reference image -> storage)
+      analyze   (reference image bytes -> Grok Vision)   -> optimize -> store (DB insert)
+      match_dna (reference image -> closest DNA cases)   -> optimize
+      optimize  (local DNA prompt engine; Grok LLM only if llm_rewrite is set)
+      dispatch  (interactive queue, see scheduler_service) once both upload and store have finished.
+    Upload runs concurrently with analysis/optimization/insert, so submit latency tracks
+    the slowest branch instead of the sum of all stages. Stage timings are logged and
+    left on g.submission_timings.
+    Unless force_new is set (or dedup is disabled), an identical earlier submission by the
+    same user that succeeded or is still in flight is returned instead of queueing a new job.
+    reference_upload (see upload_service.resolve_upload) replaces the file for direct uploads:
+    nothing is normalized or uploaded, and Vision reads the stored object.
+    Returns the Response for the submitted (or reused) job.
+    Raises GenerationSubmissionError on failure, image_service.InvalidImageError for an unreadable reference.
     """
     request_id = str(uuid.uuid4())
     logger.info(f"Processing generation submission for user {user_id}. New request_id: {request_id}")
 
+    image_digest: Optional[str] = None
     reference_image_path: Optional[str] = None
-    reference_image_url: Optional[str] = None
-    final_prompt: str = prompt
-
-    # --- 1. Handle Reference Image Upload (if provided) ---
     if reference_image_file and reference_image_file.filename:
-        logger.info(f"Attempting to upload reference image: {reference_image_file.filename} for request {request_id}")
+        image_digest = upload_digest(reference_image_file) # Hashed while the request was parsed
+        # The storage path is deterministic, so the DB row can be written before the upload finishes
+        reference_image_path = supabase_client.reference_image_path(
+            _stored_filename(reference_image_file.filename), user_id, request_id
+        )
+    elif reference_upload:
+        image_digest = reference_upload['etag']
+        reference_image_path = reference_upload['path']
+
+    # --- Deduplication (single-flight per fingerprint) ---
+    fingerprint: Optional[str] = None
+    if current_app.config['GENERATION_DEDUP_ENABLED'] and not force_new:
+        fingerprint = dedup_service.fingerprint_submission(
+            user_id,
+            prompt,
+            image_digest,
+            {'analyze_image': analyze_image_flag, 'optimize_prompt': optimize_prompt_flag, 'llm_rewrite': llm_rewrite_flag}
+        )
+        existing = await dedup_service.find_or_claim(fingerprint, request_id)
+        if existing:
+            return Response(
+                request_id=existing['request_id'],
+                status=existing['status'],
+                result_url=existing.get('result_url'),
+                deduplicated=True
+            )
+
+    # --- Stage: Reference Image Normalization ---
+    async def normalize() -> Tuple[Optional[FileStorage], Optional[bytes]]:
+        return await _prepare_reference(reference_image_file, analyze_image_flag)
+
+    # --- Stage: Reference Image Upload ---
+    async def upload(reference: Tuple[Optional[FileStorage], Optional[bytes]]) -> Optional[str]:
+        if reference_upload:
+            return reference_upload['path'] # Already in storage
+        return await _upload_reference(*reference, user_id, request_id)
+
+    # --- Stage: Optional Image Analysis (reads the bytes, not the public URL) ---
+    async def analyze(reference: Tuple[Optional[FileStorage], Optional[bytes]]) -> str:
+        if not analyze_image_flag:
+            return prompt
+        if reference_upload:
+            description = await _describe_uploaded_reference(reference_upload, request_id)
+        else:
+            description = await _describe_reference(*reference, image_digest, request_id)
+        return _with_reference_detail(prompt, description)
+
+    # --- Stage: Optional DNA Matching (in-memory reference bytes only) ---
+    async def match_dna(reference: Tuple[Optional[FileStorage], Optional[bytes]]) -> List[str]:
+        return await _match_dna(*reference, request_id)
+
+    # --- Stage: Optional Prompt Optimization (local engine; Grok LLM only for llm_rewrite) ---
+    async def optimize(current_prompt: str, dna_keywords: List[str]) -> str:
+        return await _refine_prompt(current_prompt, dna_keywords, optimize_prompt_flag, llm_rewrite_flag, request_id)
+
+    # --- Stage: Store Initial Request State ---
+    async def store(final_prompt: str) -> str:
+        logger.info(f"Storing initial 'processing' state for request {request_id}...")
         try:
-            # Pass user_id and request_id for structured storage path
-            reference_image_path = await supabase_client.upload_reference_image(
-                file_storage=reference_image_file,
+            stored_successfully = await supabase_client.store_generation_request(
+                request_id=request_id,
                 user_id=user_id,
-                request_id=request_id
+                prompt=final_prompt, # Store the final version of the prompt
+                status='processing',
+                ref_image_path=reference_image_path
             )
-            if reference_image_path:
-                logger.info(f"Reference image uploaded successfully for request {request_id}. Path: {reference_image_path}")
-                # Construct the public URL for potential analysis
-                try:
-                    # Adjust bucket_name based on your actual Supabase bucket
-                    bucket_name = "reference-images"
-                    # Ensure SUPABASE_URL is accessible, e.g., via current_app.config
-                    base_url = current_app.config.get('SUPABASE_URL')
-                    if base_url:
-                         reference_image_url = f"{base_url}/storage/v1/object/public/{bucket_name}/{reference_image_path}"
-                         logger.info(f"Constructed reference image URL: {reference_image_url}")
-                    else:
-                         logger.warning(f"SUPABASE_URL not configured, cannot construct public URL for image analysis for request {request_id}.")
-                         analyze_image_flag = False # Cannot analyze without URL
-
-                except Exception as url_err:
-                    logger.error(f"Failed to construct reference image URL for request {request_id}, path {reference_image_path}: {url_err}", exc_info=True)
-                    analyze_image_flag = False # Cannot analyze without URL
-            else:
-                # Decide how critical image upload failure is
-                logger.error(f"Reference image upload failed for request {request_id}.")
-                # Option 1: Raise immediately
-                # raise GenerationSubmissionError("Failed to upload reference image.")
-                # Option 2: Log and continue without reference image features
-                analyze_image_flag = False
-
-        except Exception as upload_err:
-            logger.error(f"Exception during reference image upload for request {request_id}: {upload_err}", exc_info=True)
-            # Option 1: Raise immediately
-            # raise GenerationSubmissionError(f"Failed to upload reference image: {upload_err}")
-            # Option 2: Log and continue
-            analyze_image_flag = False
-
-
-    # --- 2. Optional Image Analysis ---
-    if analyze_image_flag and reference_image_url:
-        logger.info(f"Analyzing reference image for request {request_id}...")
-        try:
-            image_description = await grok_service.analyze_image_with_grok(reference_image_url)
-            if image_description:
-                # Example: Append description to the prompt
-                final_prompt = f"{prompt} (Reference detail: {image_description})"
-                logger.info(f"Prompt updated with image analysis result for request {request_id}. New prompt length: {len(final_prompt)}")
-            else:
-                logger.warning(f"Grok Vision analysis returned no description for request {request_id}.")
-        except Exception as analyze_err:
-             logger.error(f"Error during Grok Vision analysis for request {request_id}: {analyze_err}", exc_info=True)
-             # Continue with the current prompt if analysis fails
-
-    # --- 3. Optional Prompt Optimization ---
-    if optimize_prompt_flag:
-        logger.info(f"Optimizing prompt for request {request_id}...")
-        try:
-            # Optimize the potentially updated prompt
-            optimized_prompt = await grok_service.optimize_prompt_with_grok(final_prompt)
-            if optimized_prompt and optimized_prompt != final_prompt: # Check if optimization actually changed something
-                 final_prompt = optimized_prompt
-                 logger.info(f"Prompt optimized by Grok LLM for request {request_id}. New prompt length: {len(final_prompt)}")
-            elif optimized_prompt:
-                 logger.info(f"Grok LLM returned same prompt for request {request_id}, no change.")
-            else:
-                 logger.warning(f"Grok LLM optimization returned empty result for request {request_id}.")
-        except Exception as optimize_err:
-             logger.error(f"Error during Grok LLM optimization for request {request_id}: {optimize_err}", exc_info=True)
-             # Continue with the current prompt if optimization fails
-
-
-    # --- 4. Store Initial Request State ---
-    logger.info(f"Storing initial 'processing' state for request {request_id}...")
-    try:
-        stored_successfully = await supabase_client.store_generation_request(
-            request_id=request_id,
-            user_id=user_id,
-            prompt=final_prompt, # Store the final version of the prompt
-            status='processing',
-            ref_image_path=reference_image_path
-            # Consider storing original prompt, flags used, etc. for auditing
-        )
+        except Exception as db_err:
+            logger.error(f"Database error while storing initial state for request {request_id}: {db_err}", exc_info=True)
+            raise GenerationSubmissionError(f"Database error during submission: {db_err}")
         if not stored_successfully:
             raise GenerationSubmissionError(f"Failed to store initial state for request {request_id} in database.")
         logger.info(f"Initial state stored successfully for request {request_id}.")
-    except Exception as db_err:
-        logger.error(f"Database error while storing initial state for request {request_id}: {db_err}", exc_info=True)
-        raise GenerationSubmissionError(f"Database error during submission: {db_err}")
+        if fingerprint:
+            # The row exists now: keep the fingerprint reusable for the full dedup TTL
+            await asyncio.to_thread(dedup_service.confirm, fingerprint, request_id)
+        return final_prompt
 
-
-    # --- 5. Send Task to Background Worker ---
-    logger.info(f"Sending generation task to queue for request {request_id}...")
-    try:
-        task_sent = task_queue_service.send_generation_task(
-            request_id=request_id,
-            user_id=user_id,
-            final_prompt=final_prompt,
-            reference_image_path=reference_image_path
-        )
+    # --- Stage: Send Task to Background Worker ---
+    async def dispatch(uploaded_path: Optional[str], final_prompt: str) -> None:
+        if reference_image_path and not uploaded_path:
+            # The row was written with the expected path before the upload failed
+            await supabase_client.update_generation_request(request_id, {'reference_image_path': None})
+        logger.info(f"Sending generation task to queue for request {request_id}...")
+        try:
+            # Broker I/O is blocking; keep it off the shared event loop
+            task = {'request_id': request_id, 'user_id': user_id, 'final_prompt': final_prompt,
+                    'reference_image_path': uploaded_path}
+            # Re-rolls (force_new) rank behind first attempts in the interactive queue
+            hint = scheduler_service.HINT_REGENERATE if force_new else scheduler_service.HINT_INTERACTIVE
+            task_sent = await asyncio.to_thread(scheduler_service.schedule_tasks, user_id, [task], hint)
+        except Exception as queue_err:
+            logger.error(f"Error sending task to queue for request {request_id}: {queue_err}", exc_info=True)
+            raise GenerationSubmissionError(f"Queue error during submission: {queue_err}")
         if not task_sent:
-            # If sending fails, attempt to mark the DB record as failed immediately
-            logger.error(f"Failed to send task to queue for request {request_id}. Attempting to mark as failed in DB.")
-            # Add a function in supabase_client to update status/error_message
-            # await supabase_client.update_request_status(request_id, 'failed', 'Failed to queue task')
+            logger.error(f"Failed to send task to queue for request {request_id}. Marking as failed in DB.")
+            await status_service.transition_status(request_id, 'failed', error_message='Failed to queue task')
             raise GenerationSubmissionError(f"Failed to send task to worker queue for request {request_id}.")
         logger.info(f"Generation task for request {request_id} sent to queue successfully.")
-    except Exception as queue_err:
-        logger.error(f"Error sending task to queue for request {request_id}: {queue_err}", exc_info=True)
-        # Attempt to mark as failed
-        # await supabase_client.update_request_status(request_id, 'failed', f'Failed to queue task: {queue_err}')
-        raise GenerationSubmissionError(f"Queue error during submission: {queue_err}")
-
-    # --- 6. Return Request ID on Success ---
-    return request_id
\ No newline at end of file
+
+    graph = _StageGraph(request_id)
+    graph.add('normalize', normalize)
+    graph.add('upload', upload, 'normalize')
+    graph.add('analyze', analyze, 'normalize')
+    graph.add('match_dna', match_dna, 'normalize')
+    graph.add('optimize', optimize, 'analyze', 'match_dna')
+    graph.add('store', store, 'optimize')
+    graph.add('dispatch', dispatch, 'upload', 'store')
+
+    started = time.perf_counter()
+    try:
+        await graph.run()
+    except BaseException:
+        if fingerprint:
+            await asyncio.to_thread(dedup_service.release, fingerprint, request_id)
+        raise
+    finally:
+        graph.timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+        g.submission_timings = graph.timings
+        logger.info(f"Submission stage timings (ms) for request {request_id}: {graph.timings}")
+
+    return Response(request_id=request_id)
+
+
+async def process_batch_submission(
+    user_id: str,
+    prompt: str,
+    variants: List[BatchVariant],
+    reference_image_file: Optional[FileStorage] = None,
+    analyze_image_flag: bool = False,
+    optimize_prompt_flag: bool = False,
+    reference_upload: Optional[Dict] = None,
+    llm_rewrite_flag: bool = False
+) -> BatchResponse:
+    """
+    Processes a batch of N variants sharing one base prompt and reference image:
+    the reference is uploaded and analyzed once, each distinct variant prompt is optimized
+    once, all rows are inserted with a single bulk call, and the jobs go to the bulk queue
+    under the group id batch_id (at most SCHEDULER_USER_INFLIGHT_CAP at a time per user).
+    The batch is no longer sent as one Celery group (send_generation_group): tasks held back
+    by the per-user cap are sent later by the scheduler, so each task is sent on its own with
+    group_id=batch_id as metadata only. There is no GroupResult for batch_id; track the batch
+    through its generation_requests rows.
+    Raises GenerationSubmissionError on failure, image_service.InvalidImageError for an unreadable reference.
+    """
+    batch_id = str(uuid.uuid4())
+    request_ids = [str(uuid.uuid4()) for _ in variants]
+    logger.info(f"Processing batch submission {batch_id} for user {user_id} with {len(variants)} variants.")
+
+    reference_image_path: Optional[str] = None
+    image_digest: Optional[str] = None
+    if reference_image_file and reference_image_file.filename:
+        image_digest = upload_digest(reference_image_file)
+        # One shared reference per batch: user_id/batch_id/reference.ext
+        reference_image_path = supabase_client.reference_image_path(
+            _stored_filename(reference_image_file.filename), user_id, batch_id
+        )
+    elif reference_upload:
+        image_digest = reference_upload['etag']
+        reference_image_path = reference_upload['path']
+
+    # --- Stage: Shared Reference Normalization ---
+    async def normalize() -> Tuple[Optional[FileStorage], Optional[bytes]]:
+        return await _prepare_reference(reference_image_file, analyze_image_flag)
+
+    # --- Stage: Shared Reference Upload ---
+    async def upload(reference: Tuple[Optional[FileStorage], Optional[bytes]]) -> Optional[str]:
+        if reference_upload:
+            return reference_upload['path']
+        return await _upload_reference(*reference, user_id, batch_id)
+
+    # --- Stage: Shared Image Analysis ---
+    async def analyze(reference: Tuple[Optional[FileStorage], Optional[bytes]]) -> Optional[str]:
+        if not analyze_image_flag:
+            return None
+        if reference_upload:
+            return await _describe_uploaded_reference(reference_upload, f"batch {batch_id}")
+        return await _describe_reference(*reference, image_digest, f"batch {batch_id}")
+
+    # --- Stage: Per-Variant Prompts (each distinct prompt optimized once, concurrently) ---
+    async def optimize(image_description: Optional[str]) -> List[str]:
+        variant_prompts = [_with_reference_detail(v.prompt or prompt, image_description) for v in variants]
+        if not optimize_prompt_flag and not llm_rewrite_flag:
+            return variant_prompts
+        distinct = list(dict.fromkeys(variant_prompts))
+        optimized = await asyncio.gather(*(
+            _refine_prompt(p, [], optimize_prompt_flag, llm_rewrite_flag, f"batch {batch_id}") for p in distinct
+        ))
+        lookup = dict(zip(distinct, optimized))
+        return [lookup[p] for p in variant_prompts]
+
+    # --- Stage: Bulk Insert ---
+    async def store(final_prompts: List[str]) -> List[str]:
+        rows = [
+            {'id': request_id, 'user_id': user_id, 'prompt': final_prompt,
+             'status': 'processing', 'reference_image_path': reference_image_path}
+            for request_id, final_prompt in zip(request_ids, final_prompts)
+        ]
+        if not await supabase_client.store_generation_requests(rows):
+            raise GenerationSubmissionError(f"Failed to store initial state for batch {batch_id} in database.")
+        return final_prompts
+
+    # --- Stage: Group Dispatch ---
+    async def dispatch(uploaded_path: Optional[str], final_prompts: List[str]) -> None:
+        if reference_image_path and not uploaded_path:
+            await supabase_client.update_generation_requests(request_ids, {'reference_image_path': None})
+        tasks = [
+            {'request_id': request_id, 'user_id': user_id, 'final_prompt': final_prompt,
+             'reference_image_path': uploaded_path, 'seed': variant.seed}
+            for request_id, final_prompt, variant in zip(request_ids, final_prompts, variants)
+        ]
+        if not await asyncio.to_thread(scheduler_service.schedule_tasks, user_id, tasks,
+                                       scheduler_service.HINT_BULK, batch_id):
+            await asyncio.gather(*(
+                status_service.transition_status(request_id, 'failed', error_message='Failed to queue task')
+                for request_id in request_ids
+            ))
+            raise GenerationSubmissionError(f"Failed to send batch {batch_id} to worker queue.")
+
+    graph = _StageGraph(batch_id)
+    graph.add('normalize', normalize)
+    graph.add('upload', upload, 'normalize')
+    graph.add('analyze', analyze, 'normalize')
+    graph.add('optimize', optimize, 'analyze')
+    graph.add('store', store, 'optimize')
+    graph.add('dispatch', dispatch, 'upload', 'store')
+
+    started = time.perf_counter()
+    try:
+        await graph.run()
+    finally:
+        graph.timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+        g.submission_timings = graph.timings
+        logger.info(f"Batch stage timings (ms) for {batch_id}: {graph.timings}")
+
+    return BatchResponse(batch_id=batch_id, request_ids=request_ids)
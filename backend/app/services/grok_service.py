@@ -1,33 +1,197 @@
-import requests
+import re
+import atexit
+import base64
+import hashlib
+import asyncio
+import random
 import logging
+import threading
+import unicodedata
+import httpx
 from flask import current_app
-from typing import Optional
+from typing import Optional, Dict, Any
+
+from app.db.redis_client import get_redis
+from app.utils.background_loop import run_in_background_loop, run_coroutine_sync
+from app.utils.cache import TieredCache, make_key
 
 logger = logging.getLogger(__name__)
 
-# Replace with actual Grok API interaction logic
+# Status codes worth retrying: rate limiting and transient upstream failures
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Shared async client and concurrency limit. Both live on the background loop,
+# so every request in the process reuses the same connection pool.
+_client: Optional[httpx.AsyncClient] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_in_flight = 0
+
+# Result caches for paid Grok calls, keyed by content hash + endpoint/model version
+_caches: Dict[str, TieredCache] = {}
+_caches_lock = threading.Lock()
+
+
+def _grok_settings() -> Dict[str, Any]:
+    """Snapshots Grok settings from the app config (the background loop has no app context)."""
+    config = current_app.config
+    return {
+        "api_key": config['GROK_API_KEY'],
+        "connect_timeout": config['GROK_CONNECT_TIMEOUT'],
+        "max_connections": config['GROK_POOL_MAX_CONNECTIONS'],
+        "max_concurrency": config['GROK_MAX_CONCURRENCY'],
+        "max_retries": config['GROK_MAX_RETRIES'],
+        "backoff_base": config['GROK_BACKOFF_BASE'],
+        "backoff_max": config['GROK_BACKOFF_MAX'],
+    }
+
+
+def _get_client(settings: Dict[str, Any]) -> httpx.AsyncClient:
+    """Creates the shared client on first use (runs on the background loop)."""
+    global _client, _semaphore
+    if _client is None:
+        _client = httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {settings['api_key']}", "Content-Type": "application/json"},
+            limits=httpx.Limits(
+                max_connections=settings['max_connections'],
+                max_keepalive_connections=settings['max_connections'],
+            ),
+            http2=True,
+        )
+        _semaphore = asyncio.Semaphore(settings['max_concurrency'])
+        logger.info(f"Grok HTTP client created (max_connections={settings['max_connections']}, "
+                    f"max_concurrency={settings['max_concurrency']}).")
+    return _client
+
+
+def _backoff_delay(attempt: int, settings: Dict[str, Any], response: Optional[httpx.Response] = None) -> float:
+    """Full-jitter exponential backoff, honouring a numeric Retry-After header."""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), settings['backoff_max'])
+    return random.uniform(0, min(settings['backoff_max'], settings['backoff_base'] * (2 ** attempt)))
+
+
+async def _post_json(endpoint: str, payload: Dict[str, Any], read_timeout: float, settings: Dict[str, Any]) -> Dict[str, Any]:
+    """POSTs to a Grok endpoint with pooling, a concurrency cap and retries on 429/5xx."""
+    global _in_flight
+    client = _get_client(settings)
+    timeout = httpx.Timeout(read_timeout, connect=settings['connect_timeout'])
+
+    for attempt in range(settings['max_retries'] + 1):
+        response = None
+        async with _semaphore:
+            _in_flight += 1
+            try:
+                response = await client.post(endpoint, json=payload, timeout=timeout)
+            except httpx.TransportError as e:
+                if attempt == settings['max_retries']:
+                    raise
+                logger.warning(f"Grok request to {endpoint} failed ({e!r}), retrying (attempt {attempt + 1}).")
+            finally:
+                _in_flight -= 1
+
+        if response is not None:
+            if response.status_code not in RETRYABLE_STATUS_CODES or attempt == settings['max_retries']:
+                response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
+                return response.json()
+            logger.warning(f"Grok returned {response.status_code} for {endpoint}, retrying (attempt {attempt + 1}).")
+
+        # Back off outside the semaphore so waiting retries don't hold a slot
+        await asyncio.sleep(_backoff_delay(attempt, settings, response))
+
+
+async def _close_client():
+    global _client, _semaphore
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        _semaphore = None
+        logger.info("Grok HTTP client closed.")
+
 
-async def analyze_image_with_grok(image_url: str) -> Optional[str]:
-    """Calls Grok Vision API to get image description."""
-    api_key = current_app.config['GROK_API_KEY']
+def close_grok_client():
+    """Closes the shared Grok client (called on process shutdown)."""
+    if _client is not None:
+        try:
+            run_coroutine_sync(_close_client(), timeout=5)
+        except Exception as e:
+            logger.warning(f"Error closing Grok HTTP client: {e}")
+
+
+def init_grok(app):
+    """Registers shutdown of the shared Grok client (called in app factory)."""
+    atexit.register(close_grok_client)
+    logger.info("Grok client setup registered.")
+
+
+def _get_cache(kind: str) -> Optional[TieredCache]:
+    """Returns the result cache for 'vision' or 'llm', or None if caching is disabled."""
+    config = current_app.config
+    if not config['GROK_CACHE_ENABLED']:
+        return None
+    if kind not in _caches:
+        with _caches_lock:
+            if kind not in _caches:
+                _caches[kind] = TieredCache(
+                    f"grok-{kind}",
+                    maxsize=config['GROK_CACHE_MAXSIZE'],
+                    ttl=config['GROK_CACHE_TTL'],
+                    redis_ttl=config['GROK_CACHE_REDIS_TTL'],
+                    redis_getter=get_redis,
+                )
+    return _caches[kind]
+
+
+def _cache_key(endpoint: str, content) -> str:
+    """Keys an entry by endpoint, model/cache version and content, so upgrades invalidate old results."""
+    return make_key(endpoint, current_app.config['GROK_CACHE_VERSION'], content)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalizes a prompt for hashing: Unicode NFC, trimmed, inner whitespace collapsed."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", prompt)).strip()
+
+
+def get_grok_stats() -> Dict[str, int]:
+    """Returns current Grok concurrency usage for this process."""
+    return {"in_flight": _in_flight, "max_concurrency": current_app.config['GROK_MAX_CONCURRENCY']}
+
+
+async def analyze_image_with_grok(image_url: Optional[str] = None, image_bytes: Optional[bytes] = None,
+                                  content_type: str = "image/png", image_digest: Optional[str] = None) -> Optional[str]:
+    """
+    Calls Grok Vision API to get image description, from a URL or from raw image bytes.
+    Pass image_digest (SHA-256 of the bytes) if already known to skip re-hashing for the cache key.
+    """
     endpoint = current_app.config['GROK_VISION_ENDPOINT']
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-    payload = {"image_url": image_url} # Or image bytes, depending on API
+    if image_bytes is not None:
+        # Inline the image as a data URL so analysis doesn't wait for the storage upload
+        image_url = f"data:{content_type};base64,{base64.b64encode(image_bytes).decode('ascii')}"
+    payload = {"image_url": image_url}
+
+    cache = _get_cache('vision')
+    # Key by the image content when we have it, so re-uploads of the same file hit
+    if image_bytes is not None and image_digest is None:
+        image_digest = hashlib.sha256(image_bytes).hexdigest()
+    cache_key = _cache_key(endpoint, image_digest or image_url)
+    if cache is not None:
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            logger.info("Grok Vision result served from cache.")
+            return cached
 
     try:
-        logger.info(f"Calling Grok Vision: {endpoint} for image: {image_url}")
-        response = await requests.post(endpoint, headers=headers, json=payload) # Use an async HTTP client like httpx or aiohttp
-        # Using synchronous requests here for simplicity, replace with async equivalent
-        # import httpx
-        # async with httpx.AsyncClient() as client:
-        #     response = await client.post(endpoint, headers=headers, json=payload)
-
-        response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
-        result = response.json()
+        logger.info(f"Calling Grok Vision: {endpoint} for image: {image_url[:80]}")
+        result = await run_in_background_loop(
+            _post_json(endpoint, payload, current_app.config['GROK_VISION_TIMEOUT'], _grok_settings())
+        )
         description = result.get("description") # Adjust based on actual API response
         logger.info(f"Grok Vision result: {description}")
+        if description and cache is not None:
+            await cache.aset(cache_key, description)
         return description
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Error calling Grok Vision API: {e}", exc_info=True)
         return None
     except Exception as e:
@@ -37,23 +201,30 @@ async def analyze_image_with_grok(image_url: str) -> Optional[str]:
 
 async def optimize_prompt_with_grok(original_prompt: str) -> Optional[str]:
     """Calls Grok LLM API to optimize the prompt."""
-    api_key = current_app.config['GROK_API_KEY']
     endpoint = current_app.config['GROK_LLM_ENDPOINT']
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
     payload = {"prompt": original_prompt}
 
+    cache = _get_cache('llm')
+    cache_key = _cache_key(endpoint, normalize_prompt(original_prompt))
+    if cache is not None:
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            logger.info("Grok LLM optimized prompt served from cache.")
+            return cached
+
     try:
         logger.info(f"Calling Grok LLM: {endpoint} for prompt: '{original_prompt}'")
-        # Replace with async HTTP client call
-        response = await requests.post(endpoint, headers=headers, json=payload)
-        response.raise_for_status()
-        result = response.json()
+        result = await run_in_background_loop(
+            _post_json(endpoint, payload, current_app.config['GROK_LLM_TIMEOUT'], _grok_settings())
+        )
         optimized_prompt = result.get("optimized_prompt") # Adjust based on actual API response
         logger.info(f"Grok LLM optimized prompt: {optimized_prompt}")
+        if optimized_prompt and cache is not None:
+            await cache.aset(cache_key, optimized_prompt) # Only cache real results, never the fallback
         return optimized_prompt if optimized_prompt else original_prompt # Return original if optimization fails/is empty
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Error calling Grok LLM API: {e}", exc_info=True)
         return original_prompt # Return original on error
     except Exception as e:
         logger.error(f"Error processing Grok LLM response: {e}", exc_info=True)
-        return original_prompt # Return original on error
\ No newline at end of file
+        return original_prompt # Return original on error
@@ -0,0 +1,193 @@
+# backend/app/services/image_service.py
+
+import io
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+from flask import current_app
+from werkzeug.datastructures import FileStorage
+
+from app.db import supabase_client
+from app.utils import blurhash
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg"}
+EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+
+
+class InvalidImageError(Exception):
+    """Raised when an uploaded reference image cannot be decoded."""
+    pass
+
+
+# Pillow releases the GIL while decoding, resizing and encoding, so a thread pool
+# gives real parallelism without pickling image bytes to a process pool.
+# Shared by reference normalization and result derivatives.
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_pid: Optional[int] = None
+_executor_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {"normalized": 0, "failed": 0, "bytes_in": 0, "bytes_out": 0, "total_ms": 0.0, "derivatives": 0}
+
+
+def _get_executor(max_workers: int) -> ThreadPoolExecutor:
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image")
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def normalization_enabled() -> bool:
+    return current_app.config['IMAGE_NORMALIZE_ENABLED']
+
+
+def normalized_filename(filename: str) -> str:
+    """Filename the normalized image is stored under (same stem, target format's extension)."""
+    stem = filename.rsplit('.', 1)[0] if '.' in filename else filename
+    return f"{stem}.{EXTENSIONS[current_app.config['IMAGE_NORMALIZE_FORMAT']]}"
+
+
+def _normalize(source: IO[bytes], max_edge: int, image_format: str, quality: int) -> Tuple[bytes, int, int]:
+    """Applies EXIF orientation, downscales to max_edge, drops metadata and re-encodes (runs in the pool)."""
+    with Image.open(source) as original:
+        if original.format == "JPEG":
+            original.draft("RGB", (max_edge, max_edge)) # Let libjpeg decode at a reduced scale
+        image = ImageOps.exif_transpose(original)
+        icc_profile = original.info.get("icc_profile") # Only colour profile is kept
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+        if image_format == "JPEG" and has_alpha:
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, "white")
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if has_alpha else "RGB")
+
+        output = io.BytesIO()
+        save_options = {"quality": quality, "exif": b""}
+        if icc_profile:
+            save_options["icc_profile"] = icc_profile
+        if image_format == "JPEG":
+            save_options.update(optimize=True, progressive=True)
+        image.save(output, format=image_format, **save_options)
+        return output.getvalue(), image.width, image.height
+
+
+async def normalize_reference(file_storage: FileStorage) -> FileStorage:
+    """
+    Returns the reference image orientation-corrected, downscaled to IMAGE_NORMALIZE_MAX_EDGE,
+    stripped of metadata and re-encoded as IMAGE_NORMALIZE_FORMAT, as an in-memory FileStorage.
+    Raises InvalidImageError if the upload is not a decodable image.
+    """
+    config = current_app.config
+    image_format = config['IMAGE_NORMALIZE_FORMAT']
+    stream = file_storage.stream
+    stream.seek(0, io.SEEK_END)
+    size_in = stream.tell()
+    stream.seek(0)
+
+    started = time.perf_counter()
+    try:
+        data, width, height = await asyncio.get_running_loop().run_in_executor(
+            _get_executor(config['IMAGE_NORMALIZE_WORKERS']),
+            _normalize, stream, config['IMAGE_NORMALIZE_MAX_EDGE'], image_format, config['IMAGE_NORMALIZE_QUALITY']
+        )
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError) as e:
+        with _stats_lock:
+            _stats["failed"] += 1
+        logger.warning(f"Could not normalize reference image {file_storage.filename}: {e}")
+        raise InvalidImageError("Reference image is not a readable image file.")
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    with _stats_lock:
+        _stats["normalized"] += 1
+        _stats["bytes_in"] += size_in
+        _stats["bytes_out"] += len(data)
+        _stats["total_ms"] += elapsed_ms
+    logger.info(f"Normalized reference image {file_storage.filename}: {size_in} -> {len(data)} bytes "
+                f"({width}x{height} {image_format}) in {elapsed_ms:.1f} ms")
+
+    return FileStorage(
+        stream=io.BytesIO(data),
+        filename=normalized_filename(file_storage.filename),
+        content_type=CONTENT_TYPES[image_format]
+    )
+
+
+def _render_derivatives(data: bytes, widths: List[int], quality: int) -> Tuple[Dict[int, bytes], str]:
+    """Encodes a WebP per width (never upscaled) and the BlurHash of a result image (runs in the pool)."""
+    with Image.open(io.BytesIO(data)) as original:
+        original.load()
+        thumbnails: Dict[int, bytes] = {}
+        for width in sorted(set(widths)):
+            if width >= original.width and thumbnails:
+                break # Larger sizes would only upscale
+            resized = original.copy()
+            resized.thumbnail((width, original.height), Image.Resampling.LANCZOS)
+            if resized.mode not in ("RGB", "RGBA"):
+                resized = resized.convert("RGBA" if "A" in resized.getbands() else "RGB")
+            output = io.BytesIO()
+            resized.save(output, format="WEBP", quality=quality)
+            thumbnails[width] = output.getvalue()
+        return thumbnails, blurhash.encode(original)
+
+
+async def create_result_derivatives(request_id: str, image_bytes: bytes) -> Optional[Dict]:
+    """
+    Produces WebP thumbnails (DERIVATIVE_WIDTHS) and a BlurHash for a result and uploads them
+    next to it. Called before the request is marked succeeded: the returned fields ('thumbnails',
+    'blurhash') go into that same transition, so the first status anyone caches or receives
+    already has them. Returns None if disabled or failed.
+    """
+    config = current_app.config
+    if not config['DERIVATIVES_ENABLED']:
+        return None
+
+    started = time.perf_counter()
+    try:
+        thumbnails, placeholder = await asyncio.get_running_loop().run_in_executor(
+            _get_executor(config['IMAGE_NORMALIZE_WORKERS']),
+            _render_derivatives, image_bytes, config['DERIVATIVE_WIDTHS'], config['DERIVATIVE_QUALITY']
+        )
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError) as e:
+        logger.error(f"Could not render derivatives for request {request_id}: {e}", exc_info=True)
+        return None
+
+    uploads = [
+        supabase_client.upload_generated_image(supabase_client.derivative_image_path(request_id, width), data, "image/webp")
+        for width, data in thumbnails.items()
+    ]
+    urls = await asyncio.gather(*uploads)
+    fields = {
+        "thumbnails": {str(width): url for width, url in zip(thumbnails, urls) if url},
+        "blurhash": placeholder,
+    }
+
+    with _stats_lock:
+        _stats["derivatives"] += 1
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    derivative_bytes = sum(len(data) for data in thumbnails.values())
+    logger.info(f"Derivatives for request {request_id}: {len(image_bytes)} byte result -> "
+                f"{len(thumbnails)} thumbnails ({derivative_bytes} bytes) in {elapsed_ms:.1f} ms")
+    return fields
+
+
+def get_image_stats() -> Dict[str, float]:
+    """Before/after size counters of the normalization pipeline and derivative count (see GET /api/health/details)."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["total_ms"] = round(stats["total_ms"], 1)
+    stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+    return stats
@@ -0,0 +1,114 @@
+# backend/app/services/notification_service.py
+
+import json
+import time
+import logging
+import threading
+from typing import Dict, Iterator, List, Optional
+
+import redis
+
+from app.db.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Statuses after which a request never changes again
+TERMINAL_STATUSES = ('succeeded', 'failed')
+
+# Open event streams in this process. Each one holds a server thread (and a Redis pub/sub
+# connection) until it ends, so the count is capped below ASGI_WORKER_THREADS.
+_open_streams = 0
+_streams_lock = threading.Lock()
+
+
+def status_channel(request_id: str) -> str:
+    """Redis pub/sub channel carrying state changes of one generation request."""
+    return f"generation:status:{request_id}"
+
+
+def publish_status(status: Dict, client: Optional[redis.Redis] = None) -> bool:
+    """
+    Publishes a status change ({request_id, status, result_url, error_message}) to its channel.
+    Workers pass their own Redis client; inside the app the shared client is used.
+    """
+    try:
+        (client or get_redis()).publish(status_channel(status['request_id']), json.dumps(status))
+        return True
+    except redis.RedisError as e:
+        logger.warning(f"Could not publish status for request {status.get('request_id')}: {e}")
+        return False
+
+
+def subscribe(request_ids: List[str]) -> redis.client.PubSub:
+    """Subscribes to the status channels of the given requests (raises redis.RedisError if Redis is down)."""
+    pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(*(status_channel(request_id) for request_id in request_ids))
+    return pubsub
+
+
+def try_open_stream(limit: int) -> bool:
+    """Takes one of this process's `limit` event stream slots; False if all are in use."""
+    global _open_streams
+    with _streams_lock:
+        if _open_streams >= limit:
+            return False
+        _open_streams += 1
+        return True
+
+
+def close_stream():
+    """Returns a slot taken by try_open_stream (once the response is closed)."""
+    global _open_streams
+    with _streams_lock:
+        _open_streams = max(0, _open_streams - 1)
+
+
+def open_stream_count() -> int:
+    return _open_streams
+
+
+def _sse_event(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def status_event_stream(pubsub: redis.client.PubSub, current: Dict[str, Dict], missing: List[str],
+                        keepalive_seconds: float, max_seconds: float) -> Iterator[str]:
+    """
+    Yields Server-Sent Events: the current status of every request, then each transition
+    published by the worker, until all requests are terminal or max_seconds elapses.
+    The caller must subscribe before reading `current`, and read it from the database (not the
+    status cache), so no transition is lost in between; terminal rows in `current` are sent first.
+    """
+    try:
+        pending = set()
+        for request_id, status in current.items():
+            yield _sse_event('status', status)
+            if status['status'] not in TERMINAL_STATUSES:
+                pending.add(request_id)
+        if missing:
+            yield _sse_event('missing', {'request_ids': missing})
+
+        deadline = time.monotonic() + max_seconds
+        last_sent = time.monotonic()
+        while pending and time.monotonic() < deadline:
+            message = pubsub.get_message(timeout=1.0)
+            if message is None:
+                if time.monotonic() - last_sent >= keepalive_seconds:
+                    yield ": keepalive\n\n" # Comment line keeps proxies from closing the idle stream
+                    last_sent = time.monotonic()
+                continue
+            status = json.loads(message['data'])
+            if status.get('request_id') not in pending:
+                continue
+            yield _sse_event('status', status)
+            last_sent = time.monotonic()
+            if status['status'] in TERMINAL_STATUSES:
+                pending.discard(status['request_id'])
+
+        # 'end' tells the client to stop; 'timeout' means it should reconnect for the rest
+        yield _sse_event('end' if not pending else 'timeout', {'pending': sorted(pending)})
+    except redis.RedisError as e:
+        logger.warning(f"Status event stream interrupted: {e}")
+        yield _sse_event('timeout', {'pending': sorted(pending)})
+    finally:
+        pubsub.close()
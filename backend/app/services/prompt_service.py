@@ -0,0 +1,296 @@
+# backend/app/services/prompt_service.py
+
+import re
+import logging
+import threading
+from collections import Counter, deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from flask import current_app
+
+from app.services import dna_service
+
+logger = logging.getLogger(__name__)
+
+# Free-text aliases (English and Chinese) of the DNA table's facet values; the values themselves,
+# every keyword phrase and every product name are added from the catalog when it is compiled
+STYLE_ALIASES = {
+    'Minimalist': ('minimal', 'minimalism', 'clean', 'simple', 'sleek', 'understated', '極簡', '簡約', '低調'),
+    'Gaming': ('gamer', 'esports', 'e-sports', '電競', '遊戲'),
+    'Futuristic': ('sci-fi', 'scifi', 'cyberpunk', 'space age', '未來', '科幻'),
+    'Industrial': ('raw metal', 'rugged', '工業'),
+    'High Airflow': ('airflow', 'ventilated', 'breathable', 'cooling', '散熱', '通風', '高風流'),
+}
+COLOR_ALIASES = {
+    'Black': ('dark', 'matte black', 'stealth', '黑'),
+    'White': ('snow white', 'pure white', '白'),
+    'Silver': ('aluminum', 'aluminium', 'brushed metal', '銀'),
+    'Gunmetal': ('gun metal', 'graphite', 'titanium', '鐵灰', '槍灰'),
+}
+LIGHTING_ALIASES = ('rgb', 'argb', 'led', 'leds', 'lighting', 'glow', 'glowing', 'neon', 'rainbow', '燈效', '發光', 'rgb燈')
+NO_LIGHTING_ALIASES = ('no rgb', 'no lighting', 'without rgb', 'without lighting', 'non-rgb', 'unlit', '無燈', '不發光')
+
+LIGHTING_TOKENS = {'rgb', 'argb', 'light', 'lighting', 'lightbar', 'led', 'lcd'}
+
+# Template weights: the user's own words outrank what the engine infers
+WEIGHT_EXPLICIT = 1.3      # Styles named in the prompt
+WEIGHT_CASE = 1.2          # DNA of a product named in the prompt
+WEIGHT_IMAGE = 1.15        # DNA of products matching the reference image
+WEIGHT_VOCABULARY = 1.1    # Phrases typical of a requested style / of lit cases
+
+BRAND_SUFFIX = "Cooler Master design language, studio product photography, high detail"
+
+_BOUNDARY_RE = re.compile(r"[0-9a-z]")
+
+
+class Feature(NamedTuple):
+    kind: str    # 'style', 'color', 'lighting', 'keyword' or 'case'
+    value: object
+
+
+class PromptPlan(NamedTuple):
+    """Result of build_prompt: the prompt and what it was built from."""
+    prompt: str
+    styles: List[str]
+    colors: List[str]
+    lighting: Optional[bool]
+    cases: List[str]
+    terms: List[Tuple[str, float]]
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton: finds every occurrence of all patterns in one pass over the text,
+    however many patterns there are. Patterns and text are normalized; patterns starting or
+    ending in an ASCII letter/digit only match at word boundaries, so 'led' never hits 'paneled'.
+    """
+
+    def __init__(self, patterns: Dict[str, List[Feature]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        self.patterns: List[Tuple[str, List[Feature]]] = list(patterns.items())
+
+        for pattern_id, (pattern, _) in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._out[state].append(pattern_id)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def _at_boundary(self, text: str, start: int, end: int, pattern: str) -> bool:
+        if _BOUNDARY_RE.match(pattern[0]) and start > 0 and _BOUNDARY_RE.match(text[start - 1]):
+            return False
+        if _BOUNDARY_RE.match(pattern[-1]) and end < len(text) and _BOUNDARY_RE.match(text[end]):
+            return False
+        return True
+
+    def find(self, text: str) -> List[Tuple[int, int, int]]:
+        """All (start, end, pattern id) occurrences, at word boundaries where required."""
+        text = dna_service.normalize(text)
+        matches = []
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for pattern_id in self._out[state]:
+                pattern = self.patterns[pattern_id][0]
+                start = position - len(pattern) + 1
+                if self._at_boundary(text, start, position + 1, pattern):
+                    matches.append((start, position + 1, pattern_id))
+        return matches
+
+    def find_longest(self, text: str) -> List[Tuple[int, int, int]]:
+        """Leftmost-longest, non-overlapping occurrences (so 'no rgb' wins over 'rgb')."""
+        selected, covered_until = [], 0
+        for start, end, pattern_id in sorted(self.find(text), key=lambda m: (m[0], m[0] - m[1])):
+            if start >= covered_until:
+                selected.append((start, end, pattern_id))
+                covered_until = end
+        return selected
+
+
+class PromptEngine:
+    """Brand vocabulary compiled from one DNA catalog snapshot."""
+
+    def __init__(self, catalog: dna_service.DnaCatalog):
+        self.catalog = catalog
+        patterns: Dict[str, List[Feature]] = {}
+
+        def add(alias: str, feature: Feature):
+            key = dna_service.normalize(alias)
+            if key and feature not in patterns.setdefault(key, []):
+                patterns[key].append(feature)
+
+        for style, aliases in STYLE_ALIASES.items():
+            for alias in aliases:
+                add(alias, Feature('style', style))
+        for color, aliases in COLOR_ALIASES.items():
+            for alias in aliases:
+                add(alias, Feature('color', color))
+        for alias in LIGHTING_ALIASES:
+            add(alias, Feature('lighting', True))
+        for alias in NO_LIGHTING_ALIASES:
+            add(alias, Feature('lighting', False))
+
+        # Per case: its DNA, and per style / for lit cases the phrases used by most cases
+        self.case_dna: Dict[str, Tuple[List[str], List[str], bool, List[str]]] = {}
+        style_phrases: Dict[str, Counter] = {}
+        lighting_phrases: Counter = Counter()
+        phrase_labels: Dict[str, str] = {}
+        for case_id in catalog.cases:
+            images = catalog.case(case_id)
+            styles = list(dict.fromkeys(s for image in images for s in image.styles))
+            colors = list(dict.fromkeys(c for image in images for c in image.colors))
+            lighting = any(image.lighting for image in images)
+            phrases = list(dict.fromkeys(k for image in images for k in image.keywords))
+            self.case_dna[case_id] = (styles, colors, lighting, phrases)
+
+            keys = list(dict.fromkeys(dna_service.normalize(phrase) for phrase in phrases))
+            for phrase in phrases:
+                add(phrase, Feature('keyword', phrase))
+                phrase_labels.setdefault(dna_service.normalize(phrase), phrase)
+            for style in styles:
+                add(style, Feature('style', style))
+                style_phrases.setdefault(style, Counter()).update(keys) # Counted once per case
+            for color in colors:
+                add(color, Feature('color', color))
+            if lighting:
+                lighting_phrases.update(key for key in keys if LIGHTING_TOKENS & set(dna_service.tokenize(key)))
+            for alias in self._case_aliases(images):
+                add(alias, Feature('case', case_id))
+
+        # Ties keep table order (Counter.most_common is stable), so prompts are deterministic
+        self.style_vocabulary = {style: [phrase_labels[key] for key, _ in counts.most_common()]
+                                 for style, counts in style_phrases.items()}
+        self.lighting_vocabulary = [phrase_labels[key] for key, _ in lighting_phrases.most_common()]
+        self.matcher = KeywordMatcher(patterns)
+
+    @staticmethod
+    def _case_aliases(images: List[dna_service.DnaImage]) -> Set[str]:
+        """Product name and image folder (plus the folder's model number, e.g. 'HAF500' for 'HAF500中直立式機殼')."""
+        aliases = {images[0].name}
+        for image in images:
+            if image.local_path:
+                folder = image.local_path.split('/')[0]
+                aliases.add(folder)
+                model = re.match(r"[\x20-\x7e]+", folder)
+                if model and re.search(r"\d", model.group()) and len(model.group().strip()) >= 4:
+                    aliases.add(model.group().strip())
+        return aliases
+
+    def extract(self, text: str) -> List[Feature]:
+        """Features named in the text, in order of appearance."""
+        return [feature for _, _, pattern_id in self.matcher.find_longest(text)
+                for feature in self.matcher.patterns[pattern_id][1]]
+
+    def build(self, prompt: str, dna_keywords: Iterable[str] = (), max_terms: int = 10,
+              terms_per_style: int = 3, emphasis: bool = True) -> PromptPlan:
+        """Expands the features named in the prompt (and the DNA keywords of matching images) into a weighted prompt."""
+        styles: Dict[str, None] = {}
+        colors: Dict[str, None] = {}
+        lighting: Optional[bool] = None
+        cases: Dict[str, None] = {}
+        weights: Dict[str, float] = {}
+        labels: Dict[str, str] = {}
+        mentioned: Set[str] = set() # Phrases already in the prompt are not repeated
+
+        def weigh(phrase: str, weight: float):
+            key = dna_service.normalize(phrase)
+            if key not in mentioned and weights.get(key, 0) < weight:
+                weights[key] = weight
+                labels.setdefault(key, phrase)
+
+        for feature in self.extract(prompt):
+            if feature.kind == 'style':
+                styles[feature.value] = None
+            elif feature.kind == 'color':
+                colors[feature.value] = None
+            elif feature.kind == 'lighting':
+                lighting = feature.value if lighting is None else lighting and feature.value
+            elif feature.kind == 'keyword':
+                mentioned.add(dna_service.normalize(feature.value))
+            elif feature.kind == 'case':
+                cases[feature.value] = None
+
+        for case_id in cases:
+            case_styles, case_colors, case_lighting, phrases = self.case_dna[case_id]
+            for style in case_styles:
+                styles.setdefault(style, None)
+            if not colors:
+                colors.update(dict.fromkeys(case_colors))
+            if lighting is None:
+                lighting = case_lighting
+            for phrase in phrases:
+                weigh(phrase, WEIGHT_CASE)
+        for phrase in dna_keywords:
+            weigh(phrase, WEIGHT_IMAGE)
+        for style in styles:
+            for phrase in self.style_vocabulary.get(style, [])[:terms_per_style]:
+                weigh(phrase, WEIGHT_VOCABULARY)
+        if lighting:
+            for phrase in self.lighting_vocabulary[:2]:
+                weigh(phrase, WEIGHT_VOCABULARY)
+
+        ranked = sorted(weights.items(), key=lambda item: -item[1]) # Stable: ties keep insertion order
+        terms = []
+        for key, weight in ranked:
+            if lighting is False and LIGHTING_TOKENS & set(dna_service.tokenize(key)):
+                continue # Don't add lighting the user ruled out
+            terms.append((labels[key], weight))
+            if len(terms) >= max_terms:
+                break
+
+        def render(term: str, weight: float) -> str:
+            return f"({term}:{weight:g})" if emphasis and weight != 1.0 else term
+
+        parts = [prompt.strip()]
+        if styles:
+            parts.append(render(f"{', '.join(s.lower() for s in styles)} PC case", WEIGHT_EXPLICIT))
+        if colors:
+            parts.append(f"{' and '.join(c.lower() for c in colors)} colorway")
+        if lighting is not None:
+            parts.append("ARGB lighting" if lighting else "no RGB lighting")
+        parts.extend(render(term, weight) for term, weight in terms)
+        parts.append(BRAND_SUFFIX)
+        return PromptPlan(', '.join(p for p in parts if p), list(styles), list(colors), lighting, list(cases), terms)
+
+
+# --- Process-wide engine (recompiled whenever the catalog is reloaded) ---
+_engine: Optional[PromptEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> PromptEngine:
+    global _engine
+    catalog = dna_service.get_catalog()
+    if _engine is None or _engine.catalog is not catalog:
+        with _engine_lock:
+            if _engine is None or _engine.catalog is not catalog:
+                _engine = PromptEngine(catalog)
+                logger.info(f"Compiled prompt engine over {len(_engine.matcher.patterns)} DNA patterns.")
+    return _engine
+
+
+def build_prompt(prompt: str, dna_keywords: Iterable[str] = ()) -> PromptPlan:
+    """Builds the generation prompt locally from the DNA vocabulary (see PromptEngine.build)."""
+    config = current_app.config
+    return get_engine().build(prompt, dna_keywords, max_terms=config['PROMPT_ENGINE_MAX_TERMS'],
+                              terms_per_style=config['PROMPT_ENGINE_TERMS_PER_STYLE'],
+                              emphasis=config['PROMPT_ENGINE_EMPHASIS'])
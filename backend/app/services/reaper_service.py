@@ -0,0 +1,135 @@
+# backend/app/services/reaper_service.py
+
+import json
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Set
+
+import redis
+from flask import current_app
+
+from app import celery_app
+from app.db import supabase_client
+from app.db.redis_client import get_redis
+from app.services import scheduler_service, status_service
+from app.utils.background_loop import run_coroutine_in_context
+
+logger = logging.getLogger(__name__)
+
+CURSOR_KEY = "reaper:cursor"
+LOCK_KEY = "reaper:lock"
+LAST_RUN_KEY = "reaper:last-run"
+TIMEOUT_MESSAGE = "Generation timed out"
+
+
+def _requeue_key(request_id: str) -> str:
+    return f"reaper:requeues:{request_id}"
+
+
+def _load_cursor(client: redis.Redis) -> Optional[tuple]:
+    raw = client.get(CURSOR_KEY)
+    return tuple(json.loads(raw)) if raw else None
+
+
+def _worker_task_ids() -> Optional[Set[str]]:
+    """Ids of tasks running on or reserved by a worker (blocking broadcast); None if no worker answered."""
+    inspect = celery_app.control.inspect(timeout=current_app.config['REAPER_INSPECT_TIMEOUT'])
+    task_ids: Set[str] = set()
+    answered = False
+    for reply in (inspect.active(), inspect.reserved()):
+        for tasks in (reply or {}).values():
+            answered = True
+            task_ids.update(task['id'] for task in tasks)
+    return task_ids if answered else None
+
+
+async def _reconcile(row: Dict, worker_task_ids: Set[str], client: redis.Redis) -> str:
+    """Decides one stale row: 'alive' (touched to be re-checked later), 'requeued' or 'failed'."""
+    request_id, user_id = row['id'], row['user_id']
+    if request_id in worker_task_ids or scheduler_service.is_scheduled(user_id, request_id, client):
+        await supabase_client.update_generation_request(request_id, {}) # Moves updated_at past the cursor
+        return 'alive'
+
+    requeues = client.incr(_requeue_key(request_id))
+    client.expire(_requeue_key(request_id), current_app.config['REAPER_STUCK_AFTER'] * 10)
+    if requeues <= current_app.config['REAPER_MAX_REQUEUES']:
+        task = {'request_id': request_id, 'user_id': user_id, 'final_prompt': row['prompt'],
+                'reference_image_path': row.get('reference_image_path')}
+        if await asyncio.to_thread(scheduler_service.schedule_tasks, user_id, [task], scheduler_service.HINT_REGENERATE):
+            await supabase_client.update_generation_request(request_id, {})
+            logger.info(f"Re-enqueued orphaned request {request_id} (attempt {requeues}).")
+            return 'requeued'
+
+    outcome, current = await status_service.transition_status(request_id, 'failed', error_message=TIMEOUT_MESSAGE)
+    scheduler_service.task_finished(user_id, request_id, client)
+    if outcome != status_service.APPLIED:
+        return 'alive' # Finished while we were looking
+    logger.warning(f"Marked orphaned request {request_id} as failed after {requeues - 1} re-enqueue(s).")
+    return 'failed'
+
+
+async def reconcile_stuck_requests() -> Optional[Dict[str, int]]:
+    """
+    Finds 'processing' requests that have not changed for REAPER_STUCK_AFTER seconds, e.g.
+    because the broker send failed after the row was stored or a worker died mid-task.
+    Requests a worker is running or holding, or that still own a scheduler slot/backlog entry,
+    are left alone; the others are re-enqueued up to REAPER_MAX_REQUEUES times, then failed
+    (which notifies pollers and frees the user's scheduler slot).
+    Runs are incremental: rows are read by keyset pages over (updated_at, id) starting at the
+    cursor left by the previous run, and every handled row is written, which moves it past
+    the cursor until it is due again; a sweep that reaches the end of the window resets it.
+    Returns per-outcome counts, or None if another run holds the lock or the scan failed.
+    """
+    config = current_app.config
+    client = get_redis()
+    lock = client.lock(LOCK_KEY, timeout=config['REAPER_LOCK_TIMEOUT'], blocking=False)
+    if not lock.acquire():
+        logger.info("Another reaper run is in progress, skipping.")
+        return None
+    try:
+        counts = {'scanned': 0, 'alive': 0, 'requeued': 0, 'failed': 0}
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=config['REAPER_STUCK_AFTER'])).isoformat()
+        cursor = _load_cursor(client)
+        worker_task_ids = await asyncio.to_thread(_worker_task_ids)
+        if worker_task_ids is None:
+            logger.info("No worker answered the inspection; relying on scheduler state only.")
+            worker_task_ids = set()
+
+        for _ in range(config['REAPER_MAX_PAGES']):
+            rows = await supabase_client.get_stale_generation_requests(cutoff, cursor, config['REAPER_BATCH_SIZE'])
+            if rows is None:
+                return None
+            for row in rows:
+                counts[await _reconcile(row, worker_task_ids, client)] += 1
+            counts['scanned'] += len(rows)
+            if len(rows) < config['REAPER_BATCH_SIZE']:
+                # End of the stale window: the next sweep starts over, retrying rows whose handling failed
+                cursor = None
+                client.delete(CURSOR_KEY)
+                break
+            cursor = (rows[-1]['updated_at'], rows[-1]['id'])
+            client.set(CURSOR_KEY, json.dumps(cursor))
+
+        # Backlogs whose slots expired (crashed jobs never call task_finished)
+        scheduler_service.release_all_backlogs(client)
+        client.set(LAST_RUN_KEY, json.dumps({**counts, 'cursor': cursor}))
+        if counts['requeued'] or counts['failed']:
+            logger.warning(f"Reaper run: {counts}")
+        else:
+            logger.info(f"Reaper run: {counts}")
+        return counts
+    finally:
+        try:
+            lock.release()
+        except redis.exceptions.LockError:
+            pass # Expired during a long run
+
+
+def init_reaper(app):
+    """Registers the `flask reap-stuck` command (the worker also runs the reaper periodically)."""
+    @app.cli.command('reap-stuck')
+    def reap_stuck_command():
+        """Re-enqueues or fails generation requests stuck in 'processing'."""
+        counts = run_coroutine_in_context(reconcile_stuck_requests())
+        print(counts if counts is not None else "Skipped (another run holds the lock, or the scan failed).")
@@ -0,0 +1,301 @@
+# backend/app/services/scheduler_service.py
+
+import json
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import redis
+from flask import current_app
+
+from app import celery_app
+from app.db.redis_client import get_redis
+from app.services import task_queue_service
+
+logger = logging.getLogger(__name__)
+
+# Priority hints given by the submission path
+HINT_INTERACTIVE = 'interactive' # Single request, someone is waiting on it
+HINT_REGENERATE = 'regenerate'   # Single request re-rolling an earlier one (force_new)
+HINT_BULK = 'bulk'               # Batch variants
+
+# Celery message priorities (Redis transport: 0 is served first, see broker_transport_options)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_REGENERATE = 3
+PRIORITY_BULK = 6
+
+QUEUE_CLASSES = ('interactive', 'bulk')
+
+# Admits up to the free in-flight slots of a user and returns the admitted payloads.
+# With hold=1 the rest is appended to the user's backlog (behind anything already waiting
+# there, to keep submission order); with hold=0 it is returned as rejected instead.
+# KEYS: in-flight zset, backlog list, backlog payload hash, set of users with a backlog
+# ARGV: now, slot deadline, cap, user id, hold, pending ttl, then (request id, payload) pairs
+_ADMIT_SCRIPT = """
+redis.call('zremrangebyscore', KEYS[1], '-inf', ARGV[1])
+local free = tonumber(ARGV[3]) - redis.call('zcard', KEYS[1])
+if ARGV[5] == '1' and redis.call('llen', KEYS[2]) > 0 then free = 0 end
+local admitted, rejected = {}, {}
+for i = 7, #ARGV, 2 do
+    if free > 0 then
+        redis.call('zadd', KEYS[1], ARGV[2], ARGV[i])
+        admitted[#admitted + 1] = ARGV[i + 1]
+        free = free - 1
+    elseif ARGV[5] == '1' then
+        redis.call('rpush', KEYS[2], ARGV[i])
+        redis.call('hset', KEYS[3], ARGV[i], ARGV[i + 1])
+    else
+        rejected[#rejected + 1] = ARGV[i + 1]
+    end
+end
+redis.call('expire', KEYS[1], ARGV[6])
+if redis.call('llen', KEYS[2]) > 0 then
+    redis.call('expire', KEYS[2], ARGV[6])
+    redis.call('expire', KEYS[3], ARGV[6])
+    redis.call('sadd', KEYS[4], ARGV[4])
+end
+return {admitted, rejected}
+"""
+
+# Frees the slot of a finished request (if given) and moves backlog entries into the free slots.
+# KEYS: in-flight zset, backlog list, backlog payload hash, set of users with a backlog
+# ARGV: now, slot deadline, cap, user id, finished request id (or '')
+_RELEASE_SCRIPT = """
+if ARGV[5] ~= '' then redis.call('zrem', KEYS[1], ARGV[5]) end
+redis.call('zremrangebyscore', KEYS[1], '-inf', ARGV[1])
+local free = tonumber(ARGV[3]) - redis.call('zcard', KEYS[1])
+local released = {}
+while free > 0 do
+    local request_id = redis.call('lpop', KEYS[2])
+    if not request_id then break end
+    local payload = redis.call('hget', KEYS[3], request_id)
+    redis.call('hdel', KEYS[3], request_id)
+    if payload then
+        redis.call('zadd', KEYS[1], ARGV[2], request_id)
+        released[#released + 1] = payload
+        free = free - 1
+    end
+end
+if redis.call('llen', KEYS[2]) == 0 then redis.call('srem', KEYS[4], ARGV[4]) end
+return released
+"""
+
+_BACKLOG_USERS_KEY = "sched:backlog-users"
+
+
+def _inflight_key(queue_class: str, user_id: str) -> str:
+    return f"sched:inflight:{queue_class}:{user_id}"
+
+
+def _backlog_keys(user_id: str) -> Tuple[str, str]:
+    return f"sched:backlog:{user_id}", f"sched:backlog-tasks:{user_id}"
+
+
+def _wait_key(queue_class: str) -> str:
+    return f"sched:wait:{queue_class}"
+
+
+def _queue_name(queue_class: str) -> str:
+    config = current_app.config
+    return config['GENERATION_QUEUE_INTERACTIVE'] if queue_class == 'interactive' else config['GENERATION_QUEUE_BULK']
+
+
+def _admit(client: redis.Redis, queue_class: str, user_id: str, tasks: List[Dict], hold: bool) -> Tuple[List[Dict], List[Dict]]:
+    """Runs the admission script for one queue class; returns (admitted, rejected) task dicts."""
+    config = current_app.config
+    now = time.time()
+    cap = config['SCHEDULER_INTERACTIVE_CAP'] if queue_class == 'interactive' else config['SCHEDULER_USER_INFLIGHT_CAP']
+    backlog_key, payload_key = _backlog_keys(user_id)
+    args = [now, now + config['SCHEDULER_INFLIGHT_TTL'], cap, user_id, 1 if hold else 0, config['SCHEDULER_PENDING_TTL']]
+    for task in tasks:
+        args.extend([task['request_id'], json.dumps(task)])
+    admitted, rejected = client.eval(
+        _ADMIT_SCRIPT, 4, _inflight_key(queue_class, user_id), backlog_key, payload_key, _BACKLOG_USERS_KEY, *args
+    )
+    return [json.loads(p) for p in admitted], [json.loads(p) for p in rejected]
+
+
+def _send(queue_class: str, priority: int, tasks: List[Dict]) -> bool:
+    if not tasks:
+        return True
+    return task_queue_service.send_generation_tasks(tasks, queue=_queue_name(queue_class), priority=priority)
+
+
+def _discard(client: redis.Redis, user_id: str, tasks: List[Dict]):
+    """Drops slots and backlog entries of tasks whose submission failed (their rows are marked failed)."""
+    request_ids = [task['request_id'] for task in tasks]
+    backlog_key, payload_key = _backlog_keys(user_id)
+    pipe = client.pipeline()
+    pipe.zrem(_inflight_key('interactive', user_id), *request_ids)
+    pipe.zrem(_inflight_key('bulk', user_id), *request_ids)
+    for request_id in request_ids:
+        pipe.lrem(backlog_key, 0, request_id)
+    pipe.hdel(payload_key, *request_ids)
+    pipe.execute()
+
+
+def schedule_tasks(user_id: str, tasks: List[Dict], hint: str = HINT_INTERACTIVE, group_id: Optional[str] = None) -> bool:
+    """
+    Queues generation tasks ({request_id, user_id, final_prompt, reference_image_path, seed})
+    according to their priority hint:
+      interactive/regenerate -> interactive queue, unless the user already has
+                                SCHEDULER_INTERACTIVE_CAP interactive jobs in flight (then bulk);
+      bulk                   -> bulk queue, at most SCHEDULER_USER_INFLIGHT_CAP per user at a time.
+    Bulk tasks beyond the cap wait in the user's Redis backlog and are released as the user's
+    earlier jobs finish (task_finished), so one large batch only ever occupies a few slots
+    and jobs of different users interleave in the bulk queue.
+    Blocking (broker and Redis I/O); returns False if the tasks could not be queued. Only the
+    slots and backlog entries of tasks that were not sent are dropped then.
+    """
+    submitted_at = time.time()
+    for task in tasks:
+        task.update(hint=hint, group_id=group_id, submitted_at=submitted_at)
+
+    if not current_app.config['SCHEDULER_ENABLED']:
+        queue_class, priority = ('bulk', PRIORITY_BULK) if hint == HINT_BULK else ('interactive', PRIORITY_INTERACTIVE)
+        return _send(queue_class, priority, tasks)
+
+    try:
+        client = get_redis()
+        demoted = tasks
+        if hint != HINT_BULK:
+            admitted, demoted = _admit(client, 'interactive', user_id, tasks, hold=False)
+            priority = PRIORITY_REGENERATE if hint == HINT_REGENERATE else PRIORITY_INTERACTIVE
+            if not _send('interactive', priority, admitted):
+                _discard(client, user_id, tasks)
+                return False
+            if demoted:
+                logger.info(f"User {user_id} is at the interactive cap; {len(demoted)} task(s) moved to the bulk queue.")
+        if demoted:
+            admitted, _ = _admit(client, 'bulk', user_id, demoted, hold=True)
+            if len(admitted) < len(demoted):
+                logger.info(f"Holding {len(demoted) - len(admitted)} task(s) of user {user_id} in the backlog.")
+            if not _send('bulk', PRIORITY_BULK, admitted):
+                # Interactive tasks sent above are running; only the bulk path's tasks were not queued
+                _discard(client, user_id, demoted)
+                return False
+        return True
+    except redis.RedisError as e:
+        logger.warning(f"Scheduler state unavailable, queueing without per-user caps: {e}")
+        queue_class, priority = ('bulk', PRIORITY_BULK) if hint == HINT_BULK else ('interactive', PRIORITY_INTERACTIVE)
+        return _send(queue_class, priority, tasks)
+
+
+def release_backlog(user_id: str, finished_request_id: Optional[str] = None,
+                    client: Optional[redis.Redis] = None) -> int:
+    """
+    Frees the in-flight slot of a finished request and dispatches backlog tasks into the free
+    bulk slots. Workers call it (via task_finished) with their own Redis client.
+    Returns the number of tasks dispatched.
+    """
+    config = current_app.config
+    client = client or get_redis()
+    now = time.time()
+    if finished_request_id:
+        client.zrem(_inflight_key('interactive', user_id), finished_request_id)
+    backlog_key, payload_key = _backlog_keys(user_id)
+    released = client.eval(
+        _RELEASE_SCRIPT, 4, _inflight_key('bulk', user_id), backlog_key, payload_key, _BACKLOG_USERS_KEY,
+        now, now + config['SCHEDULER_INFLIGHT_TTL'], config['SCHEDULER_USER_INFLIGHT_CAP'], user_id,
+        finished_request_id or ''
+    )
+    tasks = [json.loads(p) for p in released]
+    if tasks and not _send('bulk', PRIORITY_BULK, tasks):
+        # Put them back in front of the backlog; the next finished job (or the reaper) retries
+        pipe = client.pipeline()
+        pipe.zrem(_inflight_key('bulk', user_id), *(t['request_id'] for t in tasks))
+        pipe.lpush(backlog_key, *(t['request_id'] for t in reversed(tasks)))
+        pipe.hset(payload_key, mapping={t['request_id']: json.dumps(t) for t in tasks})
+        pipe.sadd(_BACKLOG_USERS_KEY, user_id)
+        pipe.execute()
+        return 0
+    if tasks:
+        logger.info(f"Released {len(tasks)} backlog task(s) of user {user_id} to the bulk queue.")
+    return len(tasks)
+
+
+def task_finished(user_id: str, request_id: str, client: Optional[redis.Redis] = None) -> int:
+    """Called when a job reaches a terminal state; frees its slot and releases the user's backlog."""
+    try:
+        return release_backlog(user_id, request_id, client)
+    except redis.RedisError as e:
+        logger.warning(f"Could not release scheduler slot of request {request_id}: {e}")
+        return 0
+
+
+def release_all_backlogs(client: Optional[redis.Redis] = None) -> int:
+    """Releases backlogs whose slots freed up without a task_finished call (e.g. expired slots of crashed jobs)."""
+    client = client or get_redis()
+    released = 0
+    for user_id in client.smembers(_BACKLOG_USERS_KEY):
+        user_id = user_id.decode() if isinstance(user_id, bytes) else user_id
+        released += release_backlog(user_id, client=client)
+    return released
+
+
+def is_scheduled(user_id: str, request_id: str, client: Optional[redis.Redis] = None) -> bool:
+    """True if the request holds a live in-flight slot (sent, not finished) or waits in its user's backlog."""
+    client = client or get_redis()
+    pipe = client.pipeline()
+    pipe.zscore(_inflight_key('interactive', user_id), request_id)
+    pipe.zscore(_inflight_key('bulk', user_id), request_id)
+    pipe.hexists(_backlog_keys(user_id)[1], request_id)
+    interactive_deadline, bulk_deadline, held = pipe.execute()
+    now = time.time()
+    return bool(held) or any(deadline is not None and deadline > now for deadline in (interactive_deadline, bulk_deadline))
+
+
+def record_task_started(hint: Optional[str], submitted_at: Optional[float], client: Optional[redis.Redis] = None):
+    """Records the submit-to-start wait of a job (called by the worker when a task starts)."""
+    if submitted_at is None:
+        return
+    queue_class = 'bulk' if hint == HINT_BULK else 'interactive'
+    wait_ms = max(0.0, (time.time() - float(submitted_at)) * 1000)
+    try:
+        pipe = (client or get_redis()).pipeline()
+        pipe.lpush(_wait_key(queue_class), round(wait_ms, 1))
+        pipe.ltrim(_wait_key(queue_class), 0, current_app.config['SCHEDULER_WAIT_SAMPLES'] - 1)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Could not record queue wait: {e}")
+
+
+def _percentile(samples: List[float], fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _queue_depth(queue_name: str) -> int:
+    """Messages waiting in a broker queue (all priority levels)."""
+    with celery_app.connection_for_read() as connection:
+        try:
+            return connection.default_channel.queue_declare(queue=queue_name, passive=True).message_count
+        except connection.channel_errors:
+            return 0 # Queue does not exist yet (nothing was ever sent or it was drained)
+
+
+def get_queue_metrics() -> Optional[Dict]:
+    """Queue depth and recent submit-to-start wait times per queue, plus backlog size (see GET /api/health/details)."""
+    try:
+        client = get_redis()
+        metrics: Dict = {}
+        for queue_class in QUEUE_CLASSES:
+            samples = [float(s) for s in client.lrange(_wait_key(queue_class), 0, -1)]
+            metrics[queue_class] = {
+                "queue": _queue_name(queue_class),
+                "depth": _queue_depth(_queue_name(queue_class)),
+                "wait_p50_ms": _percentile(samples, 0.50),
+                "wait_p95_ms": _percentile(samples, 0.95),
+                "wait_samples": len(samples),
+            }
+        backlog_users = [u.decode() if isinstance(u, bytes) else u for u in client.smembers(_BACKLOG_USERS_KEY)]
+        metrics["backlog"] = {
+            "users": len(backlog_users),
+            "tasks": sum(client.llen(_backlog_keys(user_id)[0]) for user_id in backlog_users),
+        }
+        return metrics
+    except Exception as e:
+        logger.warning(f"Could not collect queue metrics: {e}")
+        return None
@@ -0,0 +1,73 @@
+# backend/app/services/signed_url_service.py
+
+import time
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from flask import current_app
+
+from app.db import supabase_client
+from app.db.redis_client import get_redis
+from app.utils.cache import TieredCache
+
+logger = logging.getLogger(__name__)
+
+# Minted URLs are reused until SIGNED_URL_CACHE_MARGIN seconds before they expire, so a
+# gallery asking for the same images again gets the same URLs (and browser cache hits).
+_cache: Optional[TieredCache] = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache() -> TieredCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = current_app.config
+                ttl = config['SIGNED_URL_EXPIRES_IN'] - config['SIGNED_URL_CACHE_MARGIN']
+                _cache = TieredCache(
+                    "signed-image-urls",
+                    maxsize=config['SIGNED_URL_CACHE_MAXSIZE'],
+                    ttl=ttl,
+                    redis_getter=get_redis,
+                )
+    return _cache
+
+
+async def sign_images(image_ids: List[str]) -> Optional[Dict[str, Dict]]:
+    """
+    Returns {image_id: {'url', 'expires_at'}} for the ids that have a stored image.
+    Cached URLs are served while still valid for at least SIGNED_URL_CACHE_MARGIN seconds;
+    the rest are minted with a single storage call. Returns None if storage is unavailable.
+    """
+    config = current_app.config
+    margin = config['SIGNED_URL_CACHE_MARGIN']
+    cache = _get_cache()
+    now = time.time()
+
+    cached = await cache.aget_many(image_ids) # One MGET for the ids missing locally
+    signed: Dict[str, Dict] = {i: cached[i] for i in image_ids if i in cached and cached[i]['expires_at'] - margin > now}
+    misses: List[str] = [i for i in image_ids if i not in signed]
+
+    if misses:
+        expires_in = config['SIGNED_URL_EXPIRES_IN']
+        paths = {supabase_client.generated_image_path(image_id): image_id for image_id in misses}
+        minted = await supabase_client.create_signed_image_urls(list(paths), expires_in)
+        if minted is None:
+            return None
+        expires_at = int(now) + expires_in
+        entries = {paths[path]: {'url': url, 'expires_at': expires_at} for path, url in minted.items()}
+        await cache.aset_many(entries) # One pipelined round trip
+        signed.update(entries)
+        logger.info(f"Minted {len(minted)} signed image URLs ({len(image_ids) - len(misses)} served from cache).")
+    return signed
+
+
+def cache_max_age(signed: Dict[str, Dict]) -> int:
+    """Seconds a response carrying these URLs may be cached: until the first one is due for renewal."""
+    if not signed:
+        return 0
+    margin = current_app.config['SIGNED_URL_CACHE_MARGIN']
+    soonest = min(entry['expires_at'] for entry in signed.values())
+    return max(0, int(soonest - margin - time.time()))
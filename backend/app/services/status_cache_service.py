@@ -0,0 +1,144 @@
+# backend/app/services/status_cache_service.py
+
+import json
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import redis
+from flask import current_app
+
+from app.db import supabase_client
+from app.db.redis_client import get_redis
+from app.services.notification_service import TERMINAL_STATUSES
+from app.utils.cache import TieredCache, redis_key
+
+logger = logging.getLogger(__name__)
+
+# Status reads for polling clients go through this cache. Terminal rows never change,
+# so they are kept for a long time; non-terminal rows only for a few seconds.
+CACHE_NAMESPACE = "generation-status"
+TERMINAL_TTL = 86400  # Default for workers, which write without the app config
+
+_cache: Optional[TieredCache] = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache() -> Optional[TieredCache]:
+    global _cache
+    config = current_app.config
+    if not config['STATUS_CACHE_ENABLED']:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TieredCache(
+                    CACHE_NAMESPACE,
+                    maxsize=config['STATUS_CACHE_MAXSIZE'],
+                    ttl=config['STATUS_CACHE_TTL'],
+                    redis_getter=get_redis,
+                )
+    return _cache
+
+
+def _ttl_for(status: Dict) -> float:
+    config = current_app.config
+    if status.get('status') in TERMINAL_STATUSES:
+        return config['STATUS_CACHE_TERMINAL_TTL']
+    return config['STATUS_CACHE_TTL']
+
+
+def _is_older(status: Dict, cached: Dict) -> bool:
+    """True if `status` predates `cached` (versions only increase; terminal entries are final)."""
+    if cached.get('status') in TERMINAL_STATUSES and status.get('status') not in TERMINAL_STATUSES:
+        return True
+    return (status.get('version') or 0) < (cached.get('version') or 0)
+
+
+def _remember(cache: TieredCache, status: Dict):
+    _remember_many(cache, [status])
+
+
+def _remember_many(cache: TieredCache, statuses: List[Dict]):
+    """Caches statuses read from the database: one MGET for the version check, one pipelined write per TTL."""
+    # A read that raced with a transition must not put the older state back
+    cached = cache.get_many([s['request_id'] for s in statuses if s.get('status') not in TERMINAL_STATUSES])
+    by_ttl: Dict[float, Dict[str, Dict]] = {}
+    for status in statuses:
+        previous = cached.get(status['request_id'])
+        if previous is not None and status.get('status') not in TERMINAL_STATUSES and _is_older(status, previous):
+            continue
+        by_ttl.setdefault(_ttl_for(status), {})[status['request_id']] = status
+    for ttl, items in by_ttl.items():
+        cache.set_many(items, ttl=ttl, redis_ttl=ttl)
+
+
+async def get_status(request_id: str) -> Optional[Dict]:
+    """Cached get_generation_status."""
+    cache = _get_cache()
+    if cache is not None:
+        cached = await cache.aget(request_id)
+        if cached is not None:
+            return cached
+    status = await supabase_client.get_generation_status(request_id)
+    if status is not None and cache is not None:
+        await asyncio.to_thread(_remember, cache, status)
+    return status
+
+
+async def get_statuses(request_ids: List[str]) -> Optional[Dict[str, Dict]]:
+    """
+    Cached get_generation_statuses: local misses are read from Redis with one MGET, and only
+    what neither tier has is queried, in one `in` query.
+    """
+    cache = _get_cache()
+    if cache is None:
+        return await supabase_client.get_generation_statuses(request_ids)
+
+    found = await cache.aget_many(request_ids)
+    misses = [request_id for request_id in request_ids if request_id not in found]
+    if misses:
+        fetched = await supabase_client.get_generation_statuses(misses)
+        if fetched is None:
+            return None
+        if fetched:
+            await asyncio.to_thread(_remember_many, cache, list(fetched.values()))
+        found.update(fetched)
+    return found
+
+
+def cache_status(status: Dict, client: Optional[redis.Redis] = None, ttl: Optional[int] = None):
+    """
+    Write-through hook: call after changing a request's row, with its new status.
+
+    Inside the app the entry is written to both tiers. Workers pass their own Redis
+    client (and no app context is needed): terminal statuses are written with `ttl`
+    (default TERMINAL_TTL), anything else just invalidates the shared entry. Other API
+    processes see the change once their short local entry for the old state expires.
+    """
+    if client is None:
+        cache = _get_cache()
+        if cache is not None:
+            _remember(cache, status)
+        return
+    if status.get('status') not in TERMINAL_STATUSES:
+        invalidate_status(status['request_id'], client=client)
+        return
+    try:
+        client.set(redis_key(CACHE_NAMESPACE, status['request_id']), json.dumps(status), ex=int(ttl or TERMINAL_TTL))
+    except redis.RedisError as e:
+        logger.warning(f"Could not write status cache for request {status['request_id']}: {e}")
+
+
+def invalidate_status(request_id: str, client: Optional[redis.Redis] = None):
+    """Invalidation hook: drops the cached status so the next read goes to the database."""
+    if client is None:
+        cache = _get_cache()
+        if cache is not None:
+            cache.delete(request_id)
+        return
+    try:
+        client.delete(redis_key(CACHE_NAMESPACE, request_id))
+    except redis.RedisError as e:
+        logger.warning(f"Could not invalidate status cache for request {request_id}: {e}")
@@ -0,0 +1,102 @@
+# backend/app/services/status_service.py
+
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple
+
+from app.db import supabase_client
+from app.services import notification_service, status_cache_service
+from app.services.notification_service import TERMINAL_STATUSES
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ('processing',) + TERMINAL_STATUSES
+
+# Outcomes of transition_status
+APPLIED = 'applied'     # The row moved to the reported state
+IGNORED = 'ignored'     # Duplicate or stale report (already there or further along); nothing changed
+CONFLICT = 'conflict'   # Contradicts a terminal state, or the caller's expected version is outdated
+NOT_FOUND = 'not_found'
+
+MAX_CAS_ATTEMPTS = 5
+
+
+class StatusTransitionError(Exception):
+    """Raised for transitions that can never be valid (unknown status, missing result_url)."""
+    pass
+
+
+def _check(current: Dict, status: str, progress: Optional[int]) -> Optional[str]:
+    """Returns IGNORED/CONFLICT if the report must not be applied to the current row, else None."""
+    if current['status'] in TERMINAL_STATUSES:
+        # Terminal states are final: repeats are harmless, anything else is a regression
+        return IGNORED if status == current['status'] or status == 'processing' else CONFLICT
+    if status == 'processing' and (progress is None or progress <= (current.get('progress') or 0)):
+        return IGNORED # Progress only moves forward
+    return None
+
+
+def _announce(status: Dict):
+    """Writes an applied transition to the status cache and publishes it (blocking Redis calls)."""
+    status_cache_service.cache_status(status)
+    notification_service.publish_status(status)
+
+
+async def transition_status(request_id: str, status: str, progress: Optional[int] = None,
+                            result_url: Optional[str] = None, error_message: Optional[str] = None,
+                            expected_version: Optional[int] = None, thumbnails: Optional[Dict[str, str]] = None,
+                            blurhash: Optional[str] = None) -> Tuple[str, Optional[Dict]]:
+    """
+    Moves a generation request along processing -> (processing with more progress)* -> succeeded|failed.
+    Every applied transition bumps the row's version with a compare-and-set on the version read
+    before, so concurrent or repeated reports (e.g. duplicate task deliveries) can never move a
+    row backwards: a terminal state is final and progress only increases. Applied transitions
+    are written to the status cache and published to subscribers. A 'succeeded' transition may
+    carry the result's thumbnails and BlurHash, so readers never cache the row without them.
+    Returns (outcome, current status), the status being None only for NOT_FOUND.
+    Raises StatusTransitionError for an unknown status or a 'succeeded' without result_url.
+    """
+    if status not in STATUSES:
+        raise StatusTransitionError(f"Unknown status '{status}'.")
+    if status == 'succeeded' and not result_url:
+        raise StatusTransitionError("A 'succeeded' transition requires result_url.")
+
+    fields: Dict = {'status': status}
+    if status == 'processing':
+        fields['progress'] = progress
+    elif status == 'succeeded':
+        fields.update(progress=100, result_url=result_url, error_message=None)
+        if thumbnails is not None:
+            fields['thumbnails'] = thumbnails
+        if blurhash is not None:
+            fields['blurhash'] = blurhash
+    else:
+        fields['error_message'] = error_message or 'Image generation failed'
+
+    current = None
+    for _ in range(MAX_CAS_ATTEMPTS):
+        current = await supabase_client.get_generation_status(request_id)
+        if current is None:
+            return NOT_FOUND, None
+        version = current.get('version') or 0
+        if expected_version is not None and expected_version != version:
+            return CONFLICT, current
+        rejected = _check(current, status, progress)
+        if rejected:
+            if rejected == CONFLICT:
+                logger.warning(f"Rejected transition of request {request_id} from '{current['status']}' to '{status}'.")
+            return rejected, current
+
+        updated = await supabase_client.compare_and_set_generation_request(
+            request_id, version, {**fields, 'version': version + 1}
+        )
+        if updated is not None:
+            await asyncio.to_thread(_announce, updated)
+            return APPLIED, updated
+        if expected_version is not None:
+            break # The caller's version is gone now; re-read to report the current state
+        logger.info(f"Request {request_id} changed while applying '{status}' (version {version}), retrying.")
+
+    current = await supabase_client.get_generation_status(request_id)
+    logger.warning(f"Could not apply '{status}' to request {request_id} after concurrent updates.")
+    return CONFLICT, current
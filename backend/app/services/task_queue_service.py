@@ -1,4 +1,6 @@
+import time
 import logging
+from typing import Dict, List, Optional
 from app import celery_app # Import the Celery app instance from __init__
 
 logger = logging.getLogger(__name__)
@@ -6,21 +8,44 @@ logger = logging.getLogger(__name__)
 # Define the name of the task as defined in the worker project
 IMAGE_GENERATION_TASK_NAME = 'worker.tasks.generation_task._image_task'
 
-def send_generation_task(request_id: str, user_id: str, final_prompt: str, reference_image_path: str | None = None):
-    """Sends the image generation task to the Celery queue."""
+def _task_kwargs(request_id: str, user_id: str, final_prompt: str, reference_image_path: str | None = None,
+                 seed: Optional[int] = None) -> Dict:
+    """Builds the worker task arguments; optional parameters are only sent when set."""
+    task_args = {
+        'request_id': request_id,
+        'user_id': user_id,
+        'prompt': final_prompt,
+        'reference_image_path': reference_image_path
+        # Add any other necessasry parameters
+    }
+    if seed is not None:
+        task_args['seed'] = seed
+    return task_args
+
+def send_generation_tasks(tasks: List[Dict], queue: Optional[str] = None, priority: Optional[int] = None) -> bool:
+    """
+    Sends generation tasks over a single broker connection; each Celery task id is its request_id.
+    Task dicts hold the _task_kwargs arguments plus the scheduling fields set by
+    scheduler_service (hint, group_id, submitted_at), which travel as message headers.
+    """
     try:
-        logger.info(f"Sending task '{IMAGE_GENERATION_TASK_NAME}' to queue for request_id: {request_id}")
-        # Pass arguments needed by the worker task
-        task_args = {
-            'request_id': request_id,
-            'user_id': user_id,
-            'prompt': final_prompt,
-            'reference_image_path': reference_image_path
-            # Add any other necessasry parameters
-        }
-        celery_app.send_task(IMAGE_GENERATION_TASK_NAME, kwargs=task_args)
-        logger.info(f"Task for request_id {request_id} sent successfully.")
+        logger.info(f"Sending {len(tasks)} '{IMAGE_GENERATION_TASK_NAME}' task(s) to queue {queue} (priority {priority})")
+        enqueued_at = time.time()
+        with celery_app.producer_or_acquire() as producer:
+            for task in tasks:
+                celery_app.send_task(
+                    IMAGE_GENERATION_TASK_NAME,
+                    kwargs=_task_kwargs(task['request_id'], task['user_id'], task['final_prompt'],
+                                        task.get('reference_image_path'), task.get('seed')),
+                    task_id=task['request_id'],
+                    group_id=task.get('group_id'),
+                    queue=queue,
+                    priority=priority,
+                    headers={'hint': task.get('hint'), 'submitted_at': task.get('submitted_at'), 'enqueued_at': enqueued_at},
+                    producer=producer
+                )
+        logger.info(f"{len(tasks)} task(s) sent successfully to queue {queue}.")
         return True
     except Exception as e:
-        logger.error(f"Failed to send task for request_id {request_id} to Celery queue: {e}", exc_info=True)
-        return False
\ No newline at end of file
+        logger.error(f"Failed to send {len(tasks)} task(s) to Celery queue {queue}: {e}", exc_info=True)
+        return False
@@ -0,0 +1,101 @@
+# backend/app/services/upload_service.py
+
+import json
+import time
+import asyncio
+import uuid
+import logging
+from typing import Dict
+
+import redis
+from flask import current_app
+
+from app.db import supabase_client
+from app.db.redis_client import get_redis
+from app.models.schemas import UploadCreateResponse
+
+logger = logging.getLogger(__name__)
+
+# Content types accepted for direct uploads, with the extension the object is stored under
+ALLOWED_CONTENT_TYPES = {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp"}
+SIGNED_UPLOAD_URL_TTL = 7200 # Supabase signed upload URLs are valid for two hours
+
+
+class UploadError(Exception):
+    """Custom exception for invalid direct-upload requests or references."""
+    pass
+
+
+def _key(upload_id: str) -> str:
+    return f"upload:reference:{upload_id}"
+
+
+def uploaded_reference_path(user_id: str, upload_id: str, extension: str) -> str:
+    """Storage path of a direct upload, e.g. user_id/uploads/upload_id/reference.png."""
+    return f"{user_id}/uploads/{upload_id}/reference.{extension}"
+
+
+async def create_upload(user_id: str, content_type: str) -> UploadCreateResponse:
+    """
+    Reserves an upload id and returns a signed URL the client uploads the image to directly,
+    so the bytes never pass through the API process.
+    Raises UploadError for unsupported content types or if storage cannot sign the URL.
+    """
+    extension = ALLOWED_CONTENT_TYPES.get(content_type)
+    if not extension:
+        raise UploadError(f"Unsupported content_type '{content_type}'. Allowed: {', '.join(ALLOWED_CONTENT_TYPES)}")
+
+    upload_id = str(uuid.uuid4())
+    path = uploaded_reference_path(user_id, upload_id, extension)
+    signed = await supabase_client.create_reference_upload_url(path)
+    if not signed:
+        raise UploadError("Could not create a signed upload URL.")
+
+    record = {"user_id": user_id, "path": path, "content_type": content_type, "created_at": time.time()}
+    try:
+        await asyncio.to_thread(get_redis().set, _key(upload_id), json.dumps(record),
+                                ex=current_app.config['UPLOAD_RECORD_TTL'])
+    except redis.RedisError as e:
+        logger.error(f"Could not record upload {upload_id}: {e}")
+        raise UploadError("Upload registry unavailable.")
+
+    logger.info(f"Created direct upload {upload_id} for user {user_id} at {path}")
+    return UploadCreateResponse(
+        upload_id=upload_id,
+        upload_url=signed["signed_url"],
+        token=signed["token"],
+        path=path,
+        expires_in=SIGNED_UPLOAD_URL_TTL
+    )
+
+
+async def resolve_upload(upload_id: str, user_id: str) -> Dict:
+    """
+    Checks that an upload id belongs to the user and that the object was uploaded.
+    Returns {'upload_id', 'path', 'content_type', 'size', 'etag'}; the storage ETag serves as
+    the content hash for deduplication and caching, so the object is never downloaded here.
+    Raises UploadError if the upload is unknown, expired, incomplete or too large.
+    """
+    try:
+        raw = await asyncio.to_thread(get_redis().get, _key(upload_id))
+    except redis.RedisError as e:
+        logger.error(f"Could not look up upload {upload_id}: {e}")
+        raise UploadError("Upload registry unavailable.")
+    record = json.loads(raw) if raw else None
+    if not record or record["user_id"] != user_id:
+        raise UploadError(f"Unknown or expired upload_id '{upload_id}'.")
+
+    info = await supabase_client.get_reference_image_info(record["path"])
+    if not info:
+        raise UploadError(f"Upload '{upload_id}' has not been completed.")
+    max_bytes = current_app.config['MAX_CONTENT_LENGTH']
+    if info["size"] and int(info["size"]) > max_bytes:
+        raise UploadError(f"Upload '{upload_id}' exceeds the maximum size of {max_bytes} bytes.")
+
+    return {
+        "upload_id": upload_id,
+        "path": record["path"],
+        "content_type": info["content_type"] or record["content_type"],
+        "size": info["size"],
+        "etag": info["etag"] or upload_id, # Without an ETag the upload id still identifies the content
+    }
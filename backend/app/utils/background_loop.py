@@ -0,0 +1,93 @@
+# backend/app/utils/background_loop.py
+
+import os
+import asyncio
+import contextvars
+import concurrent.futures
+import logging
+import threading
+from typing import Awaitable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# A single long-lived event loop per process, running in a daemon thread.
+# Async clients (connection pools, semaphores) are bound to the loop that created them.
+# The app runs every async view here (see SharedLoopFlask in app/__init__.py), so
+# concurrent requests overlap their upstream I/O on one loop and share those clients.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+_loop_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """Returns the process-wide background loop, starting it on first use."""
+    global _loop, _thread, _loop_pid
+    if _loop is None or _loop_pid != os.getpid() or not _thread.is_alive():
+        with _lock:
+            if _loop is None or _loop_pid != os.getpid() or not _thread.is_alive():
+                _loop = asyncio.new_event_loop()
+                _thread = threading.Thread(target=_loop.run_forever, name="background-event-loop", daemon=True)
+                _thread.start()
+                _loop_pid = os.getpid()
+                logger.info(f"Background event loop started for process {_loop_pid}.")
+    return _loop
+
+
+async def run_in_background_loop(coro: Awaitable[T]) -> T:
+    """Awaits a coroutine on the background loop from any other event loop."""
+    loop = get_background_loop()
+    try:
+        if asyncio.get_running_loop() is loop:
+            return await coro
+    except RuntimeError:
+        pass
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    return await asyncio.wrap_future(future)
+
+
+def run_coroutine_sync(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """Runs a coroutine on the background loop from synchronous code and waits for the result."""
+    return asyncio.run_coroutine_threadsafe(coro, get_background_loop()).result(timeout)
+
+
+def run_coroutine_in_context(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """
+    Like run_coroutine_sync, but the coroutine runs in a copy of the caller's context,
+    so Flask's app/request context (current_app, request, g) is visible inside it.
+    """
+    loop = get_background_loop()
+    context = contextvars.copy_context()
+    result: concurrent.futures.Future = concurrent.futures.Future()
+
+    def _done(task: asyncio.Task):
+        if task.cancelled():
+            result.cancel()
+        elif task.exception() is not None:
+            result.set_exception(task.exception())
+        else:
+            result.set_result(task.result())
+
+    def _start():
+        if result.set_running_or_notify_cancel():
+            loop.create_task(coro, context=context).add_done_callback(_done)
+        else:
+            coro.close()
+
+    loop.call_soon_threadsafe(_start)
+    return result.result(timeout)
+
+
+def stop_background_loop():
+    """Stops the background loop (called on process shutdown)."""
+    global _loop, _thread, _loop_pid
+    with _lock:
+        if _loop is not None and _loop_pid == os.getpid() and _loop.is_running():
+            _loop.call_soon_threadsafe(_loop.stop)
+            _thread.join(timeout=5)
+            logger.info("Background event loop stopped.")
+        _loop = None
+        _thread = None
+        _loop_pid = None
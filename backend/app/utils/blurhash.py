@@ -0,0 +1,76 @@
+# backend/app/utils/blurhash.py
+#
+# Minimal BlurHash encoder (https://blurha.sh) for the placeholder of generated images.
+# Runs on a downscaled copy (a few dozen pixels wide), so pure Python is fast enough.
+
+import math
+from typing import List, Sequence, Tuple
+
+from PIL import Image
+
+_CHARACTERS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+SAMPLE_WIDTH = 32 # Pixels; the hash only encodes a handful of low-frequency components
+
+
+def _encode83(value: int, length: int) -> str:
+    return "".join(_CHARACTERS[(value // 83 ** (length - i)) % 83] for i in range(1, length + 1))
+
+
+def _srgb_to_linear(value: int) -> float:
+    v = value / 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value: float) -> int:
+    v = max(0.0, min(1.0, value))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _sign_pow(value: float, exponent: float) -> float:
+    return math.copysign(abs(value) ** exponent, value)
+
+
+def encode(image: Image.Image, components_x: int = 4, components_y: int = 3) -> str:
+    """Returns the BlurHash of an image."""
+    sample = image.convert("RGB")
+    sample.thumbnail((SAMPLE_WIDTH, SAMPLE_WIDTH))
+    width, height = sample.size
+    pixels: Sequence[Tuple[int, int, int]] = list(sample.getdata())
+    linear = [(_srgb_to_linear(r), _srgb_to_linear(g), _srgb_to_linear(b)) for r, g, b in pixels]
+
+    factors: List[Tuple[float, float, float]] = []
+    for j in range(components_y):
+        cos_y = [math.cos(math.pi * j * y / height) for y in range(height)]
+        for i in range(components_x):
+            cos_x = [math.cos(math.pi * i * x / width) for x in range(width)]
+            r = g = b = 0.0
+            for y in range(height):
+                row = y * width
+                for x in range(width):
+                    basis = cos_x[x] * cos_y[y]
+                    pr, pg, pb = linear[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = (1 if i == 0 and j == 0 else 2) / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    blurhash = _encode83((components_x - 1) + (components_y - 1) * 9, 1)
+
+    if ac:
+        actual_max = max(abs(channel) for factor in ac for channel in factor)
+        quantised_max = int(max(0, min(82, math.floor(actual_max * 166 - 0.5))))
+        max_value = (quantised_max + 1) / 166
+        blurhash += _encode83(quantised_max, 1)
+    else:
+        max_value = 1.0
+        blurhash += _encode83(0, 1)
+
+    blurhash += _encode83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+    for factor in ac:
+        quantised = [int(max(0, min(18, math.floor(_sign_pow(channel / max_value, 0.5) * 9 + 9.5)))) for channel in factor]
+        blurhash += _encode83(quantised[0] * 19 * 19 + quantised[1] * 19 + quantised[2], 2)
+    return blurhash
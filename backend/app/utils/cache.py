@@ -0,0 +1,266 @@
+# backend/app/utils/cache.py
+
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+# Every cache registers itself here so its counters can be reported (see GET /api/health/details)
+_caches: List["TieredCache"] = []
+
+
+class TTLCache:
+    """Thread-safe in-process LRU cache whose entries expire after a TTL."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class TieredCache:
+    """
+    Two-tier cache: an in-process TTLCache in front of a shared Redis tier.
+    Values must be JSON-serialisable. Redis failures degrade to local-only caching
+    for a short cool-down instead of adding latency to every lookup.
+    """
+
+    REDIS_COOLDOWN_SECONDS = 30
+
+    def __init__(self, namespace: str, maxsize: int, ttl: float, redis_ttl: Optional[float] = None,
+                 redis_getter: Optional[Callable[[], redis.Redis]] = None):
+        self.namespace = namespace
+        self.local = TTLCache(maxsize, ttl)
+        self.redis_ttl = redis_ttl if redis_ttl is not None else ttl
+        self._redis_getter = redis_getter
+        self._redis_disabled_until = 0.0
+        self.redis_hits = 0
+        self.redis_misses = 0
+        self.redis_errors = 0
+        _caches.append(self)
+
+    def _key(self, key: str) -> str:
+        return redis_key(self.namespace, key)
+
+    def _redis(self) -> Optional[redis.Redis]:
+        if self._redis_getter is None or time.monotonic() < self._redis_disabled_until:
+            return None
+        return self._redis_getter()
+
+    def _redis_failed(self, e: Exception):
+        self.redis_errors += 1
+        self._redis_disabled_until = time.monotonic() + self.REDIS_COOLDOWN_SECONDS
+        logger.warning(f"Redis tier of cache '{self.namespace}' unavailable, using local tier only: {e}")
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        return self._get_shared(key)
+
+    def _get_shared(self, key: str) -> Optional[Any]:
+        client = self._redis()
+        if client is None:
+            return None
+        try:
+            raw = client.get(self._key(key))
+        except redis.RedisError as e:
+            self._redis_failed(e)
+            return None
+        if raw is None:
+            self.redis_misses += 1
+            return None
+        self.redis_hits += 1
+        value = json.loads(raw)
+        self.local.set(key, value) # Promote to the local tier
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, redis_ttl: Optional[float] = None):
+        self.local.set(key, value, ttl)
+        self._set_shared(key, value, redis_ttl)
+
+    def _set_shared(self, key: str, value: Any, redis_ttl: Optional[float] = None):
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            client.set(self._key(key), json.dumps(value), ex=int(redis_ttl or self.redis_ttl))
+        except redis.RedisError as e:
+            self._redis_failed(e)
+
+    def delete(self, key: str):
+        self.local.delete(key)
+        self._delete_shared(key)
+
+    def _delete_shared(self, key: str):
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            client.delete(self._key(key))
+        except redis.RedisError as e:
+            self._redis_failed(e)
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Values of the keys that are cached; local misses are read with a single MGET."""
+        found, misses = self._get_many_local(keys)
+        if misses:
+            found.update(self._get_many_shared(misses))
+        return found
+
+    def _get_many_local(self, keys: List[str]) -> Tuple[Dict[str, Any], List[str]]:
+        found: Dict[str, Any] = {}
+        for key in keys:
+            value = self.local.get(key)
+            if value is not None:
+                found[key] = value
+        return found, [key for key in keys if key not in found]
+
+    def _get_many_shared(self, keys: List[str]) -> Dict[str, Any]:
+        client = self._redis()
+        if client is None:
+            return {}
+        try:
+            raws = client.mget([self._key(key) for key in keys])
+        except redis.RedisError as e:
+            self._redis_failed(e)
+            return {}
+        found: Dict[str, Any] = {}
+        for key, raw in zip(keys, raws):
+            if raw is None:
+                self.redis_misses += 1
+                continue
+            self.redis_hits += 1
+            found[key] = json.loads(raw)
+            self.local.set(key, found[key]) # Promote to the local tier
+        return found
+
+    def set_many(self, items: Dict[str, Any], ttl: Optional[float] = None, redis_ttl: Optional[float] = None):
+        """Sets many entries with the same TTLs; the Redis tier is written in one pipelined round trip."""
+        for key, value in items.items():
+            self.local.set(key, value, ttl)
+        self._set_many_shared(items, redis_ttl)
+
+    def _set_many_shared(self, items: Dict[str, Any], redis_ttl: Optional[float] = None):
+        client = self._redis()
+        if client is None or not items:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipe.set(self._key(key), json.dumps(value), ex=int(redis_ttl or self.redis_ttl))
+            pipe.execute()
+        except redis.RedisError as e:
+            self._redis_failed(e)
+
+    # Coroutine variants: the local tier is used inline, Redis round trips run in a worker
+    # thread so they never block the shared event loop (see app/utils/background_loop.py)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        value = self.local.get(key)
+        if value is not None or self._redis() is None:
+            return value
+        return await asyncio.to_thread(self._get_shared, key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None, redis_ttl: Optional[float] = None):
+        self.local.set(key, value, ttl)
+        if self._redis() is not None:
+            await asyncio.to_thread(self._set_shared, key, value, redis_ttl)
+
+    async def aget_many(self, keys: List[str]) -> Dict[str, Any]:
+        found, misses = self._get_many_local(keys)
+        if misses and self._redis() is not None:
+            found.update(await asyncio.to_thread(self._get_many_shared, misses))
+        return found
+
+    async def aset_many(self, items: Dict[str, Any], ttl: Optional[float] = None, redis_ttl: Optional[float] = None):
+        for key, value in items.items():
+            self.local.set(key, value, ttl)
+        if items and self._redis() is not None:
+            await asyncio.to_thread(self._set_many_shared, items, redis_ttl)
+
+    async def adelete(self, key: str):
+        self.local.delete(key)
+        if self._redis() is not None:
+            await asyncio.to_thread(self._delete_shared, key)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            **self.local.stats(),
+            "redis_hits": self.redis_hits,
+            "redis_misses": self.redis_misses,
+            "redis_errors": self.redis_errors,
+        }
+
+
+def redis_key(namespace: str, key: str) -> str:
+    """Redis key of a TieredCache entry (lets processes without the cache object, e.g. workers, touch it)."""
+    return f"cache:{namespace}:{key}"
+
+
+def make_key(*parts) -> str:
+    """Builds a content-addressed key: SHA-256 over the given str/bytes parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode('utf-8'))
+        digest.update(b'\x00') # Separator so ('ab', 'c') != ('a', 'bc')
+    return digest.hexdigest()
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    """Returns hit/miss/eviction counters for every registered cache."""
+    return {cache.namespace: cache.stats() for cache in _caches}
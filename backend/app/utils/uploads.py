@@ -0,0 +1,86 @@
+# backend/app/utils/uploads.py
+
+import io
+import os
+import hashlib
+import tempfile
+from typing import IO, Optional
+
+from flask import Request
+from werkzeug.datastructures import FileStorage
+
+CHUNK_SIZE = 64 * 1024
+
+
+class HashingUploadFile(io.FileIO):
+    """
+    Unbuffered temporary file backing one multipart file part.
+    Werkzeug writes the part into it chunk by chunk while parsing the request, and the
+    SHA-256 and size are computed on the way in, so the upload never sits in memory and
+    needs no second pass to hash. Being a FileIO, it can be handed to the storage client
+    as-is and is streamed from disk.
+    """
+
+    def __init__(self):
+        fd, self._path = tempfile.mkstemp(prefix="upload-")
+        super().__init__(fd, "w+b")
+        try:
+            os.unlink(self._path) # Gone once closed (POSIX)
+            self._path = None
+        except OSError:
+            pass # Windows: removed in close()
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data) -> int:
+        self._sha256.update(data)
+        self.size += len(data)
+        return super().write(data)
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+    def close(self):
+        super().close()
+        if self._path:
+            try:
+                os.unlink(self._path)
+            except OSError:
+                pass
+            self._path = None
+
+
+FORM_MIMETYPES = ("multipart/form-data", "application/x-www-form-urlencoded")
+
+
+class UploadRequest(Request):
+    """Request class that spools multipart file parts into HashingUploadFile (size is capped by MAX_CONTENT_LENGTH)."""
+
+    def load_body(self):
+        """
+        Reads the whole body now: forms are parsed (file parts spooled and hashed), anything else
+        is cached for get_json(). Called in the server thread before an async view is handed to
+        the shared event loop, so the loop never waits on a client's upload.
+        """
+        if self.mimetype in FORM_MIMETYPES:
+            self._load_form_data()
+        else:
+            self.get_data()
+
+    def _get_file_stream(self, total_content_length: Optional[int], content_type: Optional[str],
+                         filename: Optional[str] = None, content_length: Optional[int] = None) -> IO[bytes]:
+        return HashingUploadFile()
+
+
+def upload_digest(file_storage: FileStorage) -> str:
+    """SHA-256 of an uploaded file; free for HashingUploadFile streams, one chunked pass otherwise."""
+    stream = file_storage.stream
+    if isinstance(stream, HashingUploadFile):
+        return stream.sha256
+    digest = hashlib.sha256()
+    position = stream.tell()
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+        digest.update(chunk)
+    stream.seek(position)
+    return digest.hexdigest()
@@ -0,0 +1,36 @@
+# backend/asgi.py
+#
+# ASGI entry point for production serving. Run with one of:
+#
+#   uvicorn asgi:app --host 0.0.0.0 --port 5001 --workers 4 --timeout-keep-alive 75
+#   hypercorn asgi:app --bind 0.0.0.0:5001 --workers 4
+#
+# Each worker process runs the Flask app in a pool of ASGI_WORKER_THREADS threads, and
+# every async view of the process runs on one long-lived event loop (SharedLoopFlask),
+# so slow upstream calls (Supabase, Grok) of concurrent requests overlap on that loop.
+# Blocking work (body parsing, token checks, sync Redis calls) stays off the loop; see
+# SharedLoopFlask in app/__init__.py.
+# Every request, async views included, still holds one of the threads until it finishes,
+# so ASGI_WORKER_THREADS is the number of requests in flight per process.
+# Size --workers by CPU cores and ASGI_WORKER_THREADS by concurrent requests per
+# process; keep SUPABASE_POOL_MAX_CONNECTIONS and GROK_MAX_CONCURRENCY in line with it.
+# Event streams hold their thread for up to SSE_MAX_STREAM_SECONDS; SSE_MAX_STREAMS caps
+# them per process so the remaining threads keep serving ordinary requests.
+# Use run.py only for local development.
+
+import os
+from dotenv import load_dotenv
+from a2wsgi import WSGIMiddleware
+
+# --- Load environment variables first ---
+dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path)
+
+# --- Import the app factory after loading .env ---
+from app import create_app
+
+flask_app = create_app()
+
+# --- Wrap the Flask app for the ASGI server ---
+app = WSGIMiddleware(flask_app, workers=flask_app.config['ASGI_WORKER_THREADS'])
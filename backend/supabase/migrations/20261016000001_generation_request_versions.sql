@@ -0,0 +1,6 @@
+-- Versioned status transitions (status_service.transition_status).
+-- Every applied transition bumps `version` with a compare-and-set on the version read before;
+-- `progress` is the percentage reported by the worker while the request is processing.
+alter table public.generation_requests
+    add column if not exists version integer not null default 0,
+    add column if not exists progress smallint not null default 0;
@@ -0,0 +1,5 @@
+-- Result derivatives (image_service.create_result_derivatives), written with the 'succeeded'
+-- transition: thumbnail URLs keyed by width, and the BlurHash placeholder of the result.
+alter table public.generation_requests
+    add column if not exists thumbnails jsonb,
+    add column if not exists blurhash text;
@@ -0,0 +1,5 @@
+-- Keyset scan of the reaper (supabase_client.get_stale_generation_requests): only rows still
+-- 'processing' are indexed, so each page is an index range scan however large the table grows.
+create index if not exists generation_requests_processing_idx
+    on public.generation_requests (updated_at, id)
+    where status = 'processing';
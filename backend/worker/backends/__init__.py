@@ -0,0 +1,32 @@
+# backend/worker/backends/__init__.py
+
+import threading
+from typing import Dict, Optional, Type
+
+from werkzeug.utils import import_string
+
+from .base import ImageBackend, ImageBackendError
+from .fake import FakeImageBackend
+
+# Built-in backends by WORKER_IMAGE_BACKEND name; any other value is imported as a dotted path
+BACKENDS: Dict[str, Type[ImageBackend]] = {
+    FakeImageBackend.name: FakeImageBackend,
+}
+
+_backend: Optional[ImageBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend(config) -> ImageBackend:
+    """Returns the process-wide image backend selected by WORKER_IMAGE_BACKEND, creating it on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = config['WORKER_IMAGE_BACKEND']
+                backend_cls = BACKENDS.get(name) or import_string(name) # e.g. 'mypackage.backends:GpuBackend'
+                _backend = backend_cls(config)
+    return _backend
+
+
+__all__ = ['ImageBackend', 'ImageBackendError', 'FakeImageBackend', 'BACKENDS', 'get_backend']
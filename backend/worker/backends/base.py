@@ -0,0 +1,31 @@
+# backend/worker/backends/base.py
+
+from abc import ABC, abstractmethod
+from typing import Callable, Optional
+
+
+class ImageBackendError(Exception):
+    """Raised by an image backend when a generation attempt fails."""
+    pass
+
+
+class ImageBackend(ABC):
+    """
+    Interface between the generation task and the model that renders images.
+    A backend is created once per worker process and must be safe to call from its task threads.
+    Subclasses must implement generate(); an incomplete backend fails when it is created.
+    """
+
+    name = "base"
+
+    def __init__(self, config):
+        self.config = config
+
+    @abstractmethod
+    def generate(self, request_id: str, prompt: str, seed: Optional[int] = None,
+                 reference_image: Optional[bytes] = None,
+                 on_progress: Optional[Callable[[int], None]] = None) -> bytes:
+        """
+        Renders one image and returns it PNG-encoded. Raises ImageBackendError on failure.
+        Backends that know how far they are may call on_progress with a percentage (0-99).
+        """
@@ -0,0 +1,106 @@
+# backend/worker/backends/fake.py
+
+import io
+import math
+import time
+import random
+import hashlib
+import logging
+from typing import Callable, Optional
+
+from PIL import Image, ImageDraw
+
+from worker.backends.base import ImageBackend, ImageBackendError
+
+logger = logging.getLogger(__name__)
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'lognormal')
+PROGRESS_STEPS = 4 # Reports 25/50/75 % while 'rendering'
+
+
+class FakeImageBackend(ImageBackend):
+    """
+    Deterministic stand-in for the GPU model, for local end-to-end and load testing.
+    The image depends only on prompt, seed and reference image, so repeated jobs render
+    the same bytes. The latency of every job is drawn from WORKER_FAKE_LATENCY_DIST
+    (seeded by the request id, so a replayed load test sees the same latencies), and
+    WORKER_FAKE_FAILURE_RATE of the jobs fail.
+    """
+
+    name = "fake"
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.distribution = config['WORKER_FAKE_LATENCY_DIST']
+        if self.distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"WORKER_FAKE_LATENCY_DIST must be one of {', '.join(LATENCY_DISTRIBUTIONS)}.")
+        self.mean = config['WORKER_FAKE_LATENCY_MEAN']
+        if self.distribution == 'lognormal' and self.mean <= 0:
+            raise ValueError("WORKER_FAKE_LATENCY_MEAN must be positive for the lognormal distribution.")
+        self.stddev = config['WORKER_FAKE_LATENCY_STDDEV']
+        self.min_latency = config['WORKER_FAKE_LATENCY_MIN']
+        self.max_latency = config['WORKER_FAKE_LATENCY_MAX']
+        self.failure_rate = config['WORKER_FAKE_FAILURE_RATE']
+        self.size = config['WORKER_FAKE_IMAGE_SIZE']
+
+    def sample_latency(self, rng: random.Random) -> float:
+        """Seconds one generation takes, clamped to [WORKER_FAKE_LATENCY_MIN, WORKER_FAKE_LATENCY_MAX]."""
+        if self.distribution == 'fixed':
+            latency = self.mean
+        elif self.distribution == 'uniform':
+            latency = rng.uniform(self.mean - self.stddev, self.mean + self.stddev)
+        elif self.distribution == 'normal':
+            latency = rng.gauss(self.mean, self.stddev)
+        else:
+            # Parameterized so the samples have the configured mean and standard deviation
+            sigma_squared = math.log(1 + (self.stddev / self.mean) ** 2)
+            latency = rng.lognormvariate(math.log(self.mean) - sigma_squared / 2, math.sqrt(sigma_squared))
+        return min(self.max_latency, max(self.min_latency, latency))
+
+    def render(self, prompt: str, seed: Optional[int], reference_image: Optional[bytes]) -> bytes:
+        """Draws a gradient with a few shapes, all derived from the inputs' hash."""
+        digest = hashlib.sha256(f"{prompt}\x00{seed}".encode())
+        if reference_image:
+            digest.update(hashlib.sha256(reference_image).digest())
+        rng = random.Random(digest.digest())
+
+        size = self.size
+        start = tuple(rng.randrange(256) for _ in range(3))
+        end = tuple(rng.randrange(256) for _ in range(3))
+        gradient = Image.linear_gradient("L").resize((size, size))
+        image = Image.composite(Image.new("RGB", (size, size), end), Image.new("RGB", (size, size), start), gradient)
+
+        draw = ImageDraw.Draw(image)
+        for _ in range(rng.randint(3, 8)):
+            x0, y0 = rng.randrange(size), rng.randrange(size)
+            x1, y1 = x0 + rng.randrange(size // 8, size // 2), y0 + rng.randrange(size // 8, size // 2)
+            fill = tuple(rng.randrange(256) for _ in range(3))
+            if rng.random() < 0.5:
+                draw.ellipse((x0, y0, x1, y1), fill=fill)
+            else:
+                draw.rectangle((x0, y0, x1, y1), fill=fill)
+
+        output = io.BytesIO()
+        image.save(output, format="PNG")
+        return output.getvalue()
+
+    def generate(self, request_id: str, prompt: str, seed: Optional[int] = None,
+                 reference_image: Optional[bytes] = None,
+                 on_progress: Optional[Callable[[int], None]] = None) -> bytes:
+        rng = random.Random(request_id)
+        latency = self.sample_latency(rng)
+        fails = rng.random() < self.failure_rate
+
+        started = time.perf_counter()
+        data = self.render(prompt, seed, reference_image)
+        for step in range(1, PROGRESS_STEPS + 1):
+            remaining = latency * step / PROGRESS_STEPS - (time.perf_counter() - started)
+            if remaining > 0:
+                time.sleep(remaining) # Simulated model time
+            if on_progress and step < PROGRESS_STEPS:
+                on_progress(100 * step // PROGRESS_STEPS)
+        if fails:
+            raise ImageBackendError("Simulated generation failure.")
+        logger.info(f"Fake backend rendered request {request_id} in {latency:.2f} s ({len(data)} bytes).")
+        return data
+
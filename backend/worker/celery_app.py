@@ -0,0 +1,50 @@
+# backend/worker/celery_app.py
+#
+# Reference generation worker. Consumes the queues the API dispatches to, renders images
+# with the WORKER_IMAGE_BACKEND backend ('fake' by default) and writes the results back
+# through app.db.supabase_client. Run from the backend directory, e.g.:
+#
+#   celery -A worker.celery_app worker -Q generation.interactive -c 2 -n interactive@%h
+#   celery -A worker.celery_app worker -Q generation.interactive,generation.bulk -c 4 -n shared@%h
+#   celery -A worker.celery_app beat   # exactly one, for the periodic stuck-job reaper
+#
+# Together with Redis and the API this is a fully local stack for load testing; tune
+# WORKER_FAKE_LATENCY_* to mimic the production model.
+
+import os
+from dotenv import load_dotenv
+from celery import Task
+
+# --- Load environment variables first ---
+dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path)
+
+# --- Import the app factory after loading .env ---
+from app import create_app, celery_app
+
+flask_app = create_app()
+
+
+class FlaskTask(Task):
+    """Runs every task inside the Flask app context, so services can read current_app.config."""
+
+    def __call__(self, *args, **kwargs):
+        with flask_app.app_context():
+            return super().__call__(*args, **kwargs)
+
+
+celery_app.Task = FlaskTask
+
+# --- Register the tasks after the base class is set ---
+from worker.tasks import generation_task, maintenance_task # noqa: E402,F401
+
+if flask_app.config['REAPER_ENABLED']:
+    celery_app.conf.beat_schedule = {
+        'reap-stuck-requests': {
+            'task': maintenance_task.REAP_STUCK_TASK_NAME,
+            'schedule': flask_app.config['REAPER_INTERVAL'],
+            'options': {'queue': flask_app.config['GENERATION_QUEUE_INTERACTIVE'],
+                        'expires': flask_app.config['REAPER_INTERVAL']}, # Never pile up behind a busy queue
+        },
+    }
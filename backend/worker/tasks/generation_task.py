@@ -0,0 +1,97 @@
+# backend/worker/tasks/generation_task.py
+
+import time
+import logging
+from typing import Dict, Optional
+
+from flask import current_app
+
+from app import celery_app
+from app.db import supabase_client
+from app.services import scheduler_service, status_service, image_service
+from app.services.task_queue_service import IMAGE_GENERATION_TASK_NAME
+from app.services.notification_service import TERMINAL_STATUSES
+from app.utils.background_loop import run_coroutine_in_context
+from worker.backends import ImageBackendError, get_backend
+
+logger = logging.getLogger(__name__)
+
+
+def _finish(request_id: str, status: str, **fields) -> Optional[Dict]:
+    """Reports a terminal state; a duplicate delivery finishing second changes nothing."""
+    outcome, current = run_coroutine_in_context(status_service.transition_status(request_id, status, **fields))
+    if outcome != status_service.APPLIED:
+        logger.info(f"Status '{status}' for request {request_id} not applied ({outcome}); current: {current and current['status']}.")
+    return current
+
+
+def _report_progress(request_id: str):
+    """Progress callback for the backend; failures to report never fail the job."""
+    def report(progress: int):
+        try:
+            run_coroutine_in_context(status_service.transition_status(request_id, 'processing', progress=progress))
+        except Exception as e:
+            logger.warning(f"Could not report progress {progress}% for request {request_id}: {e}")
+    return report
+
+
+def _generate(request_id: str, prompt: str, reference_image_path: Optional[str], seed: Optional[int]) -> bytes:
+    """Renders the image with the configured backend; the reference is downloaded first if there is one."""
+    reference_image = None
+    if reference_image_path:
+        reference_image = run_coroutine_in_context(supabase_client.download_reference_image(reference_image_path))
+        if reference_image is None:
+            logger.warning(f"Reference image {reference_image_path} unavailable, generating request {request_id} without it.")
+    return get_backend(current_app.config).generate(request_id, prompt, seed=seed, reference_image=reference_image,
+                                                    on_progress=_report_progress(request_id))
+
+
+def _create_derivatives(request_id: str, image_bytes: bytes) -> Optional[Dict]:
+    """Thumbnails/BlurHash of the result; a failure here never fails the job (it succeeds without them)."""
+    try:
+        return run_coroutine_in_context(image_service.create_result_derivatives(request_id, image_bytes))
+    except Exception as e:
+        logger.error(f"Could not create derivatives for request {request_id}: {e}", exc_info=True)
+        return None
+
+
+@celery_app.task(bind=True, name=IMAGE_GENERATION_TASK_NAME)
+def _image_task(self, request_id: str, user_id: str, prompt: str, reference_image_path: Optional[str] = None,
+                seed: Optional[int] = None) -> Dict:
+    """
+    Generates the image of one request and stores the result:
+    render (reporting progress) -> upload result.png -> thumbnails/BlurHash -> succeeded (or failed).
+    Status changes go through status_service, so a redelivered task never moves the row back;
+    a request that is already terminal is skipped. Frees the user's scheduler slot when done,
+    which releases their next backlog task.
+    """
+    current = run_coroutine_in_context(supabase_client.get_generation_status(request_id))
+    if current and current['status'] in TERMINAL_STATUSES:
+        logger.info(f"Request {request_id} is already {current['status']}, skipping duplicate delivery.")
+        return current
+    scheduler_service.record_task_started(self.request.get('hint'), self.request.get('submitted_at'))
+    logger.info(f"Generating request {request_id} for user {user_id} (queue {self.request.delivery_info.get('routing_key')}).")
+    started = time.perf_counter()
+    try:
+        try:
+            image_bytes = _generate(request_id, prompt, reference_image_path, seed)
+        except ImageBackendError as e:
+            logger.warning(f"Generation failed for request {request_id}: {e}")
+            return _finish(request_id, 'failed', error_message=str(e))
+
+        result_url = run_coroutine_in_context(supabase_client.upload_generated_image(
+            supabase_client.generated_image_path(request_id), image_bytes, "image/png"
+        ))
+        if not result_url:
+            return _finish(request_id, 'failed', error_message='Failed to store the generated image')
+
+        # Derivatives ride on the 'succeeded' write, so no reader ever caches the result without them
+        derivatives = _create_derivatives(request_id, image_bytes) or {}
+        status = _finish(request_id, 'succeeded', result_url=result_url, **derivatives)
+        logger.info(f"Request {request_id} succeeded in {time.perf_counter() - started:.2f} s.")
+    except Exception as e:
+        logger.error(f"Unexpected error generating request {request_id}: {e}", exc_info=True)
+        return _finish(request_id, 'failed', error_message='Image generation failed')
+    finally:
+        scheduler_service.task_finished(user_id, request_id)
+    return status
@@ -0,0 +1,18 @@
+# backend/worker/tasks/maintenance_task.py
+
+import logging
+from typing import Dict, Optional
+
+from app import celery_app
+from app.services import reaper_service
+from app.utils.background_loop import run_coroutine_in_context
+
+logger = logging.getLogger(__name__)
+
+REAP_STUCK_TASK_NAME = 'worker.tasks.maintenance_task.reap_stuck_requests'
+
+
+@celery_app.task(name=REAP_STUCK_TASK_NAME, ignore_result=True)
+def reap_stuck_requests() -> Optional[Dict[str, int]]:
+    """Periodic (celery beat) run of the stuck-job reaper; concurrent runs skip via the reaper's lock."""
+    return run_coroutine_in_context(reaper_service.reconcile_stuck_requests())